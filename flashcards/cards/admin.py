@@ -1,5 +1,88 @@
-from django.contrib import admin
-from .models import Category, FlashcardSet, Flashcard
+"""
+Админка для больших таблиц.
+
+Списки загружают связанные объекты одним JOIN (list_select_related), связи редактируются
+через autocomplete/raw_id вместо выпадающих списков на всю таблицу, фильтр по набору
+не перечисляет все наборы. Пагинатор не делает COUNT(*) по всей таблице: точно считается
+не больше EXACT_COUNT_LIMIT строк, дальше - оценка СУБД. Массовые действия выполняются
+несколькими UPDATE на всю выборку, а не save() каждой карточки.
+"""
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import OperationalError, connections, transaction
+from django.db.models import F, Max
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from . import search
+from .models import Category, ChangeLog, EnrichmentJob, Flashcard, FlashcardSet, ReviewSchedule
+
+# Сколько строк списка считается точно
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике СУБД, None если оценки нет"""
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Оценка планировщика учитывает и фильтры списка
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            return int(plan[0]['Plan']['Plan Rows'])
+        if connection.vendor == 'sqlite' and not queryset.query.where:
+            # Число строк таблицы из ANALYZE (первое число в sqlite_stat1.stat)
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [queryset.model._meta.db_table])
+            except OperationalError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Точный COUNT по подзапросу с LIMIT: стоимость ограничена EXACT_COUNT_LIMIT строками.
+    Если строк больше - оценка СУБД (но не меньше уже посчитанного).
+    """
+
+    @cached_property
+    def count(self):
+        exact = self.object_list[:EXACT_COUNT_LIMIT + 1].count()
+        if exact <= EXACT_COUNT_LIMIT:
+            return exact
+        return max(estimate_count(self.object_list) or 0, exact)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Без второго COUNT(*) по всей таблице для "N из M"
+    show_full_result_count = False
+
+
+class FlashcardSetFilter(admin.SimpleListFilter):
+    """Фильтр по набору без списка всех наборов: показывается только выбранный"""
+    title = 'набор карточек'
+    parameter_name = 'flashcard_set'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        flashcard_set = FlashcardSet.objects.select_related('user').filter(pk=value).first()
+        return [(value, str(flashcard_set))] if flashcard_set else []
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(flashcard_set_id=value)
+        return queryset
 
 
 @admin.register(Category)
@@ -9,14 +92,112 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(FlashcardSet)
-class FlashcardSetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'user', 'category', 'difficulty', 'total_cards']
+class FlashcardSetAdmin(LargeTableAdmin):
+    list_display = ['name', 'user', 'category', 'difficulty', 'total_cards', 'cards_link']
     list_filter = ['category', 'difficulty', 'is_public']
+    list_select_related = ['user', 'category']
     search_fields = ['name', 'user__username']
+    autocomplete_fields = ['user', 'category']
+    raw_id_fields = ['forked_from']
+    # Счётчики не сохраняются через save() набора (см. FlashcardSet.save)
+    readonly_fields = FlashcardSet.DENORMALIZED_FIELDS
+    actions = ['recompute_stats']
+
+    @admin.display(description='Карточки')
+    def cards_link(self, obj):
+        url = reverse('admin:cards_flashcard_changelist')
+        return format_html('<a href="{}?flashcard_set={}">Карточки</a>', url, obj.pk)
+
+    @admin.action(description='Пересчитать статистику')
+    def recompute_stats(self, request, queryset):
+        updated = FlashcardSet.recompute_stats(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Статистика пересчитана: {updated}')
+
+
+class MoveCardsActionForm(ActionForm):
+    flashcard_set = forms.IntegerField(required=False, label='ID набора', min_value=1)
 
 
 @admin.register(Flashcard)
-class FlashcardAdmin(admin.ModelAdmin):
-    list_display = ['word', 'translation', 'pinyin', 'hsk_level', 'mastered']
-    list_filter = ['hsk_level', 'mastered', 'flashcard_set']
-    search_fields = ['word', 'translation']
\ No newline at end of file
+class FlashcardAdmin(LargeTableAdmin):
+    list_display = ['word', 'translation', 'pinyin', 'hsk_level', 'mastered', 'enrichment_status', 'flashcard_set']
+    list_filter = ['hsk_level', 'mastered', 'enrichment_status', FlashcardSetFilter]
+    # FlashcardSet.__str__ читает имя пользователя
+    list_select_related = ['flashcard_set__user']
+    search_fields = ['word', 'translation']
+    autocomplete_fields = ['flashcard_set']
+    raw_id_fields = ['source_card']
+    action_form = MoveCardsActionForm
+    actions = ['mark_mastered', 'mark_not_mastered', 'move_to_set']
+
+    def set_mastered(self, request, queryset, mastered):
+        changed = list(
+            queryset.exclude(mastered=mastered).values_list('id', 'flashcard_set_id', 'flashcard_set__user_id')
+        )
+        if not changed:
+            return 0
+        card_ids = [card_id for card_id, _, _ in changed]
+        with transaction.atomic():
+            Flashcard.objects.filter(id__in=card_ids).update(mastered=mastered, last_modified=timezone.now())
+            # Прогресс владельца набора хранится и в его расписании
+            ReviewSchedule.objects.filter(
+                flashcard_id__in=card_ids, user_id=F('flashcard__flashcard_set__user_id')
+            ).update(mastered=mastered)
+            FlashcardSet.recompute_stats({set_id for _, set_id, _ in changed})
+            ChangeLog.objects.bulk_create([
+                ChangeLog(user_id=user_id, flashcard_set_id=set_id, model=ChangeLog.CARD,
+                          object_id=card_id, action=ChangeLog.UPSERT)
+                for card_id, set_id, user_id in changed
+            ])
+        return len(changed)
+
+    @admin.action(description='Отметить как изученные')
+    def mark_mastered(self, request, queryset):
+        self.message_user(request, f'Отмечено изученными: {self.set_mastered(request, queryset, True)}')
+
+    @admin.action(description='Снять отметку "изучено"')
+    def mark_not_mastered(self, request, queryset):
+        self.message_user(request, f'Отметка снята: {self.set_mastered(request, queryset, False)}')
+
+    @admin.action(description='Перенести в набор (ID набора)')
+    def move_to_set(self, request, queryset):
+        value = request.POST.get('flashcard_set', '')
+        target = FlashcardSet.objects.filter(pk=value).first() if value.isdigit() else None
+        if target is None:
+            self.message_user(request, 'Укажите ID существующего набора', messages.ERROR)
+            return
+        cards = list(queryset.exclude(flashcard_set=target).select_related('flashcard_set'))
+        if not cards:
+            return
+        with transaction.atomic():
+            ChangeLog.record_cards(cards, ChangeLog.DELETE)
+            previous_set_ids = {card.flashcard_set_id for card in cards}
+            card_ids = [card.id for card in cards]
+            Flashcard.objects.filter(id__in=card_ids).update(flashcard_set=target, last_modified=timezone.now())
+            for card in cards:
+                card.flashcard_set = target
+            # Владелец поиска и очередь повторения - у нового владельца
+            search.index_cards(cards)
+            ReviewSchedule.objects.filter(flashcard_id__in=card_ids).exclude(user=target.user_id).delete()
+            ReviewSchedule.create_for_cards(cards)
+            ChangeLog.record_cards(cards)
+            FlashcardSet.recompute_stats(previous_set_ids | {target.pk})
+            FlashcardSet.raise_hsk_level(
+                target.pk, Flashcard.objects.filter(id__in=card_ids).aggregate(level=Max('hsk_level'))['level']
+            )
+        self.message_user(request, f'Перенесено карточек: {len(cards)}')
+
+    def delete_queryset(self, request, queryset):
+        # queryset.delete() не вызывает Flashcard.delete(): счётчики пересчитываются здесь
+        set_ids = set(queryset.values_list('flashcard_set_id', flat=True))
+        with transaction.atomic():
+            queryset.delete()
+            FlashcardSet.recompute_stats(set_ids)
+
+
+@admin.register(EnrichmentJob)
+class EnrichmentJobAdmin(LargeTableAdmin):
+    list_display = ['flashcard', 'status', 'attempts', 'run_after', 'last_error']
+    list_filter = ['status']
+    list_select_related = ['flashcard']
+    raw_id_fields = ['flashcard']
@@ -0,0 +1,108 @@
+"""
+Статистика занятий: дневные агрегаты DailyStudyStats из журнала ответов ReviewLog.
+
+Агрегация инкрементальная (manage.py rollup_study_stats): каждый проход берёт записи журнала
+после позиции RollupCursor, группирует их в БД по (пользователь, набор, день)
+и прибавляет к существующим строкам. Позиция и агрегаты меняются в одной транзакции,
+поэтому запись журнала учитывается ровно один раз.
+API статистики читает только агрегаты: график за год - один диапазон по индексу (user, date).
+Ответы попадают в статистику после очередного прохода агрегации.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyStudyStats, ReviewLog, RollupCursor
+
+DEFAULTS = {
+    'BATCH_SIZE': 10000,  # записей журнала за один проход
+    # Как и в журнале изменений: на PostgreSQL id выдаются до фиксации транзакции,
+    # поэтому слишком свежие записи откладываются до следующего прохода
+    'SETTLE_SECONDS': 0,
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,
+}
+CURSOR_NAME = 'daily_study_stats'
+STATS_FIELDS = ('reviews', 'cards_studied', 'correct', 'newly_mastered', 'forgotten', 'time_spent_ms')
+# Оценка 3 и выше - карточку вспомнили (см. apply_sm2)
+CORRECT_GRADE = 3
+
+
+def get_option(name):
+    return getattr(settings, 'ANALYTICS', {}).get(name, DEFAULTS[name])
+
+
+def rollup(batch_size=None):
+    """Один проход агрегации; возвращает число учтённых записей журнала"""
+    batch_size = batch_size or get_option('BATCH_SIZE')
+    with transaction.atomic():
+        cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+        # Блокировка позиции: параллельные проходы выполняются по очереди
+        cursor = RollupCursor.objects.select_for_update().get(pk=cursor.pk)
+
+        logs = ReviewLog.objects.filter(id__gt=cursor.position)
+        settle = get_option('SETTLE_SECONDS')
+        if settle:
+            logs = logs.filter(created_at__lt=timezone.now() - timedelta(seconds=settle))
+        ids = list(logs.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        rows = logs.filter(id__lte=ids[-1]).annotate(
+            date=TruncDate('reviewed_at')
+        ).values('user_id', 'flashcard_set_id', 'date').annotate(
+            reviews=Count('id'),
+            cards_studied=Count('id', filter=Q(first_of_day=True)),
+            correct=Count('id', filter=Q(grade__gte=CORRECT_GRADE)),
+            newly_mastered=Count('id', filter=Q(mastered_change__gt=0)),
+            forgotten=Count('id', filter=Q(mastered_change__lt=0)),
+            time_spent_ms=Sum('duration_ms'),
+        ).order_by()
+        deltas = {(row['user_id'], row['flashcard_set_id'], row['date']): row for row in rows}
+
+        # Существующие строки агрегатов обновляются, недостающие создаются
+        existing = DailyStudyStats.objects.select_for_update().filter(
+            user_id__in={key[0] for key in deltas},
+            flashcard_set_id__in={key[1] for key in deltas},
+            date__in={key[2] for key in deltas},
+        )
+        updated = []
+        for stats in existing:
+            delta = deltas.pop((stats.user_id, stats.flashcard_set_id, stats.date), None)
+            if delta is None:
+                continue
+            for field in STATS_FIELDS:
+                setattr(stats, field, getattr(stats, field) + (delta[field] or 0))
+            updated.append(stats)
+        DailyStudyStats.objects.bulk_update(updated, STATS_FIELDS)
+        DailyStudyStats.objects.bulk_create([
+            DailyStudyStats(
+                user_id=user_id, flashcard_set_id=set_id, date=date,
+                **{field: delta[field] or 0 for field in STATS_FIELDS}
+            )
+            for (user_id, set_id, date), delta in deltas.items()
+        ])
+
+        cursor.position = ids[-1]
+        cursor.save(update_fields=['position'])
+    return len(ids)
+
+
+def progress(user, date_from, date_to, set_id=None):
+    """Статистика по дням (только дни с занятиями) и итог за период - один запрос к агрегатам"""
+    stats = DailyStudyStats.objects.filter(user=user, date__gte=date_from, date__lte=date_to)
+    if set_id is not None:
+        stats = stats.filter(flashcard_set_id=set_id)
+    rows = stats.values('date').annotate(
+        **{f'total_{field}': Sum(field) for field in STATS_FIELDS}
+    ).order_by('date')
+    days = [{'date': row['date'], **{field: row[f'total_{field}'] for field in STATS_FIELDS}} for row in rows]
+
+    totals = {field: sum(day[field] for day in days) for field in STATS_FIELDS}
+    for item in days + [totals]:
+        item['accuracy'] = round(item['correct'] / item['reviews'], 3) if item['reviews'] else None
+    return {'from': date_from, 'to': date_to, 'days': days, 'totals': totals}
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import track_http
+from .translation import (
+    DEFAULT_SOURCE_LANGUAGE,
+    TRANSLATION_HEADERS,
+    get_translation_url,
+    translation_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи: после ``failure_threshold`` ошибок подряд запросы к сервису
+    не выполняются ``reset_timeout`` секунд, затем пропускается один пробный запрос.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_progress:
+            self._trial_in_progress = True
+            return True
+        return False
+
+    def end_trial(self):
+        """Пробный запрос завершён любым исходом, в том числе отменой или исключением"""
+        self._trial_in_progress = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_progress = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class AsyncTranslationClient:
+    """
+    Асинхронный клиент ftapi:
+    - пул keep-alive соединений (httpx.AsyncClient);
+    - одновременные запросы одного и того же слова объединяются в один запрос к сервису;
+    - ограничение числа одновременных запросов к сервису;
+    - размыкатель цепи при недоступности сервиса;
+    - тот же двухуровневый кэш, что и у синхронного пути.
+    """
+
+    def __init__(self, url=None, max_connections=20, max_concurrency=10, timeout=10.0,
+                 failure_threshold=5, reset_timeout=30.0, cache=translation_cache):
+        self.url = url
+        self.timeout = timeout
+        self.cache = cache
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+        self._client = None
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=TRANSLATION_HEADERS,
+                limits=self._limits,
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def get(self, word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        """Перевод слова, None если сервис недоступен"""
+        data = self.cache.get_from_memory(word, destination_language_code, source_language_code)
+        if data is not None:
+            return data
+
+        key = (word, source_language_code, destination_language_code)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(word, destination_language_code, source_language_code))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+
+        # shield: отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _resolve(self, word, destination_language_code, source_language_code):
+        data = await sync_to_async(self.cache.get_cached)(word, destination_language_code, source_language_code)
+        if data is not None:
+            return data
+
+        self.cache.record_miss()
+        data = await self.fetch(word, destination_language_code, source_language_code)
+        if data is not None:
+            await sync_to_async(self.cache.set)(word, destination_language_code, data, source_language_code)
+        return data
+
+    async def fetch(self, word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        """Запрос к сервису перевода в обход кэша"""
+        if not self.breaker.allow_request():
+            return None
+        try:
+            return await self._fetch(word, destination_language_code, source_language_code)
+        finally:
+            self.breaker.end_trial()
+
+    async def _fetch(self, word, destination_language_code, source_language_code):
+        params = {
+            'sl': source_language_code,
+            'dl': destination_language_code,
+            'text': word
+        }
+
+        async with self._semaphore:
+            self.upstream_requests += 1
+            try:
+                with track_http():
+                    response = await self.client.get(self.url or get_translation_url(), params=params)
+            except httpx.HTTPError as e:
+                logger.warning('Translation request failed for %r: %s', word, e)
+                self.breaker.record_failure()
+                return None
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            return None
+
+        if response.status_code != 200:
+            self.breaker.record_success()
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            # Страница ошибки прокси или обрезанный ответ - сервис неисправен
+            logger.warning('Translation service returned non-JSON response for %r', word)
+            self.breaker.record_failure()
+            return None
+        self.breaker.record_success()
+        return data
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Клиент (и его пул соединений) привязан к event loop, в котором создан
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_translation_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        options = getattr(settings, 'TRANSLATION_CLIENT', {})
+        client = AsyncTranslationClient(
+            max_connections=options.get('MAX_CONNECTIONS', 20),
+            max_concurrency=options.get('MAX_CONCURRENCY', 10),
+            timeout=options.get('TIMEOUT', 10.0),
+            failure_threshold=options.get('FAILURE_THRESHOLD', 5),
+            reset_timeout=options.get('RESET_TIMEOUT', 30.0),
+        )
+        _clients[loop] = client
+    return client
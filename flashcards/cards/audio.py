@@ -0,0 +1,216 @@
+"""
+Аудио произношения с адресацией по содержимому.
+
+Файл хранится под именем sha256 своего содержимого (flashcard_audio/ab/ab12...ef.mp3),
+поэтому одинаковые записи разных карточек - один файл, а объём хранилища растёт
+с числом уникальных слов, а не карточек. Файлы никогда не меняются по тому же имени,
+что позволяет отдавать их с долгим кэшированием (см. serve_audio).
+"""
+import hashlib
+import io
+import math
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+AUDIO_DIR = 'flashcard_audio'
+AUDIO_CONTENT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg',
+    'm4a': 'audio/mp4',
+}
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_content(content):
+    """sha256 байтов или файла Django (читается порциями)"""
+    if isinstance(content, bytes):
+        return hashlib.sha256(content).hexdigest()
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def audio_name(digest, extension):
+    return f"{AUDIO_DIR}/{digest[:2]}/{digest}.{extension}"
+
+
+def get_extension(name, default='mp3'):
+    extension = os.path.splitext(name or '')[1].lstrip('.').lower()
+    return extension if extension in AUDIO_CONTENT_TYPES else default
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, где имя файла - хэш содержимого. Повторное сохранение тех же байтов
+    ничего не пишет на диск и возвращает имя уже существующего файла.
+    Файл пишется во временный и переименовывается: параллельные сохранения одних и тех же
+    байтов не получают имён с суффиксом и не видят недописанный файл.
+    """
+
+    def save(self, name, content, max_length=None):
+        if isinstance(content, bytes):
+            content = ContentFile(content)
+        elif not hasattr(content, 'chunks'):
+            content = File(content)
+        name = audio_name(hash_content(content), get_extension(name))
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя - тот же файл, другое имя ему не нужно
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            # Если другой процесс успел раньше, замена тем же содержимым ничего не меняет
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return name
+
+    def url(self, name):
+        digest, extension = os.path.basename(name).split('.', 1)
+        return reverse('audio', kwargs={'digest': digest, 'extension': extension})
+
+
+audio_storage = ContentAddressedStorage()
+
+
+def get_audio_storage():
+    return audio_storage
+
+
+def store_audio(content, extension='mp3'):
+    """Сохраняет запись (байты или файл) и возвращает имя для FileField"""
+    return audio_storage.save(f'audio.{extension}', content)
+
+
+def find_audio(reference):
+    """
+    Имя файла по ссылке из импорта: "<sha256>" или "<sha256>.<расширение>".
+    None, если такого файла нет в хранилище.
+    """
+    digest, _, extension = (reference or '').strip().lower().partition('.')
+    if len(digest) != 64 or any(char not in '0123456789abcdef' for char in digest):
+        return None
+    for candidate in ([extension] if extension else AUDIO_CONTENT_TYPES):
+        name = audio_name(digest, candidate)
+        if candidate in AUDIO_CONTENT_TYPES and audio_storage.exists(name):
+            return name
+    return None
+
+
+# --- Синтез речи -------------------------------------------------------------
+
+class EspeakTTSBackend:
+    """Локальный синтез через espeak-ng (китайский голос), без внешних сервисов"""
+    extension = 'wav'
+
+    def __init__(self, voice='cmn', speed=130, executable=None):
+        self.voice = voice
+        self.speed = speed
+        self.executable = executable or shutil.which('espeak-ng') or shutil.which('espeak')
+
+    def synthesize(self, text):
+        if not self.executable:
+            raise RuntimeError('espeak-ng не найден')
+        with tempfile.NamedTemporaryFile(suffix='.wav') as output:
+            subprocess.run(
+                [self.executable, '-v', self.voice, '-s', str(self.speed), '-w', output.name, text],
+                check=True, capture_output=True, timeout=30
+            )
+            return output.read()
+
+
+class StubTTSBackend:
+    """Детерминированная заглушка для тестов: короткий WAV-тон, зависящий от текста"""
+    extension = 'wav'
+
+    def __init__(self, duration=0.2, sample_rate=8000):
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.calls = []
+
+    def synthesize(self, text):
+        self.calls.append(text)
+        frequency = 200 + int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:4], 16) % 600
+        frames = b''.join(
+            struct.pack('<h', int(8000 * math.sin(2 * math.pi * frequency * i / self.sample_rate)))
+            for i in range(int(self.duration * self.sample_rate))
+        )
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as output:
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(self.sample_rate)
+            output.writeframes(frames)
+        return buffer.getvalue()
+
+
+def get_tts_backend(path=None):
+    """Бэкенд синтеза из settings.AUDIO_TTS_BACKEND (путь к классу) и AUDIO_TTS_OPTIONS"""
+    path = path or getattr(settings, 'AUDIO_TTS_BACKEND', 'cards.audio.EspeakTTSBackend')
+    return import_string(path)(**getattr(settings, 'AUDIO_TTS_OPTIONS', {}))
+
+
+# --- Range-запросы ----------------------------------------------------------
+
+def parse_range(header, size):
+    """
+    Первый диапазон из заголовка Range ("bytes=0-99", "bytes=100-", "bytes=-500").
+    Возвращает (start, end) включительно, None если заголовка нет или он не байтовый,
+    и False, если диапазон не удовлетворим.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    first = header[len('bytes='):].split(',')[0].strip()
+    start, _, end = first.partition('-')
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def iter_file_range(file, start, length, block_size=HASH_CHUNK_SIZE):
+    file.seek(start)
+    remaining = length
+    try:
+        while remaining > 0:
+            block = file.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        file.close()
@@ -0,0 +1,154 @@
+"""
+Аутентификация по токену без запроса к БД на каждый запрос к API.
+
+Токен -> пользователь кэшируется в два уровня: словарь в памяти процесса с коротким TTL
+и общий кэш (CACHES['default']) с более длинным. В кэше хранятся только поля пользователя,
+сам объект собирается через from_db без запроса: остальные поля загрузятся при обращении.
+При удалении токена (выход через djoser, удаление пользователя) и изменении пользователя
+запись общего кэша удаляется сразу; в других процессах уровень в памяти живёт не дольше LOCAL_TTL.
+
+Подписанные токены (AUTH_TOKEN_CACHE['SIGNED_TOKENS']) проверяются только подписью,
+без обращения к кэшу и БД. Отозвать их нельзя - поэтому срок жизни короткий (SIGNED_TOKEN_MAX_AGE).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'LOCAL_TTL': 10,  # секунд
+    'SHARED_TTL': 5 * 60,
+    'MAX_LOCAL_ENTRIES': 10000,
+    'SIGNED_TOKENS': False,
+    'SIGNED_TOKEN_MAX_AGE': 15 * 60,
+}
+SIGNED_TOKEN_SALT = 'cards.authentication.signed-token'
+# Поля пользователя, которые есть в объекте без дополнительного запроса
+USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_option(name):
+    return getattr(settings, 'AUTH_TOKEN_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def token_cache_key(key):
+    # Сам токен в ключ кэша не попадает
+    return f'flashcards:auth_token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def build_user(values):
+    """Пользователь из сохранённых полей, без запроса к БД"""
+    User = get_user_model()
+    # from_db раскладывает значения по полям модели в порядке _meta.concrete_fields
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in USER_FIELDS]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [values[field] for field in fields])
+
+
+def build_token(key, user):
+    token = Token.from_db(DEFAULT_DB_ALIAS, ['key', 'user_id'], [key, user.pk])
+    token.user = user
+    return token
+
+
+class LocalTTLCache:
+    """LRU-словарь процесса с ограниченным временем жизни записей"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalTTLCache(get_option('MAX_LOCAL_ENTRIES'))
+
+
+def invalidate_tokens(*keys):
+    """Удаляет токены из кэша (вызывается сигналами)"""
+    cache_keys = [token_cache_key(key) for key in keys]
+    for cache_key in cache_keys:
+        local_cache.delete(cache_key)
+    cache.delete_many(cache_keys)
+
+
+def sign_token(user):
+    """Подписанный токен без хранения на сервере"""
+    return signing.dumps({field: getattr(user, field) for field in USER_FIELDS}, salt=SIGNED_TOKEN_SALT, compress=True)
+
+
+def is_signed_token(key):
+    # Ключи DRF - 40 hex-символов, в подписанном токене есть разделитель подписи
+    return ':' in key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication с кэшем токен -> пользователь и подписанными токенами"""
+
+    def authenticate_credentials(self, key):
+        if is_signed_token(key):
+            return self.authenticate_signed(key)
+
+        cache_key = token_cache_key(key)
+        values = local_cache.get(cache_key)
+        if values is None:
+            values = cache.get(cache_key)
+            if values is not None:
+                local_cache.set(cache_key, values, get_option('LOCAL_TTL'))
+        if values is not None:
+            user = build_user(values)
+            return user, build_token(key, user)
+
+        user, token = super().authenticate_credentials(key)
+        values = {field: getattr(user, field) for field in USER_FIELDS}
+        cache.set(cache_key, values, get_option('SHARED_TTL'))
+        local_cache.set(cache_key, values, get_option('LOCAL_TTL'))
+        return user, token
+
+    def authenticate_signed(self, key):
+        if not get_option('SIGNED_TOKENS'):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        try:
+            values = signing.loads(key, salt=SIGNED_TOKEN_SALT, max_age=get_option('SIGNED_TOKEN_MAX_AGE'))
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed(_('Token expired.'))
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not values.get('is_active'):
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return build_user(values), None
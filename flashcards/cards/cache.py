@@ -0,0 +1,41 @@
+"""
+Кэш ответов API по пользователю.
+
+Каждому пользователю соответствует номер версии его данных; ключи кэша включают версию,
+поэтому любое изменение набора или карточки пользователя (bump_user_version)
+делает все его закэшированные ответы неактуальными без перебора ключей.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+SETS_CACHE_TIMEOUT = getattr(settings, 'USER_SETS_CACHE_TIMEOUT', 60 * 60)
+
+
+def _version_key(user_id):
+    return f'flashcards:user_version:{user_id}'
+
+
+def get_user_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Начальное значение от времени: после вытеснения ключа версия не повторится
+        version = int(time.time() * 1000)
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def bump_user_version(*user_ids):
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.add(_version_key(user_id), int(time.time() * 1000), timeout=None)
+
+
+def user_sets_key(user_id, version):
+    return f'flashcards:user_sets:{user_id}:{version}'
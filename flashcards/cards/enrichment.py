@@ -0,0 +1,181 @@
+"""
+Фоновое заполнение карточек: перевод, пиньинь и определение.
+
+Карточка создаётся сразу со статусом pending и задачей EnrichmentJob в той же транзакции.
+Воркер (manage.py enrichment_worker) забирает задачи пачками, берёт переводы
+уникальных слов из translation_cache, недостающие запрашивает у сервиса параллельно
+и сохраняет результат двумя bulk_update поверх перечитанных с блокировкой строк
+(правки пользователя, сделанные во время запроса, не теряются). При ошибке задача откладывается
+с экспоненциальной задержкой, после ENRICHMENT['MAX_ATTEMPTS'] попыток карточка
+получает статус failed.
+Очередь живёт в БД, отдельный брокер не нужен.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import search
+from .models import ChangeLog, EnrichmentJob, Flashcard
+from .pinyin_engine import get_pinyin
+from .translation import extract_translation, translation_cache
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'MAX_WORKERS': 8,  # параллельных запросов к сервису перевода
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,  # секунд до второй попытки, дальше удваивается
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 5 * 60,  # секунд, на которые воркер забирает задачу
+}
+
+
+def get_option(name):
+    return getattr(settings, 'ENRICHMENT', {}).get(name, DEFAULTS[name])
+
+
+def needs_enrichment(translation, definition):
+    return not translation or not definition
+
+
+def enqueue(card, destination_language_code='ru'):
+    """Ставит карточку в очередь (вызывать в транзакции создания карточки)"""
+    return EnrichmentJob.objects.create(flashcard=card, destination_language=destination_language_code)
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой: экспонента с ограничением и случайным разбросом"""
+    delay = min(get_option('BACKOFF_MAX'), get_option('BACKOFF_BASE') * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def extract_definition(data):
+    """Первое определение из ответа ftapi (поле definitions может отсутствовать)"""
+    for item in (data or {}).get('definitions') or []:
+        definition = item.get('definition') if isinstance(item, dict) else item
+        if definition:
+            return str(definition)
+    return None
+
+
+def claim_jobs(batch_size=None):
+    """
+    Забирает готовые задачи и задачи с истёкшей арендой.
+    На PostgreSQL параллельные воркеры не ждут друг друга (SKIP LOCKED),
+    на SQLite транзакции записи и так выполняются по одной (BEGIN IMMEDIATE).
+    """
+    now = timezone.now()
+    ready = (
+        Q(status=EnrichmentJob.STATUS_PENDING, run_after__lte=now)
+        | Q(status=EnrichmentJob.STATUS_RUNNING, locked_until__lt=now)
+    )
+    with transaction.atomic():
+        queryset = EnrichmentJob.objects.filter(ready).order_by('run_after')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job_ids = list(queryset.values_list('id', flat=True)[:batch_size or get_option('BATCH_SIZE')])
+        if not job_ids:
+            return []
+        # Попытка засчитывается при захвате: задачи упавшего воркера тоже не повторяются бесконечно
+        EnrichmentJob.objects.filter(id__in=job_ids).update(
+            status=EnrichmentJob.STATUS_RUNNING,
+            locked_until=now + timedelta(seconds=get_option('LEASE')),
+            attempts=F('attempts') + 1,
+        )
+    return list(EnrichmentJob.objects.filter(id__in=job_ids).select_related('flashcard__flashcard_set'))
+
+
+def fetch_translations(keys):
+    """
+    Переводы уникальных пар (слово, язык), None для недоступных.
+    Кэш читается и пополняется в текущем потоке, в пуле - только запросы к сервису.
+    """
+    results = {key: translation_cache.get_cached(*key) for key in keys}
+    missing = [key for key, data in results.items() if data is None]
+    if not missing:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(get_option('MAX_WORKERS'), len(missing))) as executor:
+        fetched = list(executor.map(lambda key: translation_cache.fetch(*key), missing))
+    for (word, destination_language_code), data in zip(missing, fetched):
+        translation_cache.record_miss()
+        if data is not None:
+            translation_cache.set(word, destination_language_code, data)
+        results[(word, destination_language_code)] = data
+    return results
+
+
+def process_jobs(jobs):
+    """Заполняет карточки захваченных задач, возвращает (выполнено, отложено, ошибок)"""
+    if not jobs:
+        return 0, 0, 0
+    results = fetch_translations({(job.flashcard.word, job.destination_language) for job in jobs})
+
+    now = timezone.now()
+    max_attempts = get_option('MAX_ATTEMPTS')
+    cards, done_cards, done_ids, retry_jobs = [], [], [], []
+    failed = 0
+    with transaction.atomic():
+        # Пока шли запросы к сервису, пользователь мог изменить карточку: пишем поверх свежих строк
+        current = Flashcard.objects.select_for_update(of=('self',)).select_related('flashcard_set').in_bulk(
+            [job.flashcard_id for job in jobs]
+        )
+        for job in jobs:
+            card = current.get(job.flashcard_id)
+            if card is None:
+                # Карточка удалена, задача удалена вместе с ней
+                continue
+            job.locked_until = None
+            job.updated_at = now
+            if card.word != job.flashcard.word:
+                # Слово изменили во время запроса: перевод устарел, задача выполняется заново
+                job.status = EnrichmentJob.STATUS_PENDING
+                job.run_after = now
+                retry_jobs.append(job)
+                continue
+
+            data = results[(card.word, job.destination_language)]
+            translation = extract_translation(data)
+            if translation:
+                # Значения, заданные пользователем, не перезаписываются
+                card.translation = card.translation or translation
+                card.pinyin = card.pinyin or get_pinyin(card.word)
+                card.definition = card.definition or extract_definition(data) or ''
+                card.enrichment_status = Flashcard.ENRICHMENT_DONE
+                card.last_modified = now
+                cards.append(card)
+                done_cards.append(card)
+                done_ids.append(job.id)
+                continue
+
+            job.last_error = 'Сервис перевода недоступен или слово не найдено'
+            if job.attempts >= max_attempts:
+                job.status = EnrichmentJob.STATUS_FAILED
+                card.enrichment_status = Flashcard.ENRICHMENT_FAILED
+                card.last_modified = now
+                cards.append(card)
+                failed += 1
+            else:
+                job.status = EnrichmentJob.STATUS_PENDING
+                job.run_after = now + backoff(job.attempts)
+            retry_jobs.append(job)
+
+        Flashcard.objects.bulk_update(
+            cards, ['translation', 'pinyin', 'definition', 'enrichment_status', 'last_modified']
+        )
+        search.index_cards(done_cards)
+        ChangeLog.record_cards(cards)
+        EnrichmentJob.objects.bulk_update(
+            retry_jobs, ['status', 'run_after', 'locked_until', 'last_error', 'updated_at']
+        )
+        EnrichmentJob.objects.filter(id__in=done_ids).delete()
+    return len(done_ids), len(retry_jobs) - failed, failed
+
+
+def run_once(batch_size=None):
+    """Одна пачка задач; (выполнено, отложено, ошибок)"""
+    return process_jobs(claim_jobs(batch_size))
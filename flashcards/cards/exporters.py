@@ -0,0 +1,218 @@
+"""
+Потоковый экспорт карточек: CSV, TSV (формат импорта Anki), JSONL и пакет Anki (.apkg).
+
+Карточки читаются через values_list().iterator(), без создания моделей,
+поэтому потребление памяти не зависит от размера набора.
+"""
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from .parsers import DEFAULT_COLUMNS
+
+EXPORT_FIELDS = ('word', 'pinyin', 'translation', 'definition', 'example_sentence', 'hsk_level', 'mastered')
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'tsv': ('text/tab-separated-values; charset=utf-8', 'txt'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'apkg': ('application/octet-stream', 'apkg'),
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_card_rows(cards, chunk_size=DEFAULT_CHUNK_SIZE):
+    """cards - queryset карточек набора (FlashcardSet.card_queryset(), для форка с общими карточками)"""
+    return cards.order_by('created_date', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: строка возвращается, а не буферизуется"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, delimiter=','):
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_tsv(rows):
+    # Заголовок-директивы Anki: разделитель и без HTML.
+    # Колонки в порядке импорта без заголовка, чтобы файл можно было загрузить обратно
+    yield '#separator:tab\n#html:false\n'
+    writer = csv.writer(Echo(), delimiter='\t')
+    positions = [EXPORT_FIELDS.index(column) for column in DEFAULT_COLUMNS]
+    for row in rows:
+        yield writer.writerow([row[position] for position in positions])
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def stream_export(export_format, rows):
+    if export_format == 'csv':
+        return stream_csv(rows)
+    if export_format == 'tsv':
+        return stream_tsv(rows)
+    if export_format == 'jsonl':
+        return stream_jsonl(rows)
+    raise ValueError(f'Unknown export format: {export_format}')
+
+
+# --- Anki .apkg -------------------------------------------------------------
+
+ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+ANKI_FIELDS = ['Hanzi', 'Pinyin', 'Translation', 'Definition', 'Example', 'HSK']
+
+
+def _anki_collection(deck_id, deck_name, model_id, now):
+    model = {
+        'id': model_id, 'name': 'Flashcards (汉字)', 'type': 0, 'mod': now, 'usn': -1, 'sortf': 0,
+        'did': deck_id, 'tags': [], 'vers': [], 'req': [[0, 'any', [0]]],
+        'flds': [
+            {'name': name, 'ord': index, 'sticky': False, 'rtl': False, 'font': 'Arial', 'size': 20, 'media': []}
+            for index, name in enumerate(ANKI_FIELDS)
+        ],
+        'tmpls': [{
+            'name': 'Card 1', 'ord': 0, 'did': None, 'bqfmt': '', 'bafmt': '',
+            'qfmt': '<div class="hanzi">{{Hanzi}}</div>',
+            'afmt': '{{FrontSide}}<hr id=answer>{{Pinyin}}<br>{{Translation}}<br>{{Definition}}<br>{{Example}}',
+        }],
+        'css': '.card { font-family: arial; font-size: 20px; text-align: center; } .hanzi { font-size: 48px; }',
+        'latexPre': '\\documentclass[12pt]{article}\n\\begin{document}\n',
+        'latexPost': '\\end{document}',
+    }
+    deck = {
+        'id': deck_id, 'name': deck_name, 'mod': now, 'usn': -1, 'desc': '', 'dyn': 0, 'conf': 1,
+        'collapsed': False, 'extendNew': 10, 'extendRev': 50,
+        'lrnToday': [0, 0], 'revToday': [0, 0], 'newToday': [0, 0], 'timeToday': [0, 0],
+    }
+    default_deck = dict(deck, id=1, name='Default')
+    dconf = {
+        'id': 1, 'name': 'Default', 'mod': 0, 'usn': 0, 'maxTaken': 60, 'autoplay': True, 'timer': 0,
+        'replayq': True, 'dyn': False,
+        'new': {'delays': [1, 10], 'ints': [1, 4, 7], 'initialFactor': 2500, 'order': 1, 'perDay': 20,
+                'bury': True, 'separate': True},
+        'rev': {'perDay': 100, 'ease4': 1.3, 'fuzz': 0.05, 'maxIvl': 36500, 'bury': True, 'minSpace': 1},
+        'lapse': {'delays': [10], 'mult': 0, 'minInt': 1, 'leechFails': 8, 'leechAction': 0},
+    }
+    conf = {
+        'activeDecks': [1], 'curDeck': 1, 'newSpread': 0, 'collapseTime': 1200, 'timeLim': 0,
+        'estTimes': True, 'dueCounts': True, 'curModel': str(model_id), 'nextPos': 1,
+        'sortType': 'noteFld', 'sortBackwards': False, 'addToCur': True,
+    }
+    return (
+        1, now, now * 1000, now * 1000, 11, 0, 0, 0,
+        json.dumps(conf), json.dumps({str(model_id): model}),
+        json.dumps({'1': default_deck, str(deck_id): deck}), json.dumps({'1': dconf}), '{}'
+    )
+
+
+def write_apkg(rows, deck_name, path, deck_key=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Собирает пакет Anki во временном SQLite файле на диске (строки пишутся пачками)
+    и упаковывает его в .apkg по пути path.
+    """
+    now = int(time.time())
+    deck_id = 1_000_000_000 + deck_key
+    model_id = 1_700_000_000_000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        collection_path = os.path.join(tmpdir, 'collection.anki2')
+        db = sqlite3.connect(collection_path)
+        try:
+            db.executescript(ANKI_SCHEMA)
+            db.execute('INSERT INTO col VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       _anki_collection(deck_id, deck_name, model_id, now))
+
+            notes, cards = [], []
+            base_id = now * 1000
+            for position, row in enumerate(rows):
+                word, pinyin, translation, definition, example_sentence, hsk_level, mastered = row
+                fields = [word, pinyin, translation, definition, example_sentence, str(hsk_level or '')]
+                note_id = base_id + position
+                checksum = int(hashlib.sha1(word.encode('utf-8')).hexdigest()[:8], 16)
+                guid = hashlib.sha1(f'{deck_key}:{word}:{position}'.encode('utf-8')).hexdigest()[:10]
+                notes.append((note_id, guid, model_id, now, -1, '', '\x1f'.join(fields), word, checksum, 0, ''))
+                cards.append((note_id, note_id, deck_id, 0, now, -1, 0, 0, position, 0, 0, 0, 0, 0, 0, 0, 0, ''))
+
+                if len(notes) >= chunk_size:
+                    _flush_anki_rows(db, notes, cards)
+                    notes, cards = [], []
+            _flush_anki_rows(db, notes, cards)
+            db.commit()
+        finally:
+            db.close()
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_path, 'collection.anki2')
+            package.writestr('media', '{}')
+    return path
+
+
+def _flush_anki_rows(db, notes, cards):
+    db.executemany('INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', notes)
+    db.executemany('INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', cards)
+
+
+class TemporaryFileWrapper:
+    """Файл, который удаляется после того, как ответ полностью отдан клиенту"""
+
+    def __init__(self, path, block_size=64 * 1024):
+        self.path = path
+        self.block_size = block_size
+        self.file = open(path, 'rb')
+
+    def __iter__(self):
+        while True:
+            block = self.file.read(self.block_size)
+            if not block:
+                break
+            yield block
+
+    def close(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,127 @@
+"""
+Определение уровня HSK по словарю.
+
+Индекс загружается один раз на процесс: dict слово -> упакованный код уровней
+(HSK 2.0 в младших 4 битах, HSK 3.0 в следующих 4). Поиск - O(1), на ~11 тыс. слов
+полного списка индекс занимает около 1-2 МБ.
+
+В репозитории лежит только cards/data/hsk.tsv: HSK 2.0, уровни 1-2, без уровней HSK 3.0.
+Полные списки HSK 1-6 и HSK 3.0 1-9 загружает manage.py download_hsk_wordlists в файл
+settings.HSK_FULL_WORDLIST - он подключается автоматически, если существует.
+Без него автоматически проставляются только встроенные уровни, остальные слова остаются
+без уровня (None - неизвестен, а не "выше 2"); какие уровни покрыты - coverage(),
+при неполном покрытии manage.py check --deploy выдаёт предупреждение cards.W001.
+Свои списки подключаются через settings.HSK_WORDLISTS в том же формате:
+слово<TAB>уровень HSK 2.0<TAB>уровень HSK 3.0 (пустое значение - неизвестен).
+Файлы из списка дополняют друг друга, более поздние переопределяют известные уровни.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.core import checks
+
+DEFAULT_WORDLIST = os.path.join(os.path.dirname(__file__), 'data', 'hsk.tsv')
+
+HSK2_LEVELS = range(1, 7)
+HSK3_LEVELS = range(1, 10)
+# У уровней HSK 3.0 7-9 один общий список слов, его слова получают уровень 7
+HSK3_LIST_LEVELS = range(1, 8)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _pack(hsk2, hsk3):
+    return (hsk2 or 0) | ((hsk3 or 0) << 4)
+
+
+def _parse_level(value):
+    value = value.strip()
+    return int(value) if value.isdigit() else None
+
+
+def load_wordlist(path, index):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            parts = line.rstrip('\n').split('\t')
+            word = parts[0].strip()
+            hsk2 = _parse_level(parts[1]) if len(parts) > 1 else None
+            hsk3 = _parse_level(parts[2]) if len(parts) > 2 else None
+            previous = index.get(word, 0)
+            index[word] = _pack(hsk2 or previous & 0xF, hsk3 or previous >> 4)
+    return index
+
+
+def wordlist_paths():
+    paths = [DEFAULT_WORDLIST]
+    full = getattr(settings, 'HSK_FULL_WORDLIST', None)
+    if full and os.path.exists(full):
+        paths.append(full)
+    return [*paths, *getattr(settings, 'HSK_WORDLISTS', [])]
+
+
+def get_index():
+    """Однократная загрузка словаря (потокобезопасно)"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = {}
+                for path in wordlist_paths():
+                    load_wordlist(path, index)
+                _index = index
+    return _index
+
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def coverage():
+    """Уровни, для которых загружены слова: {'hsk2': [...], 'hsk3': [...]}"""
+    codes = set(get_index().values())
+    return {
+        'hsk2': sorted({code & 0xF for code in codes} - {0}),
+        'hsk3': sorted({code >> 4 for code in codes} - {0}),
+    }
+
+
+# Только для --deploy: неполный встроенный список - штатное состояние разработки и тестов
+@checks.register(deploy=True)
+def check_coverage(app_configs=None, **kwargs):
+    levels = coverage()
+    missing = [
+        f'{name} {", ".join(map(str, sorted(set(expected) - set(levels[key]))))}'
+        for key, name, expected in (('hsk2', 'HSK 2.0', HSK2_LEVELS), ('hsk3', 'HSK 3.0', HSK3_LIST_LEVELS))
+        if set(expected) - set(levels[key])
+    ]
+    if not missing:
+        return []
+    return [checks.Warning(
+        f'Нет списков слов для уровней: {"; ".join(missing)}. Карточки этих уровней не получат уровень автоматически.',
+        hint='Загрузите полные списки: manage.py download_hsk_wordlists (или подключите свои через HSK_WORDLISTS).',
+        id='cards.W001',
+    )]
+
+
+def lookup(word):
+    """(уровень HSK 2.0, уровень HSK 3.0); None - слова нет в списке"""
+    code = get_index().get((word or '').strip(), 0)
+    return (code & 0xF) or None, (code >> 4) or None
+
+
+def tag_card(card):
+    """Заполняет незаданные уровни HSK карточки по словарю"""
+    if card.hsk_level is not None and card.hsk3_level is not None:
+        return card
+    hsk2, hsk3 = lookup(card.word)
+    if card.hsk_level is None:
+        card.hsk_level = hsk2
+    if card.hsk3_level is None:
+        card.hsk3_level = hsk3
+    return card
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from cards.cache import bump_user_version
+from cards.hsk import lookup
+from cards.models import ChangeLog, Flashcard, FlashcardSet
+
+
+class Command(BaseCommand):
+    help = "Проставляет уровни HSK карточкам без уровня (одно UPDATE на порцию карточек)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать')
+
+    def handle(self, *args, **options):
+        missing = Flashcard.objects.filter(Q(hsk_level__isnull=True) | Q(hsk3_level__isnull=True))
+        last_id = 0
+        tagged = 0
+
+        while True:
+            chunk = list(
+                missing.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'word', 'flashcard_set_id', 'flashcard_set__user_id'
+                )[:options['batch_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+
+            # id карточек по уровню: уровень -> [id]
+            hsk2_ids, hsk3_ids = defaultdict(list), defaultdict(list)
+            for card_id, word, _, _ in chunk:
+                hsk2, hsk3 = lookup(word)
+                if hsk2:
+                    hsk2_ids[hsk2].append(card_id)
+                if hsk3:
+                    hsk3_ids[hsk3].append(card_id)
+
+            ids = {card_id for ids in (*hsk2_ids.values(), *hsk3_ids.values()) for card_id in ids}
+            tagged += len(ids)
+            if not ids or options['dry_run']:
+                continue
+
+            with transaction.atomic():
+                # Заданные вручную уровни не перезаписываются
+                Flashcard.objects.filter(id__in=ids).update(
+                    hsk_level=Coalesce('hsk_level', self.level_case(hsk2_ids)),
+                    hsk3_level=Coalesce('hsk3_level', self.level_case(hsk3_ids)),
+                )
+                affected = Flashcard.objects.filter(id__in=ids).values(
+                    'flashcard_set_id', 'flashcard_set__user_id'
+                ).annotate(level=Max('hsk_level')).order_by()
+                for row in affected:
+                    FlashcardSet.raise_hsk_level(row['flashcard_set_id'], row['level'])
+                ChangeLog.objects.bulk_create([
+                    ChangeLog(user_id=user_id, flashcard_set_id=set_id, model=ChangeLog.CARD,
+                              object_id=card_id, action=ChangeLog.UPSERT)
+                    for card_id, _, set_id, user_id in chunk if card_id in ids
+                ])
+            bump_user_version(*{row['flashcard_set__user_id'] for row in affected})
+
+        self.stdout.write(self.style.SUCCESS(f"Карточек с найденным уровнем: {tagged}"))
+
+    @staticmethod
+    def level_case(ids_by_level):
+        return Case(
+            *[When(id__in=ids, then=Value(level)) for level, ids in ids_by_level.items()],
+            default=Value(None),
+            output_field=IntegerField(),
+        )
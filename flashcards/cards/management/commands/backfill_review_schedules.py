@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from cards.cache import bump_user_version
+from cards.models import Flashcard, ReviewSchedule
+
+
+class Command(BaseCommand):
+    help = "Создаёт расписания повторения владельцев для карточек без расписания (одна вставка на порцию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать')
+
+    def handle(self, *args, **options):
+        missing = Flashcard.objects.filter(~Exists(ReviewSchedule.objects.filter(
+            flashcard_id=OuterRef('pk'), user_id=OuterRef('flashcard_set__user_id')
+        )))
+        now = timezone.now()
+        last_id = 0
+        created = 0
+        user_ids = set()
+
+        while True:
+            chunk = list(
+                missing.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'flashcard_set__user_id', 'mastered', 'created_date'
+                )[:options['batch_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            created += len(chunk)
+            if options['dry_run']:
+                continue
+
+            # Статус изучения карточки переносится в расписание, повторение - с даты создания
+            ReviewSchedule.objects.bulk_create([
+                ReviewSchedule(user_id=user_id, flashcard_id=card_id, mastered=mastered, due=created_date or now)
+                for card_id, user_id, mastered, created_date in chunk
+            ], ignore_conflicts=True)
+            user_ids.update(user_id for _, user_id, _, _ in chunk)
+
+        bump_user_version(*user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Карточек без расписания: {created}"))
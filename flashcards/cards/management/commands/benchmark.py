@@ -0,0 +1,248 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cards.models import Flashcard, FlashcardSet
+from cards.translation import translation_cache
+from cards.translation_stub import TranslationStubServer
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+BENCHMARK_USERNAME = 'benchmark-{}'
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, query_counts, http_calls=None):
+    milliseconds = [latency * 1000 for latency in latencies]
+    summary = {
+        'iterations': len(latencies),
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p90_ms': round(percentile(milliseconds, 90), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+        'mean_ms': round(statistics.mean(milliseconds), 3),
+        'min_ms': round(min(milliseconds), 3),
+        'max_ms': round(max(milliseconds), 3),
+        'queries': max(query_counts),
+        'queries_median': statistics.median(query_counts),
+    }
+    if http_calls is not None:
+        summary['http_calls'] = max(http_calls)
+    return summary
+
+
+def random_word(length=2):
+    return ''.join(chr(random.randint(0x4e00, 0x9fa5)) for _ in range(length))
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный замер создания карточек, списка наборов и пересчёта статистики "
+        "на отдельной тестовой БД. Результат (p50/p99, число запросов) пишется в JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', default='1k', help='Число карточек: 1k, 100k, 1m или число')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--sets-per-user', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--translation-delay', type=float, default=0.0,
+                            help='Задержка ответа stub-сервера перевода, с')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline', help='JSON прошлого запуска: сравнить и вернуть ошибку при регрессии')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Допустимый рост p99 относительно baseline (доля)')
+        parser.add_argument('--keepdb', action='store_true', help='Не пересоздавать тестовую БД и данные')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        scale = options['scale'].lower()
+        total_cards = SCALES.get(scale) or (int(scale) if scale.isdigit() else None)
+        if not total_cards:
+            raise CommandError(f"Неизвестный масштаб: {options['scale']}")
+        random.seed(options['seed'])
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=1, interactive=False, keepdb=options['keepdb'])
+        try:
+            user, flashcard_set = self.seed(total_cards, options)
+            results = self.run_benchmarks(user, flashcard_set, options)
+        finally:
+            teardown_databases(old_config, verbosity=1, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'scale': total_cards,
+                'users': options['users'],
+                'sets': options['users'] * options['sets_per_user'],
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'commit': self.git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'created': timezone.now().isoformat(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<28} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+                f"запросов {result['queries']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Результат: {options['output']}"))
+
+        if options['baseline']:
+            self.compare(options['baseline'], results, options['max_regression'])
+
+    # --- Данные ---------------------------------------------------------------
+
+    def seed(self, total_cards, options):
+        """Пользователи, наборы и карточки пачками bulk_create; счётчики считаются сразу"""
+        User = get_user_model()
+        main_username = BENCHMARK_USERNAME.format(0)
+        existing = User.objects.filter(username=main_username).first()
+        if existing and Flashcard.objects.count() >= total_cards:
+            self.stdout.write("Используются данные из сохранённой БД")
+            return existing, existing.flashcard_sets.order_by('-total_cards').first()
+
+        started = time.perf_counter()
+        users = User.objects.bulk_create([
+            User(username=BENCHMARK_USERNAME.format(index)) for index in range(options['users'])
+        ])
+        sets_count = options['users'] * options['sets_per_user']
+        per_set, remainder = divmod(total_cards, sets_count)
+        sets = FlashcardSet.objects.bulk_create([
+            FlashcardSet(
+                name=f'Набор {index}',
+                user=users[index % len(users)],
+                total_cards=per_set + (1 if index < remainder else 0),
+                still_learning=per_set + (1 if index < remainder else 0),
+            )
+            for index in range(sets_count)
+        ])
+
+        batch = []
+        for flashcard_set in sets:
+            for number in range(flashcard_set.total_cards):
+                batch.append(Flashcard(
+                    word=random_word(), translation=f'перевод {number}', pinyin='pīn yīn',
+                    flashcard_set=flashcard_set
+                ))
+                if len(batch) >= 5000:
+                    Flashcard.objects.bulk_create(batch)
+                    batch = []
+        Flashcard.objects.bulk_create(batch)
+
+        self.stdout.write(f"Создано карточек: {total_cards} за {time.perf_counter() - started:.1f} с")
+        return users[0], sets[0]
+
+    # --- Замеры ---------------------------------------------------------------
+
+    def measure(self, action, options, setup=None):
+        latencies, query_counts = [], []
+        for iteration in range(options['warmup'] + options['iterations']):
+            if setup:
+                setup()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                action()
+                elapsed = time.perf_counter() - started
+            if iteration >= options['warmup']:
+                latencies.append(elapsed)
+                query_counts.append(len(context.captured_queries))
+        return latencies, query_counts
+
+    def run_benchmarks(self, user, flashcard_set, options):
+        # Лимиты не должны срабатывать, но проверка ведра остаётся в замерах
+        unlimited = {scope: '1000000/s' for scope in settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': unlimited}):
+            return self._run_benchmarks(user, flashcard_set, options)
+
+    def _run_benchmarks(self, user, flashcard_set, options):
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {}
+
+        def request(method, url, data=None, expected=(200, 201, 202)):
+            response = getattr(client, method)(url, data, format='json')
+            if response.status_code not in expected:
+                raise CommandError(f"{method.upper()} {url}: {response.status_code} {getattr(response, 'data', '')}")
+            return response
+
+        results['flashcard_create'] = summarize(*self.measure(lambda: request('post', '/api/flashcard/create/', {
+            'word': random_word(), 'translation': 'перевод', 'flashcard_set_id': flashcard_set.id,
+        }), options))
+
+        with TranslationStubServer(delay=options['translation_delay']) as stub, \
+                override_settings(TRANSLATION_URL=stub.url):
+            translation_cache.clear()
+            before = stub.requests_count
+            # Без перевода: карточка создаётся сразу и ставится в очередь заполнения
+            latencies, query_counts = self.measure(lambda: request('post', '/api/flashcard/create/2/', {
+                'word': random_word(3), 'hsk_level': 1, 'example_sentence': '例句', 'dl': 'ru',
+                'flashcard_set_id': flashcard_set.id,
+            }), options)
+            calls = (stub.requests_count - before) / (options['warmup'] + options['iterations'])
+            results['flashcard_create_translated'] = summarize(latencies, query_counts, [calls])
+
+        results['user_sets_cold'] = summarize(*self.measure(
+            lambda: request('get', '/api/sets/get/'), options, setup=cache.clear
+        ))
+        results['user_sets_cached'] = summarize(*self.measure(lambda: request('get', '/api/sets/get/'), options))
+        results['update_stats'] = summarize(*self.measure(flashcard_set.update_stats, options))
+        return results
+
+    # --- Сравнение ------------------------------------------------------------
+
+    def compare(self, baseline_path, results, max_regression):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            if result['queries'] > previous['queries']:
+                regressions.append(f"{name}: запросов {previous['queries']} -> {result['queries']}")
+            if previous['p99_ms'] and result['p99_ms'] > previous['p99_ms'] * (1 + max_regression):
+                regressions.append(f"{name}: p99 {previous['p99_ms']} -> {result['p99_ms']} ms")
+
+        if regressions:
+            raise CommandError("Регрессии относительно baseline:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Регрессий относительно baseline нет"))
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,80 @@
+import json
+import os
+import re
+import tempfile
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import hsk
+
+# Полный словарь HSK 2.0 (1-6) и HSK 3.0 (1-9): запись на слово, уровни вида "old-3", "new-7"
+DEFAULT_SOURCE = 'https://raw.githubusercontent.com/drkameleon/complete-hsk-vocabulary/main/complete.json'
+LEVEL = re.compile(r'^(old|new)-(\d)$')
+
+
+def parse_entries(entries):
+    """Записи словаря -> {слово: (уровень HSK 2.0, уровень HSK 3.0)}, минимальный уровень слова"""
+    words = {}
+    for entry in entries:
+        word = (entry.get('simplified') or '').strip()
+        if not word:
+            continue
+        hsk2, hsk3 = words.get(word, (None, None))
+        for level in entry.get('level') or []:
+            match = LEVEL.match(level)
+            if not match:
+                continue
+            version, value = match.group(1), int(match.group(2))
+            if version == 'old' and value in hsk.HSK2_LEVELS:
+                hsk2 = min(hsk2 or value, value)
+            elif version == 'new' and value in hsk.HSK3_LIST_LEVELS:
+                hsk3 = min(hsk3 or value, value)
+        if hsk2 or hsk3:
+            words[word] = (hsk2, hsk3)
+    return words
+
+
+class Command(BaseCommand):
+    help = "Загружает полные списки слов HSK 2.0 и 3.0 в settings.HSK_FULL_WORDLIST"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=DEFAULT_SOURCE, help='URL или путь к complete.json')
+        parser.add_argument('--output', help='Куда записать список (по умолчанию HSK_FULL_WORDLIST)')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.HSK_FULL_WORDLIST
+        words = parse_entries(self.read_source(options['source']))
+        if not words:
+            raise CommandError('В источнике нет слов с уровнями HSK')
+
+        # Запись во временный файл и замена: воркеры не увидят недописанный список
+        directory = os.path.dirname(os.path.abspath(output))
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tsv')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('# word\tHSK 2.0 (1-6)\tHSK 3.0 (1-9, 7-9 - уровень 7)\n')
+                for word, (hsk2, hsk3) in sorted(words.items()):
+                    f.write(f'{word}\t{hsk2 or ""}\t{hsk3 or ""}\n')
+            os.replace(path, output)
+        except BaseException:
+            os.unlink(path)
+            raise
+
+        hsk.reset_index()
+        self.stdout.write(self.style.SUCCESS(f"Записано слов: {len(words)} в {output}"))
+        self.stdout.write(str(hsk.coverage()))
+
+    @staticmethod
+    def read_source(source):
+        try:
+            if re.match(r'^https?://', source):
+                response = httpx.get(source, timeout=60, follow_redirects=True)
+                response.raise_for_status()
+                return response.json()
+            with open(source, encoding='utf-8') as f:
+                return json.load(f)
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            raise CommandError(f'Не удалось прочитать {source}: {e}')
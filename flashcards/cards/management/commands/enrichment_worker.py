@@ -0,0 +1,35 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cards.enrichment import run_once
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди заполнения карточек: перевод, пиньинь и определение"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Задач за один проход (по умолчанию ENRICHMENT)')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Пауза при пустой очереди, с')
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и завершиться')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            close_old_connections()
+            done, retried, failed = run_once(options['batch_size'])
+            if done or retried or failed:
+                self.stdout.write(f"Заполнено: {done}, отложено: {retried}, ошибок: {failed}")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+    def stop(self, signum, frame):
+        # Текущая пачка дописывается, новые задачи не берутся
+        self.stopping = True
@@ -0,0 +1,51 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import exporters
+from cards.models import FlashcardSet
+
+
+class Command(BaseCommand):
+    help = "Экспортирует наборы карточек в файлы (по умолчанию - все публичные наборы)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='csv', choices=list(exporters.EXPORT_FORMATS))
+        parser.add_argument('--output-dir', default='exports')
+        parser.add_argument('--set', type=int, nargs='*', dest='set_ids', help='ID наборов')
+        parser.add_argument('--all', action='store_true', help='Все наборы, а не только публичные')
+        parser.add_argument('--chunk-size', type=int, default=exporters.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+
+        sets = FlashcardSet.objects.order_by('id')
+        if options['set_ids']:
+            sets = sets.filter(id__in=options['set_ids'])
+        elif not options['all']:
+            sets = sets.filter(is_public=True)
+        if not sets.exists():
+            raise CommandError("Наборы для экспорта не найдены")
+
+        extension = exporters.EXPORT_FORMATS[export_format][1]
+        exported = 0
+        for flashcard_set in sets.only('id', 'name', 'forked_from').iterator():
+            set_id, name = flashcard_set.id, flashcard_set.name
+            safe_name = re.sub(r'[^\w\-]+', '_', name).strip('_') or 'set'
+            path = os.path.join(output_dir, f"{set_id}_{safe_name}.{extension}")
+            rows = exporters.iter_card_rows(flashcard_set.card_queryset(), chunk_size=options['chunk_size'])
+
+            if export_format == 'apkg':
+                exporters.write_apkg(rows, name, path, deck_key=set_id, chunk_size=options['chunk_size'])
+            else:
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    for chunk in exporters.stream_export(export_format, rows):
+                        f.write(chunk)
+
+            exported += 1
+            self.stdout.write(path)
+
+        self.stdout.write(self.style.SUCCESS(f"Экспортировано наборов: {exported}"))
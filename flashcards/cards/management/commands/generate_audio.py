@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cards.audio import get_tts_backend, store_audio
+from cards.models import ChangeLog, Flashcard
+
+
+NO_AUDIO = Q(audio_pronunciation='') | Q(audio_pronunciation__isnull=True)
+
+
+class Command(BaseCommand):
+    help = "Создаёт недостающее аудио произношения: одна запись на уникальное слово"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help='Путь к классу бэкенда (по умолчанию AUDIO_TTS_BACKEND)')
+        parser.add_argument('--limit', type=int, help='Максимум слов за запуск')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            backend = get_tts_backend(options['backend'])
+        except ImportError as e:
+            raise CommandError(f"Бэкенд синтеза не найден: {e}")
+
+        missing = Flashcard.objects.filter(NO_AUDIO).order_by().values_list('word', flat=True).distinct()
+        if options['limit']:
+            missing = missing[:options['limit']]
+
+        words = list(missing)
+        # Слова, для которых запись уже есть у другой карточки, не синтезируются повторно
+        existing = {}
+        for start in range(0, len(words), options['batch_size']):
+            existing.update(
+                Flashcard.objects.filter(word__in=words[start:start + options['batch_size']])
+                .exclude(NO_AUDIO)
+                .values_list('word', 'audio_pronunciation')
+            )
+
+        generated = reused = failed = 0
+        for word in words:
+            name = existing.get(word)
+            if name:
+                reused += 1
+            else:
+                try:
+                    name = store_audio(backend.synthesize(word), backend.extension)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{word}: {e}")
+                    continue
+                generated += 1
+
+            # Одно обновление на слово для всех карточек без аудио
+            with transaction.atomic():
+                cards = list(Flashcard.objects.filter(NO_AUDIO, word=word).values_list(
+                    'id', 'flashcard_set_id', 'flashcard_set__user_id'
+                ))
+                Flashcard.objects.filter(id__in=[card_id for card_id, _, _ in cards]).update(
+                    audio_pronunciation=name, last_modified=timezone.now()
+                )
+                ChangeLog.objects.bulk_create([
+                    ChangeLog(user_id=user_id, flashcard_set_id=set_id, model=ChangeLog.CARD,
+                              object_id=card_id, action=ChangeLog.UPSERT)
+                    for card_id, set_id, user_id in cards
+                ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Слов: {len(words)}, синтезировано: {generated}, переиспользовано: {reused}, ошибок: {failed}"
+        ))
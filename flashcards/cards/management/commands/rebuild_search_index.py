@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from cards import search
+from cards.models import Flashcard
+
+
+class Command(BaseCommand):
+    help = "Пересоздаёт полнотекстовый индекс карточек (SQLite FTS5)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write("Полнотекстовый индекс поддерживается только для SQLite")
+            return
+
+        search.drop_search_index()
+        search.create_search_index()
+
+        cards = Flashcard.objects.values_list(
+            'id', 'word', 'pinyin', 'translation', 'definition', 'flashcard_set__user_id'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        rows = []
+        total = 0
+        for card in cards:
+            rows.append(search.build_row(*card))
+            if len(rows) >= options['chunk_size']:
+                search.index_rows(rows, replace=False)
+                total += len(rows)
+                rows = []
+        search.index_rows(rows, replace=False)
+        total += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано карточек: {total}"))
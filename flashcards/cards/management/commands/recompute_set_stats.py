@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from cards.cache import bump_user_version
+from cards.models import FlashcardSet
+
+
+class Command(BaseCommand):
+    help = "Исправляет расхождения в статистике наборов одним группирующим запросом"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--set', type=int, nargs='*', dest='set_ids', help='ID наборов (по умолчанию все)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        sets = FlashcardSet.objects.all()
+        if options['set_ids']:
+            sets = sets.filter(id__in=options['set_ids'])
+
+        # Реальные значения считаются в БД, выбираются только наборы с расхождением.
+        # Форки видят общие карточки исходного набора - их считает update_stats()
+        drifted = list(
+            sets.filter(forked_from__isnull=True).annotate(
+                real_total=Count('flashcards'),
+                real_mastered=Count('flashcards', filter=Q(flashcards__mastered=True)),
+            ).filter(
+                ~Q(total_cards=F('real_total'))
+                | ~Q(mastered=F('real_mastered'))
+                | ~Q(still_learning=F('real_total') - F('real_mastered'))
+            ).only('id', 'name', 'user_id', *FlashcardSet.STATS_FIELDS).order_by()
+        )
+
+        for flashcard_set in drifted:
+            self.stdout.write(
+                f"{flashcard_set.id} {flashcard_set.name}: "
+                f"{flashcard_set.total_cards}/{flashcard_set.still_learning}/{flashcard_set.mastered} -> "
+                f"{flashcard_set.real_total}/{flashcard_set.real_total - flashcard_set.real_mastered}/"
+                f"{flashcard_set.real_mastered}"
+            )
+            flashcard_set.total_cards = flashcard_set.real_total
+            flashcard_set.mastered = flashcard_set.real_mastered
+            flashcard_set.still_learning = flashcard_set.real_total - flashcard_set.real_mastered
+
+        if not options['dry_run']:
+            FlashcardSet.objects.bulk_update(drifted, FlashcardSet.STATS_FIELDS, batch_size=options['batch_size'])
+            bump_user_version(*(flashcard_set.user_id for flashcard_set in drifted))
+
+        forks = sets.filter(forked_from__isnull=False).only('id', 'user_id', 'forked_from')
+        if not options['dry_run']:
+            for fork in forks.iterator():
+                fork.update_stats()
+
+        self.stdout.write(self.style.SUCCESS(f"Наборов с расхождениями: {len(drifted)}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from cards.models import CatalogFacet, FlashcardSet
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитывает фасеты каталога (обычно они обновляются инкрементально)"
+
+    def handle(self, *args, **options):
+        public = FlashcardSet.objects.filter(is_public=True).order_by()
+        facets = []
+        for facet, field in (('category', 'category_id'), ('difficulty', 'difficulty'), ('hsk_level', 'hsk_level')):
+            rows = public.exclude(**{f'{field}__isnull': True}).values(field).annotate(count=Count('id'))
+            facets.extend(
+                CatalogFacet(facet=facet, value=str(row[field]), count=row['count']) for row in rows
+            )
+
+        with transaction.atomic():
+            CatalogFacet.objects.all().delete()
+            CatalogFacet.objects.bulk_create(facets)
+
+        self.stdout.write(self.style.SUCCESS(f"Значений фасетов: {len(facets)}"))
@@ -0,0 +1,34 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cards.analytics import rollup
+
+
+class Command(BaseCommand):
+    help = "Агрегация журнала ответов в дневную статистику занятий (DailyStudyStats)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Записей журнала за один проход (по умолчанию ANALYTICS)')
+        parser.add_argument('--sleep', type=float, default=60.0, help='Пауза, когда новых записей нет, с')
+        parser.add_argument('--once', action='store_true', help='Учесть накопившиеся записи и завершиться')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            close_old_connections()
+            count = rollup(options['batch_size'])
+            if count:
+                self.stdout.write(f"Учтено ответов: {count}")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+    def stop(self, signum, frame):
+        self.stopping = True
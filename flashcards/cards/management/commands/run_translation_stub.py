@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from cards.translation_stub import TranslationStubServer
+
+
+class Command(BaseCommand):
+    help = "Запускает локальный stub-сервер перевода (замена ftapi для разработки и тестов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.0, help='Задержка ответа в секундах')
+        parser.add_argument('--status', type=int, default=200, help='HTTP статус ответов')
+
+    def handle(self, *args, **options):
+        server = TranslationStubServer(
+            host=options['host'],
+            port=options['port'],
+            delay=options['delay'],
+            status_code=options['status'],
+            verbose=True,
+        )
+        self.stdout.write(f"Stub-сервер перевода: {server.url}")
+        self.stdout.write(f"Укажите TRANSLATION_URL = '{server.url}' в настройках")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from cards.models import Flashcard
+from cards.translation import DEFAULT_SOURCE_LANGUAGE, translation_cache
+
+
+class Command(BaseCommand):
+    help = "Прогревает кэш переводов списком слов (из файла или из существующих карточек)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dl', default='ru', help='Язык перевода')
+        parser.add_argument('--sl', default=DEFAULT_SOURCE_LANGUAGE, help='Исходный язык')
+        parser.add_argument('--file', help='Файл со словами, по одному в строке')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                words = [line.split('\t')[0] for line in f]
+        else:
+            words = Flashcard.objects.values_list('word', flat=True).distinct().iterator(chunk_size=2000)
+
+        fetched = translation_cache.warm(words, options['dl'], options['sl'])
+
+        self.stdout.write(self.style.SUCCESS(f"Запрошено у сервиса перевода: {fetched}"))
+        self.stdout.write(str(translation_cache.stats()))
@@ -0,0 +1,343 @@
+"""
+Метрики запросов к API: число и время SQL-запросов, исходящих HTTP-запросов
+(сервис перевода) и сериализации по каждому представлению.
+
+MetricsMiddleware создаёт RequestMetrics на запрос (contextvar, поэтому метрики
+доступны и в асинхронных представлениях, и в потоках, запущенных через copy_context),
+добавляет заголовок Server-Timing и копит суммы в реестре процесса. Потоковые ответы
+замеряются до конца чтения тела (MeasuredStream) и попадают в реестр после него.
+Реестр отдаётся в формате Prometheus по /metrics (у каждого воркера свой реестр) - только
+персоналу или по общему токену METRICS_TOKEN (Authorization: Bearer <токен>).
+Middleware поддерживает и WSGI, и ASGI: под ASGI цепочка не переключается в поток.
+"""
+import contextvars
+import hmac
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Порог повторов одного и того же запроса (с разными параметрами), после которого это N+1
+N_PLUS_ONE_THRESHOLD = getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 5)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+SQL_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def normalize_sql(sql):
+    """Шаблон запроса без параметров: одинаковые запросы с разными id совпадают"""
+    return SQL_IN_LISTS.sub('(?)', SQL_LITERALS.sub('?', sql))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.http_count = 0
+        self.http_time = 0.0
+        self.serializer_time = 0.0
+        self.queries = Counter()
+        self._serializer_depth = 0
+
+    def record_sql(self, sql, duration):
+        with self.lock:
+            self.sql_count += 1
+            self.sql_time += duration
+            self.queries[normalize_sql(sql)] += 1
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_sql(sql, time.perf_counter() - started)
+
+    @contextmanager
+    def activate(self):
+        """Делает метрики текущими и подключает замер SQL ко всем соединениям потока"""
+        token = _current.set(self)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.execute_wrapper))
+                yield self
+        finally:
+            _current.reset(token)
+
+    def record_http(self, duration):
+        with self.lock:
+            self.http_count += 1
+            self.http_time += duration
+
+    @property
+    def duplicate_queries(self):
+        """Сколько запросов повторяли уже выполненный шаблон"""
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+    def n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        return {sql: count for sql, count in self.queries.items() if count >= threshold}
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f'http;dur={self.http_time * 1000:.1f};desc="{self.http_count} calls"',
+            f'ser;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_http(duration):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record_http(duration)
+
+
+@contextmanager
+def track_http():
+    """Учитывает исходящий HTTP-запрос текущего запроса к API"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_http(time.perf_counter() - started)
+
+
+def timed_representation(to_representation):
+    """Время сериализации; вложенные сериализаторы не считаются повторно"""
+
+    @wraps(to_representation)
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return to_representation(self, *args, **kwargs)
+        metrics._serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return to_representation(self, *args, **kwargs)
+        finally:
+            metrics._serializer_depth -= 1
+            if metrics._serializer_depth == 0:
+                metrics.serializer_time += time.perf_counter() - started
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_serializers():
+    """Подключает замер времени к to_representation сериализаторов DRF (один раз)"""
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.to_representation, 'instrumented', False):
+            cls.to_representation = timed_representation(cls.to_representation)
+
+
+# --- Реестр процесса ----------------------------------------------------------
+
+class MetricsRegistry:
+    COUNTERS = (
+        ('requests', 'Запросы к API'),
+        ('sql_queries', 'SQL-запросы'),
+        ('sql_seconds', 'Время SQL-запросов, с'),
+        ('http_requests', 'Исходящие HTTP-запросы'),
+        ('http_seconds', 'Время исходящих HTTP-запросов, с'),
+        ('serializer_seconds', 'Время сериализации, с'),
+        ('duplicate_queries', 'Повторные SQL-запросы (N+1)'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(lambda: defaultdict(float))
+            self.durations = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+            self.duration_sums = defaultdict(float)
+
+    def observe(self, view, method, status_code, metrics, duration):
+        key = (view, method, str(status_code))
+        with self.lock:
+            counters = self.counters[key]
+            counters['requests'] += 1
+            counters['sql_queries'] += metrics.sql_count
+            counters['sql_seconds'] += metrics.sql_time
+            counters['http_requests'] += metrics.http_count
+            counters['http_seconds'] += metrics.http_time
+            counters['serializer_seconds'] += metrics.serializer_time
+            counters['duplicate_queries'] += metrics.duplicate_queries
+
+            buckets = self.durations[key]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            self.duration_sums[key] += duration
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4"""
+        lines = []
+        with self.lock:
+            for name, description in self.COUNTERS:
+                metric = f'flashcards_{name}_total'
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} counter')
+                for key, counters in sorted(self.counters.items()):
+                    lines.append(f'{metric}{{{self.labels(key)}}} {self.number(counters[name])}')
+
+            metric = 'flashcards_request_duration_seconds'
+            lines.append(f'# HELP {metric} Длительность запроса к API, с')
+            lines.append(f'# TYPE {metric} histogram')
+            for key, buckets in sorted(self.durations.items()):
+                labels = self.labels(key)
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                total = int(self.counters[key]['requests'])
+                lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {total}')
+                lines.append(f'{metric}_sum{{{labels}}} {self.number(self.duration_sums[key])}')
+                lines.append(f'{metric}_count{{{labels}}} {total}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(key):
+        view, method, status_code = key
+        view = view.replace('\\', '\\\\').replace('"', '\\"')
+        return f'view="{view}",method="{method}",status="{status_code}"'
+
+    @staticmethod
+    def number(value):
+        return str(int(value)) if float(value).is_integer() else f'{value:.6f}'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_allowed(request):
+    """Метрики раскрывают маршруты и нагрузку: только персонал или владелец общего токена"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MeasuredStream:
+    """
+    Тело потокового ответа: каждый фрагмент формируется с активными метриками запроса,
+    итог записывается один раз - когда тело прочитано до конца или закрыто сервером.
+    """
+
+    def __init__(self, content, metrics, on_finish):
+        self.content = iter(content)
+        self.metrics = metrics
+        self.on_finish = on_finish
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            with self.metrics.activate():
+                return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.on_finish()
+
+
+class MetricsMiddleware:
+    """Замер SQL, HTTP и сериализации по каждому запросу к API"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.path == '/metrics':
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        with metrics.activate():
+            response = self.get_response(request)
+        return self.process_response(request, response, metrics)
+
+    async def __acall__(self, request):
+        if request.path == '/metrics':
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        with metrics.activate():
+            response = await self.get_response(request)
+        return self.process_response(request, response, metrics)
+
+    def process_response(self, request, response, metrics):
+        if response.streaming and not response.is_async:
+            # Тело формируется уже после выхода из представления: замер продолжается при его чтении.
+            # Заголовки уходят раньше тела, поэтому Server-Timing у потоковых ответов нет
+            response.streaming_content = MeasuredStream(
+                response.streaming_content, metrics, lambda: self.finish(request, response, metrics)
+            )
+            return response
+
+        duration = self.finish(request, response, metrics)
+        response['Server-Timing'] = metrics.server_timing(duration)
+        return response
+
+    def finish(self, request, response, metrics):
+        """Записывает метрики запроса в реестр, возвращает длительность"""
+        duration = time.perf_counter() - metrics.started
+        view = self.get_view_name(request)
+        registry.observe(view, request.method, response.status_code, metrics, duration)
+
+        suspicious = metrics.n_plus_one()
+        if suspicious:
+            logger.warning(
+                'Possible N+1 in %s: %s', view,
+                '; '.join(f'{count}x {sql[:200]}' for sql, count in suspicious.items())
+            )
+        return duration
+
+    @staticmethod
+    def get_view_name(request):
+        # Шаблон маршрута, а не путь: метки Prometheus не зависят от id в URL
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.route or match.view_name
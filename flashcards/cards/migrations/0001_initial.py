@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FlashcardSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название набора')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('difficulty', models.CharField(choices=[('beginner', 'Начинающий'), ('intermediate', 'Средний'), ('advanced', 'Продвинутый')], default='beginner', max_length=20, verbose_name='Сложность')),
+                ('creation_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('is_public', models.BooleanField(default=False, verbose_name='Публичный набор')),
+                ('total_cards', models.IntegerField(default=0, verbose_name='Всего карточек')),
+                ('still_learning', models.IntegerField(default=0, verbose_name='Изучается')),
+                ('mastered', models.IntegerField(default=0, verbose_name='Изучено')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cards.category', verbose_name='Категория')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flashcard_sets', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Набор карточек',
+                'verbose_name_plural': 'Наборы карточек',
+                'ordering': ['-creation_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Flashcard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=200, verbose_name='Слово (汉字)')),
+                ('translation', models.CharField(max_length=500, verbose_name='Перевод')),
+                ('pinyin', models.CharField(max_length=200, verbose_name='Пиньинь')),
+                ('definition', models.TextField(blank=True, verbose_name='Определение')),
+                ('example_sentence', models.TextField(blank=True, verbose_name='Пример предложения')),
+                ('audio_pronunciation', models.FileField(blank=True, null=True, upload_to='flashcard_audio/', verbose_name='Аудио произношение')),
+                ('hsk_level', models.IntegerField(blank=True, choices=[(1, 'HSK 1'), (2, 'HSK 2'), (3, 'HSK 3'), (4, 'HSK 4'), (5, 'HSK 5'), (6, 'HSK 6')], null=True, verbose_name='Уровень HSK')),
+                ('mastered', models.BooleanField(default=False, verbose_name='Изучено')),
+                ('created_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_modified', models.DateTimeField(auto_now=True, verbose_name='Последнее изменение')),
+                ('flashcard_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flashcards', to='cards.flashcardset', verbose_name='Набор карточек')),
+            ],
+            options={
+                'verbose_name': 'Карточка',
+                'verbose_name_plural': 'Карточки',
+                'ordering': ['created_date'],
+                'indexes': [models.Index(fields=['word', 'pinyin'], name='cards_flash_word_8da859_idx'), models.Index(fields=['hsk_level'], name='cards_flash_hsk_lev_ced89b_idx')],
+            },
+        ),
+    ]
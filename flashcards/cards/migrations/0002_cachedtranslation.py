@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=200, verbose_name='Слово')),
+                ('source_language', models.CharField(max_length=10, verbose_name='Исходный язык')),
+                ('target_language', models.CharField(max_length=10, verbose_name='Язык перевода')),
+                ('data', models.JSONField(verbose_name='Ответ сервиса перевода')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата получения')),
+                ('last_used', models.DateTimeField(auto_now_add=True, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Кэшированный перевод',
+                'verbose_name_plural': 'Кэшированные переводы',
+                'indexes': [models.Index(fields=['last_used'], name='cards_cache_last_us_abf2d8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('word', 'source_language', 'target_language'), name='unique_cached_translation')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0002_cachedtranslation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['flashcard_set', 'created_date', 'id'], name='cards_flash_flashca_07a415_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['flashcard_set', 'last_modified'], name='cards_flash_flashca_7960a2_idx'),
+        ),
+    ]
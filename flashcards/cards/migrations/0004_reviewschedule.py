@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0003_flashcard_pagination'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease', models.FloatField(default=2.5, verbose_name='Лёгкость')),
+                ('interval', models.IntegerField(default=0, verbose_name='Интервал (дней)')),
+                ('repetitions', models.IntegerField(default=0, verbose_name='Успешных повторений подряд')),
+                ('lapses', models.IntegerField(default=0, verbose_name='Забываний')),
+                ('due', models.DateTimeField(verbose_name='Следующее повторение')),
+                ('last_reviewed', models.DateTimeField(blank=True, null=True, verbose_name='Последнее повторение')),
+                ('flashcard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_schedules', to='cards.flashcard', verbose_name='Карточка')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_schedules', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Расписание повторения',
+                'verbose_name_plural': 'Расписания повторения',
+                'indexes': [models.Index(fields=['user', 'due'], name='cards_revie_user_id_ee3067_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'flashcard'), name='unique_review_schedule')],
+            },
+        ),
+    ]
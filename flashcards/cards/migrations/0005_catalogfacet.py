@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_reviewschedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('category', 'Категория'), ('difficulty', 'Сложность'), ('hsk_level', 'Уровень HSK')], max_length=20, verbose_name='Фасет')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество наборов')),
+            ],
+            options={
+                'verbose_name': 'Фасет каталога',
+                'verbose_name_plural': 'Фасеты каталога',
+            },
+        ),
+        migrations.AddField(
+            model_name='flashcardset',
+            name='hsk_level',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Максимальный уровень HSK'),
+        ),
+        migrations.AddField(
+            model_name='flashcardset',
+            name='popularity',
+            field=models.IntegerField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', 'category', '-creation_date'], name='cards_flash_is_publ_dc747b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', 'difficulty', '-creation_date'], name='cards_flash_is_publ_37b7e7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', 'hsk_level', '-creation_date'], name='cards_flash_is_publ_519d7f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', '-creation_date'], name='cards_flash_is_publ_ea3006_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcardset',
+            index=models.Index(fields=['is_public', '-popularity'], name='cards_flash_is_publ_35f451_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogfacet',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='unique_catalog_facet'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_catalogfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='source_card',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies', to='cards.flashcard', verbose_name='Исходная карточка (для форков)'),
+        ),
+        migrations.AddField(
+            model_name='flashcardset',
+            name='forked_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='cards.flashcardset', verbose_name='Исходный набор'),
+        ),
+        migrations.AddField(
+            model_name='reviewschedule',
+            name='mastered',
+            field=models.BooleanField(default=False, verbose_name='Изучено'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import cards.audio
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_forks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flashcard',
+            name='audio_pronunciation',
+            field=models.FileField(blank=True, max_length=200, null=True, storage=cards.audio.get_audio_storage, upload_to='flashcard_audio/', verbose_name='Аудио произношение'),
+        ),
+    ]
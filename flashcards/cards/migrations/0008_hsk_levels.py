@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_audio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='hsk3_level',
+            field=models.IntegerField(blank=True, choices=[(1, 'HSK 3.0 1'), (2, 'HSK 3.0 2'), (3, 'HSK 3.0 3'), (4, 'HSK 3.0 4'), (5, 'HSK 3.0 5'), (6, 'HSK 3.0 6'), (7, 'HSK 3.0 7'), (8, 'HSK 3.0 8'), (9, 'HSK 3.0 9')], null=True, verbose_name='Уровень HSK 3.0'),
+        ),
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['hsk3_level'], name='cards_flash_hsk3_le_7fc67c_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0008_hsk_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='enrichment_status',
+            field=models.CharField(choices=[('pending', 'Ожидает перевода'), ('done', 'Заполнена'), ('failed', 'Перевод не получен')], default='done', max_length=10, verbose_name='Статус заполнения'),
+        ),
+        migrations.CreateModel(
+            name='EnrichmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destination_language', models.CharField(default='ru', max_length=10, verbose_name='Язык перевода')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Аренда до')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Последнее изменение')),
+                ('flashcard', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='enrichment_job', to='cards.flashcard', verbose_name='Карточка')),
+            ],
+            options={
+                'verbose_name': 'Задача заполнения карточки',
+                'verbose_name_plural': 'Задачи заполнения карточек',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='cards_enric_status_3f4a4d_idx')],
+            },
+        ),
+    ]
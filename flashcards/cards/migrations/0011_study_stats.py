@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0010_changelog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Агрегация')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последний учтённый id')),
+            ],
+            options={
+                'verbose_name': 'Позиция агрегации',
+                'verbose_name_plural': 'Позиции агрегации',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flashcard_set_id', models.BigIntegerField(verbose_name='Набор')),
+                ('flashcard_id', models.BigIntegerField(verbose_name='Карточка')),
+                ('grade', models.SmallIntegerField(verbose_name='Оценка')),
+                ('reviewed_at', models.DateTimeField(verbose_name='Время ответа')),
+                ('duration_ms', models.IntegerField(default=0, verbose_name='Время на ответ (мс)')),
+                ('first_of_day', models.BooleanField(default=True, verbose_name='Первый ответ за день')),
+                ('mastered_change', models.SmallIntegerField(default=0, verbose_name='Изменение статуса изучения')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время записи')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ответ на карточку',
+                'verbose_name_plural': 'Журнал ответов',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStudyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flashcard_set_id', models.BigIntegerField(verbose_name='Набор')),
+                ('date', models.DateField(verbose_name='День')),
+                ('reviews', models.IntegerField(default=0, verbose_name='Ответов')),
+                ('cards_studied', models.IntegerField(default=0, verbose_name='Карточек')),
+                ('correct', models.IntegerField(default=0, verbose_name='Правильных ответов')),
+                ('newly_mastered', models.IntegerField(default=0, verbose_name='Изучено')),
+                ('forgotten', models.IntegerField(default=0, verbose_name='Забыто изученных')),
+                ('time_spent_ms', models.BigIntegerField(default=0, verbose_name='Время занятий (мс)')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика занятий за день',
+                'verbose_name_plural': 'Статистика занятий по дням',
+                'indexes': [models.Index(fields=['user', 'date'], name='cards_daily_user_id_bb79c8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'flashcard_set_id', 'date'), name='unique_daily_study_stats')],
+            },
+        ),
+    ]
@@ -1,5 +1,12 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, Exists, F, Func, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import hsk, search
+from .audio import get_audio_storage
+from .cache import bump_user_version
 
 
 class Category(models.Model):
@@ -36,6 +43,16 @@ class FlashcardSet(models.Model):
     total_cards = models.IntegerField(default=0, verbose_name="Всего карточек")
     still_learning = models.IntegerField(default=0, verbose_name="Изучается")
     mastered = models.IntegerField(default=0, verbose_name="Изучено")
+    hsk_level = models.IntegerField(null=True, blank=True, verbose_name="Максимальный уровень HSK")
+    popularity = models.IntegerField(default=0, verbose_name="Популярность")
+    forked_from = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='forks',
+        verbose_name="Исходный набор"
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -47,27 +64,318 @@ class FlashcardSet(models.Model):
         ordering = ['-creation_date']
         verbose_name = "Набор карточек"
         verbose_name_plural = "Наборы карточек"
+        indexes = [
+            # Каталог публичных наборов: фильтр + сортировка по одному индексу
+            models.Index(fields=['is_public', 'category', '-creation_date']),
+            models.Index(fields=['is_public', 'difficulty', '-creation_date']),
+            models.Index(fields=['is_public', 'hsk_level', '-creation_date']),
+            models.Index(fields=['is_public', '-creation_date']),
+            models.Index(fields=['is_public', '-popularity']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
+    # Счётчики меняются только атомарными F()-дельтами или update_stats()
+    STATS_FIELDS = ('total_cards', 'still_learning', 'mastered')
+    # Денормализованные поля, которые обновляются отдельными UPDATE
+    DENORMALIZED_FIELDS = STATS_FIELDS + ('hsk_level', 'popularity')
+    CATALOG_FIELDS = ('is_public', 'category_id', 'difficulty', 'hsk_level')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Состояние из БД нужно для инкрементального пересчёта фасетов каталога
+        instance._catalog_state = instance.get_catalog_facets()
+        return instance
+
+    def get_catalog_facets(self):
+        """Вклад набора в фасеты каталога (пусто для непубличных), None если поля не загружены"""
+        deferred = self.get_deferred_fields()
+        if any(field in deferred for field in self.CATALOG_FIELDS):
+            return None
+        if not self.is_public:
+            return {}
+        return {
+            'category': self.category_id,
+            'difficulty': self.difficulty,
+            'hsk_level': self.hsk_level,
+        }
+
+    def save(self, *args, **kwargs):
+        # Обычное сохранение набора не должно затирать счётчики, обновлённые параллельно
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def raise_hsk_level(cls, set_id, hsk_level):
+        """Повышает максимальный уровень HSK набора (только вверх, без полного пересчёта)"""
+        if hsk_level is None:
+            return
+        current = cls.objects.filter(pk=set_id).values('is_public', 'hsk_level').first()
+        if current is None or (current['hsk_level'] is not None and current['hsk_level'] >= hsk_level):
+            return
+        updated = cls.objects.filter(
+            Q(hsk_level__isnull=True) | Q(hsk_level__lt=hsk_level), pk=set_id
+        ).update(hsk_level=hsk_level)
+        if updated and current['is_public']:
+            CatalogFacet.apply_delta({'hsk_level': current['hsk_level']}, {'hsk_level': hsk_level})
+
+    @classmethod
+    def apply_stats_delta(cls, set_id, total=0, mastered=0, card_id=None):
+        """
+        Атомарное изменение счётчиков набора (без чтения и полного save).
+        card_id - карточка, которая появилась в наборе или ушла из него: по ней считается дельта форков.
+        """
+        if not total and not mastered:
+            return
+        if not total:
+            cls.objects.filter(pk=set_id).update(
+                still_learning=F('still_learning') - mastered,
+                mastered=F('mastered') + mastered,
+            )
+            return
+        # Общие карточки видны и в форках: число карточек меняется у них тем же UPDATE.
+        # Статус изучения общей карточки в форке хранится в расписании владельца форка,
+        # а форки, где у карточки уже есть своя копия (copy-on-write), изменение не затрагивает
+        forks = Q(forked_from_id=set_id)
+        fork_mastered = Value(0)
+        if card_id is not None:
+            forks &= ~Exists(Flashcard.objects.filter(flashcard_set_id=OuterRef('pk'), source_card_id=card_id))
+            fork_mastered = Case(
+                When(Exists(ReviewSchedule.objects.filter(
+                    user_id=OuterRef('user_id'), flashcard_id=card_id, mastered=True
+                )), then=Value(total)),
+                default=Value(0),
+            )
+        set_mastered = Case(When(pk=set_id, then=Value(mastered)), default=fork_mastered)
+        cls.objects.filter(Q(pk=set_id) | forks).update(
+            total_cards=F('total_cards') + total,
+            still_learning=F('still_learning') + total - set_mastered,
+            mastered=F('mastered') + set_mastered,
+        )
+
+    def card_queryset(self):
+        """
+        Карточки набора. Форк видит свои карточки и карточки исходного набора,
+        кроме тех, что уже скопированы в форк при редактировании (copy-on-write).
+        """
+        if not self.forked_from_id:
+            return Flashcard.objects.filter(flashcard_set_id=self.pk)
+        materialized = Flashcard.objects.filter(
+            flashcard_set_id=self.pk, source_card__isnull=False
+        ).values('source_card_id')
+        return Flashcard.objects.filter(
+            Q(flashcard_set_id=self.pk)
+            | Q(flashcard_set_id=self.forked_from_id) & ~Q(id__in=Subquery(materialized))
+        )
+
+    def fork(self, user, name=None):
+        """
+        Форк набора для пользователя: одна вставка набора, карточки остаются общими.
+        Форк форка ссылается на исходный набор, отредактированные в нём карточки копируются.
+        """
+        root_id = self.forked_from_id or self.pk
+        with transaction.atomic():
+            fork = FlashcardSet.objects.create(
+                name=name or self.name,
+                description=self.description,
+                category_id=self.category_id,
+                difficulty=self.difficulty,
+                user=user,
+                forked_from_id=root_id,
+                total_cards=self.total_cards,
+                still_learning=self.total_cards,
+                hsk_level=self.hsk_level,
+            )
+            if self.forked_from_id:
+                copies = [
+                    card.copy_to(fork, source_card_id=card.source_card_id)
+                    for card in Flashcard.objects.filter(flashcard_set_id=self.pk).select_related('flashcard_set')
+                ]
+                Flashcard.objects.bulk_create(copies)
+                ReviewSchedule.create_for_cards(copies)
+                search.index_cards(copies, created=True)
+                ChangeLog.record_cards(copies)
+            FlashcardSet.objects.filter(pk=root_id).update(popularity=F('popularity') + 1)
+        return fork
+
+    def materialize_card(self, card):
+        """Копирует общую карточку в форк перед редактированием; прогресс переходит на копию"""
+        if card.flashcard_set_id == self.pk:
+            return card
+        with transaction.atomic():
+            mastered = ReviewSchedule.objects.filter(
+                user_id=self.user_id, flashcard=card
+            ).values_list('mastered', flat=True).first()
+            copy = card.copy_to(self, source_card_id=card.pk, mastered=bool(mastered))
+            Flashcard.objects.bulk_create([copy])
+            if not ReviewSchedule.objects.filter(user_id=self.user_id, flashcard=card).update(flashcard=copy):
+                ReviewSchedule.create_for_cards([copy])
+            search.index_cards([copy], created=True)
+            # Клиенты форка заменяют общую карточку копией
+            ChangeLog.record_cards([copy])
+            ChangeLog.record(self.user_id, self.pk, ChangeLog.CARD, [card.pk], ChangeLog.DELETE)
+        bump_user_version(self.user_id)
+        return copy
+
+    def materialize_shared_cards(self):
+        """Копирует все общие карточки в форк (перед удалением исходного набора)"""
+        copies = [
+            card.copy_to(self, source_card_id=card.pk)
+            for card in self.card_queryset().exclude(flashcard_set_id=self.pk)
+        ]
+        if not copies:
+            return
+        with transaction.atomic():
+            Flashcard.objects.bulk_create(copies)
+            # Прогресс пользователя переносится на копии одним UPDATE
+            ReviewSchedule.objects.filter(
+                user_id=self.user_id, flashcard__flashcard_set_id=self.forked_from_id
+            ).update(flashcard_id=Subquery(
+                Flashcard.objects.filter(
+                    flashcard_set_id=self.pk, source_card_id=OuterRef('flashcard_id')
+                ).values('id')[:1]
+            ))
+            Flashcard.objects.filter(
+                flashcard_set_id=self.pk, review_schedules__user_id=self.user_id, review_schedules__mastered=True
+            ).update(mastered=True)
+            ReviewSchedule.create_for_cards(copies)
+            search.index_cards(copies, created=True)
+            ChangeLog.record_cards(copies)
+            ChangeLog.record(
+                self.user_id, self.pk, ChangeLog.CARD, [copy.source_card_id for copy in copies], ChangeLog.DELETE
+            )
+
     def update_stats(self):
-        """Автоматическое обновление статистики"""
-        cards = self.flashcards.all()
-        self.total_cards = cards.count()
-        self.still_learning = cards.filter(mastered=False).count()
-        self.mastered = cards.filter(mastered=True).count()
-        self.save()
+        """Полный пересчёт статистики одним агрегирующим запросом"""
+        cards = self.card_queryset()
+        mastered = Q(mastered=True)
+        if self.forked_from_id:
+            # Для общих карточек форка статус изучения берётся из расписания владельца форка
+            cards = cards.annotate(overlay_mastered=Exists(ReviewSchedule.objects.filter(
+                user_id=self.user_id, flashcard=OuterRef('pk'), mastered=True
+            )))
+            mastered = Q(flashcard_set_id=self.pk, mastered=True) | ~Q(flashcard_set_id=self.pk) & Q(overlay_mastered=True)
+        stats = cards.aggregate(
+            total=Count('id'),
+            mastered=Count('id', filter=mastered),
+            hsk_level=Max('hsk_level'),
+        )
+        self.total_cards = stats['total']
+        self.mastered = stats['mastered']
+        self.still_learning = stats['total'] - stats['mastered']
+        FlashcardSet.objects.filter(pk=self.pk).update(
+            total_cards=self.total_cards,
+            still_learning=self.still_learning,
+            mastered=self.mastered,
+        )
+        FlashcardSet.raise_hsk_level(self.pk, stats['hsk_level'])
+        bump_user_version(self.user_id)
+
+    @classmethod
+    def recompute_stats(cls, set_ids):
+        """
+        Пересчёт счётчиков наборов и их форков одним UPDATE с коррелированными подзапросами
+        (те же правила, что в update_stats, включая общие карточки форков)
+        """
+        set_ids = list(set_ids)
+        if not set_ids:
+            return 0
+        sets = cls.objects.filter(Q(pk__in=set_ids) | Q(forked_from_id__in=set_ids))
+
+        def count(queryset):
+            return Coalesce(Subquery(
+                queryset.order_by().annotate(count=Func(F('id'), function='COUNT')).values('count')
+            ), 0)
+
+        own = Flashcard.objects.filter(flashcard_set_id=OuterRef('pk'))
+        # Карточки исходного набора, ещё не скопированные в форк (у обычного набора их нет)
+        shared = Flashcard.objects.filter(flashcard_set_id=OuterRef('forked_from_id')).exclude(
+            Exists(Flashcard.objects.filter(flashcard_set_id=OuterRef(OuterRef('pk')), source_card_id=OuterRef('pk')))
+        )
+        total = count(own) + count(shared)
+        mastered = count(own.filter(mastered=True)) + count(shared.filter(
+            review_schedules__user_id=OuterRef('user_id'), review_schedules__mastered=True
+        ))
+        updated = sets.update(total_cards=total, mastered=mastered, still_learning=total - mastered)
+        bump_user_version(*sets.values_list('user_id', flat=True).distinct())
+        return updated
+
+
+class CatalogFacet(models.Model):
+    """
+    Сводная таблица фасетов каталога публичных наборов (число наборов на значение).
+    Обновляется инкрементально при изменении наборов, а не GROUP BY на каждый запрос.
+    """
+    FACET_CHOICES = [
+        ('category', 'Категория'),
+        ('difficulty', 'Сложность'),
+        ('hsk_level', 'Уровень HSK'),
+    ]
+
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES, verbose_name="Фасет")
+    value = models.CharField(max_length=100, verbose_name="Значение")
+    count = models.IntegerField(default=0, verbose_name="Количество наборов")
+
+    class Meta:
+        verbose_name = "Фасет каталога"
+        verbose_name_plural = "Фасеты каталога"
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_catalog_facet'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+    @classmethod
+    def apply_delta(cls, old, new):
+        """old/new - словари {фасет: значение} до и после изменения набора"""
+        for facet, _ in cls.FACET_CHOICES:
+            old_value, new_value = old.get(facet), new.get(facet)
+            if old_value == new_value:
+                continue
+            if old_value is not None:
+                cls.objects.filter(facet=facet, value=str(old_value)).update(count=F('count') - 1)
+            if new_value is not None:
+                cls.increment(facet, str(new_value))
+
+    @classmethod
+    def increment(cls, facet, value):
+        if cls.objects.filter(facet=facet, value=value).update(count=F('count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(facet=facet, value=value, count=1)
+        except IntegrityError:
+            # Строку параллельно создал другой запрос
+            cls.objects.filter(facet=facet, value=value).update(count=F('count') + 1)
 
 
 class Flashcard(models.Model):
+    ENRICHMENT_PENDING = 'pending'
+    ENRICHMENT_DONE = 'done'
+    ENRICHMENT_FAILED = 'failed'
+    ENRICHMENT_CHOICES = [
+        (ENRICHMENT_PENDING, 'Ожидает перевода'),
+        (ENRICHMENT_DONE, 'Заполнена'),
+        (ENRICHMENT_FAILED, 'Перевод не получен'),
+    ]
+
     word = models.CharField(max_length=200, verbose_name="Слово (汉字)")
     translation = models.CharField(max_length=500, verbose_name="Перевод")
     pinyin = models.CharField(max_length=200, verbose_name="Пиньинь")
     definition = models.TextField(blank=True, verbose_name="Определение")
     example_sentence = models.TextField(blank=True, verbose_name="Пример предложения")
+    # Файлы адресуются по sha256 содержимого: одна запись на все карточки с одинаковым аудио
     audio_pronunciation = models.FileField(
         upload_to='flashcard_audio/',
+        storage=get_audio_storage,
+        max_length=200,
         null=True,
         blank=True,
         verbose_name="Аудио произношение"
@@ -78,6 +386,12 @@ class Flashcard(models.Model):
         blank=True,
         verbose_name="Уровень HSK"
     )
+    hsk3_level = models.IntegerField(
+        choices=[(i, f'HSK 3.0 {i}') for i in range(1, 10)],
+        null=True,
+        blank=True,
+        verbose_name="Уровень HSK 3.0"
+    )
     flashcard_set = models.ForeignKey(
         FlashcardSet,
         on_delete=models.CASCADE,
@@ -85,6 +399,21 @@ class Flashcard(models.Model):
         verbose_name="Набор карточек"
     )
     mastered = models.BooleanField(default=False, verbose_name="Изучено")
+    # Перевод и определение заполняются фоновым воркером (cards/enrichment.py)
+    enrichment_status = models.CharField(
+        max_length=10,
+        choices=ENRICHMENT_CHOICES,
+        default=ENRICHMENT_DONE,
+        verbose_name="Статус заполнения"
+    )
+    source_card = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='copies',
+        verbose_name="Исходная карточка (для форков)"
+    )
     created_date = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     last_modified = models.DateTimeField(auto_now=True, verbose_name="Последнее изменение")
 
@@ -95,21 +424,352 @@ class Flashcard(models.Model):
         indexes = [
             models.Index(fields=['word', 'pinyin']),
             models.Index(fields=['hsk_level']),
+            models.Index(fields=['hsk3_level']),
+            # Keyset-пагинация карточек набора и ETag по последнему изменению
+            models.Index(fields=['flashcard_set', 'created_date', 'id']),
+            models.Index(fields=['flashcard_set', 'last_modified']),
         ]
 
     def __str__(self):
         return f"{self.word} - {self.translation}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем состояние из БД, чтобы считать дельты статистики при сохранении
+        instance._stats_state = instance._get_stats_state()
+        instance._search_state = instance._get_search_state()
+        instance._hsk_level_state = instance.hsk_level if 'hsk_level' not in instance.get_deferred_fields() else None
+        return instance
+
+    def _get_stats_state(self):
+        deferred = self.get_deferred_fields()
+        if 'flashcard_set_id' in deferred or 'mastered' in deferred:
+            return None
+        return self.flashcard_set_id, self.mastered
+
+    SEARCH_FIELDS = ('word', 'pinyin', 'translation', 'definition', 'flashcard_set_id')
+    CONTENT_FIELDS = ('word', 'translation', 'pinyin', 'definition', 'example_sentence',
+                      'audio_pronunciation', 'hsk_level', 'hsk3_level')
+
+    def copy_to(self, flashcard_set, **kwargs):
+        """Несохранённая копия содержимого карточки (файл аудио не копируется, только ссылка)"""
+        content = {field: getattr(self, field) for field in self.CONTENT_FIELDS}
+        content.update(kwargs)
+        return Flashcard(flashcard_set=flashcard_set, **content)
+
+    def _get_search_state(self):
+        deferred = self.get_deferred_fields()
+        if any(field in deferred for field in self.SEARCH_FIELDS):
+            return None
+        return tuple(getattr(self, field) for field in self.SEARCH_FIELDS)
+
     def save(self, *args, **kwargs):
-        # Сначала сохраняем карточку
-        super().save(*args, **kwargs)
-        # Затем обновляем статистику набора
-        self.flashcard_set.update_stats()
+        adding = self._state.adding
+        if adding:
+            # Уровень HSK по словарю, если не указан вручную
+            hsk.tag_card(self)
+        previous = getattr(self, '_stats_state', None)
+        previous_search = getattr(self, '_search_state', None)
+
+        with transaction.atomic():
+            # Сначала сохраняем карточку
+            super().save(*args, **kwargs)
+
+            # Затем обновляем статистику набора только если она изменилась
+            current = self._get_stats_state()
+            # Поисковый индекс обновляется в той же транзакции, если изменились индексируемые поля
+            if previous_search is None or previous_search != self._get_search_state():
+                search.index_cards([self], created=adding)
+
+            # Максимальный уровень HSK набора (для фильтра каталога)
+            if self.hsk_level and self.hsk_level != getattr(self, '_hsk_level_state', None):
+                FlashcardSet.raise_hsk_level(self.flashcard_set_id, self.hsk_level)
+
+            if adding:
+                FlashcardSet.apply_stats_delta(self.flashcard_set_id, total=1, mastered=int(self.mastered))
+                ReviewSchedule.create_for_cards([self])
+            elif previous is None or current is None:
+                # Исходное состояние неизвестно - пересчитываем полностью
+                self.flashcard_set.update_stats()
+            elif previous[0] == current[0]:
+                # Изменился только статус изучения
+                FlashcardSet.apply_stats_delta(self.flashcard_set_id, mastered=int(current[1]) - int(previous[1]))
+            else:
+                # Карточка перенесена в другой набор
+                FlashcardSet.apply_stats_delta(previous[0], total=-1, mastered=-int(previous[1]), card_id=self.pk)
+                FlashcardSet.apply_stats_delta(current[0], total=1, mastered=int(current[1]), card_id=self.pk)
+
+        self._stats_state = self._get_stats_state()
+        self._search_state = self._get_search_state()
+        self._hsk_level_state = self.hsk_level
 
     def delete(self, *args, **kwargs):
-        # Запоминаем набор перед удалением
-        flashcard_set = self.flashcard_set
-        # Удаляем карточку
-        super().delete(*args, **kwargs)
-        # Обновляем статистику набора
-        flashcard_set.update_stats()
\ No newline at end of file
+        # Запоминаем набор и статус до удаления
+        flashcard_set_id, mastered = getattr(self, '_stats_state', None) or (self.flashcard_set_id, self.mastered)
+        with transaction.atomic():
+            # Статистика обновляется до удаления: дельта форков считается по копиям и расписаниям карточки
+            FlashcardSet.apply_stats_delta(flashcard_set_id, total=-1, mastered=-int(mastered), card_id=self.pk)
+            # Удаляем карточку (из поискового индекса - сигналом post_delete)
+            return super().delete(*args, **kwargs)
+
+
+class ReviewSchedule(models.Model):
+    """Расписание интервального повторения карточки (SM-2)"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='review_schedules',
+        verbose_name="Пользователь"
+    )
+    flashcard = models.ForeignKey(
+        Flashcard,
+        on_delete=models.CASCADE,
+        related_name='review_schedules',
+        verbose_name="Карточка"
+    )
+    ease = models.FloatField(default=2.5, verbose_name="Лёгкость")
+    interval = models.IntegerField(default=0, verbose_name="Интервал (дней)")
+    repetitions = models.IntegerField(default=0, verbose_name="Успешных повторений подряд")
+    lapses = models.IntegerField(default=0, verbose_name="Забываний")
+    due = models.DateTimeField(verbose_name="Следующее повторение")
+    last_reviewed = models.DateTimeField(null=True, blank=True, verbose_name="Последнее повторение")
+    # Прогресс пользователя по карточке: для общих карточек форка это единственное место,
+    # где хранится статус изучения (Flashcard.mastered принадлежит владельцу исходного набора)
+    mastered = models.BooleanField(default=False, verbose_name="Изучено")
+
+    class Meta:
+        verbose_name = "Расписание повторения"
+        verbose_name_plural = "Расписания повторения"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'flashcard'], name='unique_review_schedule'),
+        ]
+        indexes = [
+            # Очередь "что повторять сейчас" - один проход по диапазону индекса
+            models.Index(fields=['user', 'due']),
+        ]
+
+    def __str__(self):
+        return f"{self.flashcard_id} -> {self.due:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def create_for_cards(cls, cards):
+        """Новые карточки сразу попадают в очередь повторения владельца набора"""
+        now = timezone.now()
+        return cls.objects.bulk_create([
+            cls(user_id=card.flashcard_set.user_id, flashcard=card, due=card.created_date or now)
+            for card in cards
+        ], ignore_conflicts=True)
+
+
+class CachedTranslation(models.Model):
+    """Кэш ответов сервиса перевода (второй уровень после LRU в памяти процесса)"""
+    word = models.CharField(max_length=200, verbose_name="Слово")
+    source_language = models.CharField(max_length=10, verbose_name="Исходный язык")
+    target_language = models.CharField(max_length=10, verbose_name="Язык перевода")
+    data = models.JSONField(verbose_name="Ответ сервиса перевода")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата получения")
+    last_used = models.DateTimeField(auto_now_add=True, verbose_name="Последнее использование")
+
+    class Meta:
+        verbose_name = "Кэшированный перевод"
+        verbose_name_plural = "Кэшированные переводы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['word', 'source_language', 'target_language'],
+                name='unique_cached_translation'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['last_used']),
+        ]
+
+    def __str__(self):
+        return f"{self.word} ({self.source_language} -> {self.target_language})"
+
+
+class EnrichmentJob(models.Model):
+    """
+    Очередь заполнения карточек переводом (manage.py enrichment_worker).
+    Задача берётся воркером на время аренды (locked_until): если воркер упал,
+    по истечении аренды её заберёт другой. Выполненные задачи удаляются,
+    исчерпавшие попытки остаются со статусом failed.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    flashcard = models.OneToOneField(
+        Flashcard,
+        on_delete=models.CASCADE,
+        related_name='enrichment_job',
+        verbose_name="Карточка"
+    )
+    destination_language = models.CharField(max_length=10, default='ru', verbose_name="Язык перевода")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Статус")
+    attempts = models.IntegerField(default=0, verbose_name="Попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="Аренда до")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последнее изменение")
+
+    class Meta:
+        verbose_name = "Задача заполнения карточки"
+        verbose_name_plural = "Задачи заполнения карточек"
+        indexes = [
+            # Выборка готовых к выполнению задач - диапазон по одному индексу
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.flashcard_id}: {self.status} ({self.attempts})"
+
+
+class ChangeLog(models.Model):
+    """
+    Журнал изменений наборов и карточек для синхронизации клиентов (GET /api/sync/).
+    id - курсор синхронизации; удалённые объекты остаются записями delete (tombstone).
+    Изменения карточек исходного набора видны владельцам форков через flashcard_set_id.
+    """
+    SET = 'set'
+    CARD = 'card'
+    MODEL_CHOICES = [(SET, 'Набор'), (CARD, 'Карточка')]
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [(UPSERT, 'Создание или изменение'), (DELETE, 'Удаление')]
+
+    # Без ограничения в БД: при удалении пользователя его наборы пишут tombstone
+    # уже после того, как каскад собрал записи журнала
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    # Без внешнего ключа: запись об удалении переживает сам набор
+    flashcard_set_id = models.BigIntegerField(verbose_name="Набор")
+    model = models.CharField(max_length=4, choices=MODEL_CHOICES, verbose_name="Тип объекта")
+    object_id = models.BigIntegerField(verbose_name="ID объекта")
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES, verbose_name="Действие")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Время изменения")
+
+    class Meta:
+        verbose_name = "Изменение"
+        verbose_name_plural = "Журнал изменений"
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['flashcard_set_id', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.action} {self.model} {self.object_id}"
+
+    @classmethod
+    def record(cls, user_id, flashcard_set_id, model, object_ids, action):
+        return cls.objects.bulk_create([
+            cls(user_id=user_id, flashcard_set_id=flashcard_set_id, model=model, object_id=object_id, action=action)
+            for object_id in object_ids
+        ])
+
+    @classmethod
+    def record_cards(cls, cards, action=UPSERT, user_id=None):
+        """Одна вставка на пачку карточек; владелец - владелец набора карточки или user_id"""
+        return cls.objects.bulk_create([
+            cls(
+                user_id=user_id or card.flashcard_set.user_id,
+                flashcard_set_id=card.flashcard_set_id,
+                model=cls.CARD,
+                object_id=card.pk,
+                action=action,
+            )
+            for card in cards
+        ])
+
+
+class ReviewLog(models.Model):
+    """
+    Журнал ответов на карточки - источник для дневных агрегатов DailyStudyStats
+    (manage.py rollup_study_stats). Карточка и набор хранятся без внешних ключей,
+    чтобы история переживала их удаление.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    # Набор пользователя: для общей карточки форка - сам форк
+    flashcard_set_id = models.BigIntegerField(verbose_name="Набор")
+    flashcard_id = models.BigIntegerField(verbose_name="Карточка")
+    grade = models.SmallIntegerField(verbose_name="Оценка")
+    reviewed_at = models.DateTimeField(verbose_name="Время ответа")
+    duration_ms = models.IntegerField(default=0, verbose_name="Время на ответ (мс)")
+    # Первый ответ на карточку за день (для числа изученных за день карточек)
+    first_of_day = models.BooleanField(default=True, verbose_name="Первый ответ за день")
+    # +1 - карточка стала изученной, -1 - перестала
+    mastered_change = models.SmallIntegerField(default=0, verbose_name="Изменение статуса изучения")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Время записи")
+
+    class Meta:
+        verbose_name = "Ответ на карточку"
+        verbose_name_plural = "Журнал ответов"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.flashcard_id} -> {self.grade}"
+
+
+class DailyStudyStats(models.Model):
+    """Дневные агрегаты занятий пользователя по набору (обновляются инкрементально из ReviewLog)"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    flashcard_set_id = models.BigIntegerField(verbose_name="Набор")
+    date = models.DateField(verbose_name="День")
+    reviews = models.IntegerField(default=0, verbose_name="Ответов")
+    cards_studied = models.IntegerField(default=0, verbose_name="Карточек")
+    correct = models.IntegerField(default=0, verbose_name="Правильных ответов")
+    newly_mastered = models.IntegerField(default=0, verbose_name="Изучено")
+    forgotten = models.IntegerField(default=0, verbose_name="Забыто изученных")
+    time_spent_ms = models.BigIntegerField(default=0, verbose_name="Время занятий (мс)")
+
+    class Meta:
+        verbose_name = "Статистика занятий за день"
+        verbose_name_plural = "Статистика занятий по дням"
+        constraints = [
+            # Диапазон дат по набору - диапазон этого индекса
+            models.UniqueConstraint(fields=['user', 'flashcard_set_id', 'date'], name='unique_daily_study_stats'),
+        ]
+        indexes = [
+            # График по всем наборам пользователя
+            models.Index(fields=['user', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.reviews}"
+
+
+class RollupCursor(models.Model):
+    """Позиция фоновой агрегации в журнале (id последней учтённой записи)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Агрегация")
+    position = models.BigIntegerField(default=0, verbose_name="Последний учтённый id")
+
+    class Meta:
+        verbose_name = "Позиция агрегации"
+        verbose_name_plural = "Позиции агрегации"
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
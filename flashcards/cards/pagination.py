@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FlashcardCursorPagination(CursorPagination):
+    """Keyset-пагинация по (created_date, id): стоимость страницы не зависит от её номера"""
+    ordering = ('created_date', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Keyset-пагинация каталога; порядок задаётся параметром ?sort=popular|recent"""
+    orderings = {
+        'recent': ('-creation_date', '-id'),
+        'popular': ('-popularity', '-id'),
+    }
+    ordering = orderings['recent']
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('sort'), self.ordering)
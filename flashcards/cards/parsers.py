@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+# Порядок колонок для файлов без заголовка (экспорт Anki: лицевая сторона, оборотная, ...)
+DEFAULT_COLUMNS = ['word', 'translation', 'pinyin', 'definition', 'example_sentence', 'hsk_level']
+
+
+def parse_rows(text, delimiter):
+    """Разбирает CSV/TSV текст в список словарей.
+
+    Если первая строка содержит колонку ``word`` — она считается заголовком,
+    иначе используется порядок колонок ``DEFAULT_COLUMNS``.
+    Строки-директивы Anki (``#separator:tab``, ``#html:false``) пропускаются.
+    """
+    # Текст целиком идёт в csv.reader: поле в кавычках может содержать переводы строк
+    records = [
+        values for values in csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+        if any(value.strip() for value in values) and not values[0].startswith('#')
+    ]
+    if not records:
+        return []
+
+    header = [column.strip().lower() for column in records[0]]
+    if 'word' in header:
+        columns, records = header, records[1:]
+    else:
+        columns = DEFAULT_COLUMNS
+
+    rows = []
+    for values in records:
+        row = {}
+        for column, value in zip(columns, values):
+            value = value.strip()
+            if column and value:
+                row[column] = value
+        rows.append(row)
+    return rows
+
+
+def parse_upload(uploaded_file):
+    """Разбирает загруженный файл, формат определяется по расширению"""
+    text = uploaded_file.read().decode('utf-8-sig')
+    name = (uploaded_file.name or '').lower()
+    if name.endswith('.json'):
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise ParseError(f'JSON parse error - {e}')
+    delimiter = ',' if name.endswith('.csv') else '\t'
+    return parse_rows(text, delimiter)
+
+
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+    delimiter = ','
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        try:
+            text = stream.read().decode(encoding)
+        except UnicodeDecodeError as e:
+            raise ParseError(f'Encoding error - {e}')
+        return parse_rows(text.lstrip('\ufeff'), self.delimiter)
+
+
+class TSVParser(CSVParser):
+    """Anki-style TSV (Notes in Plain Text)"""
+    media_type = 'text/tab-separated-values'
+    delimiter = '\t'
@@ -0,0 +1,78 @@
+import re
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from pypinyin import Style, load_phrases_dict, pinyin
+
+# Стили вывода: тоновые знаки (nǐ hǎo), цифры тонов (ni3 hao3), без тонов (ni hao)
+STYLES = {
+    'tone': Style.TONE,
+    'numeric': Style.TONE3,
+    'toneless': Style.NORMAL,
+}
+
+# Контекстные чтения многозначных иероглифов, которые pypinyin определяет неточно
+PHRASES = {
+    '地方': [['dì'], ['fang']],
+    '东西': [['dōng'], ['xi']],
+    '朋友': [['péng'], ['you']],
+    '衣服': [['yī'], ['fu']],
+    '告诉': [['gào'], ['su']],
+    '喜欢': [['xǐ'], ['huan']],
+    '时候': [['shí'], ['hou']],
+    '认识': [['rèn'], ['shi']],
+    '漂亮': [['piào'], ['liang']],
+    '明白': [['míng'], ['bai']],
+}
+
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+_phrases_lock = threading.Lock()
+_phrases_loaded = False
+
+
+def _load_phrases():
+    """Однократная загрузка контекстного словаря фраз в pypinyin"""
+    global _phrases_loaded
+    if _phrases_loaded:
+        return
+    with _phrases_lock:
+        if not _phrases_loaded:
+            load_phrases_dict(PHRASES)
+            load_phrases_dict(getattr(settings, 'PINYIN_PHRASES', {}))
+            _phrases_loaded = True
+
+
+def _convert(text, style, heteronym=False):
+    _load_phrases()
+    return pinyin(
+        text,
+        style=STYLES[style],
+        heteronym=heteronym,
+        neutral_tone_with_five=True,
+        errors='default',
+    )
+
+
+@lru_cache(maxsize=8192)
+def char_pinyin(char, style='tone'):
+    """Все чтения одного иероглифа (кортеж, первое - основное)"""
+    return tuple(_convert(char, style, heteronym=True)[0])
+
+
+@lru_cache(maxsize=50000)
+def get_pinyin(text, style='tone'):
+    """Пиньинь слова или фразы с учётом контекста (多音字 разрешаются по словарю фраз)"""
+    if not text or not CHINESE_PATTERN.search(text):
+        return text
+    if len(text) == 1:
+        return char_pinyin(text, style)[0]
+
+    syllables = [item[0].strip() for item in _convert(text, style)]
+    return ' '.join(syllable for syllable in syllables if syllable)
+
+
+def clear_cache():
+    char_pinyin.cache_clear()
+    get_pinyin.cache_clear()
@@ -0,0 +1,309 @@
+"""
+Тесты с выбором ответа: неправильные варианты - похожие карточки, а не случайные.
+
+Каждая карточка - разреженный вектор признаков (hashing trick): иероглифы и пары
+иероглифов слова, слоги пиньиня без тонов и уровень HSK. Векторы нормированы, матрица
+хранится строками (CSR) и списками карточек по признаку, поэтому косинусная близость
+вопроса со всеми карточками - np.bincount по спискам его 5-10 признаков,
+а top-k вариантов - np.argpartition без сортировки всего набора.
+
+Матрица набора хранится в памяти процесса (LRU на QUIZ['MAX_CACHED_SETS'] наборов) вместе
+с отметкой состояния: числом карточек и последним изменением. Отметка проверяется одним
+агрегатом по индексу (flashcard_set, last_modified); если набор изменился, пересчитываются
+только строки новых и изменённых карточек. Если в наборе не хватает разных переводов,
+варианты добираются из общего словаря публичных наборов (обновляется раз в QUIZ['GLOBAL_TTL']).
+"""
+import math
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Flashcard
+from .pinyin_engine import get_pinyin
+
+DEFAULTS = {
+    # Размер пространства признаков; матрица разреженная, память от него не зависит
+    'FEATURE_SPACE': 2 ** 20,
+    'CHOICES': 4,  # вариантов ответа, включая правильный
+    'MAX_QUESTIONS': 100,
+    'MAX_CACHED_SETS': 256,
+    'GLOBAL_MAX_WORDS': 20000,
+    'GLOBAL_TTL': 10 * 60,
+    # Случайная добавка к близости: одинаковые вопросы получают разные варианты
+    'JITTER': 0.05,
+}
+# Веса групп признаков
+CHARACTER_WEIGHT = 1.5
+BIGRAM_WEIGHT = 1.0
+SYLLABLE_WEIGHT = 1.0
+HSK_WEIGHT = 0.7
+
+CARD_FIELDS = ('id', 'word', 'pinyin', 'translation', 'hsk_level')
+
+
+def get_option(name):
+    return getattr(settings, 'QUIZ', {}).get(name, DEFAULTS[name])
+
+
+def card_features(word, hsk_level):
+    """Признаки карточки с весами: иероглифы, пары иероглифов, слоги без тонов, уровень HSK"""
+    characters = [char for char in word if not char.isspace()]
+    features = [(f'c:{char}', CHARACTER_WEIGHT) for char in characters]
+    features += [(f'b:{a}{b}', BIGRAM_WEIGHT) for a, b in zip(characters, characters[1:])]
+    features += [(f's:{syllable}', SYLLABLE_WEIGHT) for syllable in get_pinyin(word, 'toneless').split()]
+    if hsk_level:
+        features.append((f'h:{hsk_level}', HSK_WEIGHT))
+    return features
+
+
+def feature_rows(cards):
+    """Нормированные строки признаков карточек в формате CSR: (row_ptr, columns, weights)"""
+    space = get_option('FEATURE_SPACE')
+    row_ptr, columns, weights = [0], [], []
+    for card in cards:
+        vector = {}
+        for feature, weight in card_features(card['word'], card['hsk_level']):
+            column = zlib.crc32(feature.encode()) % space
+            vector[column] = vector.get(column, 0.0) + weight
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        columns.extend(vector)
+        weights.extend(weight / norm for weight in vector.values())
+        row_ptr.append(len(columns))
+    return (np.array(row_ptr, dtype=np.int64), np.array(columns, dtype=np.int64),
+            np.array(weights, dtype=np.float32))
+
+
+def segments(starts, ends):
+    """Индексы, составляющие отрезки [starts[i], ends[i]) подряд"""
+    lengths = ends - starts
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum()), lengths
+
+
+class Vocabulary:
+    """Карточки и их матрица признаков; не меняется после создания (обновление - новый объект)"""
+
+    def __init__(self, cards, rows, stamp=None):
+        self.cards = cards
+        self.row_ptr, self.columns, self.weights = rows
+        self.stamp = stamp
+        self.rows = {card['id']: row for row, card in enumerate(cards)}
+        # Одинаковые переводы - один код: такие карточки не становятся вариантами друг для друга
+        codes = {}
+        self.translation_codes = np.array(
+            [codes.setdefault(card['translation'].strip().lower(), len(codes)) for card in cards], dtype=np.int64
+        )
+        # Списки карточек по признаку: элементы матрицы, отсортированные по столбцу
+        entry_rows = np.repeat(np.arange(len(cards)), np.diff(self.row_ptr))
+        order = np.argsort(self.columns, kind='stable')
+        self.sorted_columns = self.columns[order]
+        self.posting_rows = entry_rows[order]
+        self.posting_weights = self.weights[order]
+
+    @classmethod
+    def build(cls, cards, stamp=None):
+        return cls(cards, feature_rows(cards), stamp)
+
+    def take_rows(self, rows):
+        """Строки CSR для карточек rows (в этом порядке)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        index, lengths = segments(self.row_ptr[rows], self.row_ptr[rows + 1])
+        return np.concatenate([[0], np.cumsum(lengths)]), self.columns[index], self.weights[index]
+
+    def updated(self, card_ids, changed, stamp):
+        """Новая версия: строки неизменённых карточек копируются, считаются только changed"""
+        changed = {card['id']: card for card in changed}
+        kept = [card_id for card_id in card_ids if card_id not in changed and card_id in self.rows]
+        fresh = [changed[card_id] for card_id in card_ids if card_id in changed]
+        # Карточка без изменений, которой нет в матрице (например, вернулась из копии форка)
+        missing = [card_id for card_id in card_ids if card_id not in changed and card_id not in self.rows]
+        if missing:
+            fresh += list(Flashcard.objects.filter(id__in=missing).values(*CARD_FIELDS))
+
+        kept_rows = [self.rows[card_id] for card_id in kept]
+        row_ptr, columns, weights = self.take_rows(kept_rows)
+        fresh_ptr, fresh_columns, fresh_weights = feature_rows(fresh)
+        rows = (
+            np.concatenate([row_ptr, fresh_ptr[1:] + row_ptr[-1]]),
+            np.concatenate([columns, fresh_columns]),
+            np.concatenate([weights, fresh_weights]),
+        )
+        return Vocabulary([self.cards[row] for row in kept_rows] + fresh, rows, stamp)
+
+    def similarity(self, rows, target):
+        """Косинусная близость карточек rows этого словаря со всеми карточками target (вопрос x карточка)"""
+        scores = np.zeros((len(rows), len(target.cards)), dtype=np.float32)
+        for position, row in enumerate(rows):
+            start, end = self.row_ptr[row], self.row_ptr[row + 1]
+            columns = self.columns[start:end]
+            index, lengths = segments(
+                np.searchsorted(target.sorted_columns, columns, 'left'),
+                np.searchsorted(target.sorted_columns, columns, 'right'),
+            )
+            scores[position] = np.bincount(
+                target.posting_rows[index],
+                weights=target.posting_weights[index] * np.repeat(self.weights[start:end], lengths),
+                minlength=len(target.cards),
+            )
+        return scores
+
+
+class VocabularyCache:
+    """LRU словарей наборов в памяти процесса"""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._global = None
+        self._global_expires = 0
+
+    def get(self, key):
+        with self._lock:
+            vocabulary = self._data.get(key)
+            if vocabulary is not None:
+                self._data.move_to_end(key)
+            return vocabulary
+
+    def set(self, key, vocabulary):
+        with self._lock:
+            self._data[key] = vocabulary
+            self._data.move_to_end(key)
+            while len(self._data) > get_option('MAX_CACHED_SETS'):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._global = None
+            self._global_expires = 0
+
+    def set_vocabulary(self, flashcard_set):
+        """Словарь набора (для форка - вместе с общими карточками), обновлённый до текущего состояния"""
+        cards = flashcard_set.card_queryset()
+        state = cards.aggregate(count=Count('id'), last_modified=Max('last_modified'))
+        stamp = (state['count'], state['last_modified'])
+        vocabulary = self.get(flashcard_set.pk)
+        if vocabulary is not None and vocabulary.stamp == stamp:
+            return vocabulary
+
+        if vocabulary is None or vocabulary.stamp[1] is None:
+            vocabulary = Vocabulary.build(list(cards.order_by('id').values(*CARD_FIELDS)), stamp)
+        else:
+            card_ids = list(cards.order_by('id').values_list('id', flat=True))
+            changed = cards.filter(last_modified__gte=vocabulary.stamp[1]).values(*CARD_FIELDS)
+            vocabulary = vocabulary.updated(card_ids, list(changed), stamp)
+        self.set(flashcard_set.pk, vocabulary)
+        return vocabulary
+
+    def global_vocabulary(self):
+        """Слова публичных наборов (разные слова, не больше GLOBAL_MAX_WORDS самых новых)"""
+        with self._lock:
+            if self._global is not None and self._global_expires > time.monotonic():
+                return self._global
+        cards, words = [], set()
+        rows = Flashcard.objects.filter(flashcard_set__is_public=True).exclude(translation='').order_by('-id')
+        for card in rows.values(*CARD_FIELDS)[:get_option('GLOBAL_MAX_WORDS') * 2]:
+            if card['word'] not in words and len(cards) < get_option('GLOBAL_MAX_WORDS'):
+                words.add(card['word'])
+                cards.append(card)
+        vocabulary = Vocabulary.build(cards)
+        with self._lock:
+            self._global = vocabulary
+            self._global_expires = time.monotonic() + get_option('GLOBAL_TTL')
+        return vocabulary
+
+
+vocabulary_cache = VocabularyCache()
+
+
+def pick_distractors(scores, codes, answer_codes, count, pool_size):
+    """
+    Для каждой строки scores (вопрос x карточки) - до count индексов самых близких карточек
+    с разными переводами, отличными от правильного
+    """
+    pool_size = min(pool_size, scores.shape[1])
+    if pool_size == 0:
+        return [[] for _ in range(scores.shape[0])]
+    scores = np.where(codes[np.newaxis, :] == answer_codes[:, np.newaxis], -np.inf, scores)
+    candidates = np.argpartition(-scores, pool_size - 1, axis=1)[:, :pool_size]
+    picked = []
+    for row, row_candidates in enumerate(candidates):
+        order = row_candidates[np.argsort(-scores[row, row_candidates])]
+        chosen, seen = [], set()
+        for index in order:
+            if len(chosen) == count or scores[row, index] == -np.inf:
+                break
+            if codes[index] not in seen:
+                seen.add(codes[index])
+                chosen.append(index)
+        picked.append(chosen)
+    return picked
+
+
+def generate_quiz(flashcard_set, questions=20, choices=None, seed=None):
+    """
+    Вопросы по карточкам набора: слово и choices вариантов перевода, один из которых верный.
+    Варианты - самые похожие карточки набора (при нехватке - общего словаря).
+    """
+    choices = choices or get_option('CHOICES')
+    vocabulary = vocabulary_cache.set_vocabulary(flashcard_set)
+    answerable = np.flatnonzero(np.array([bool(card['translation']) for card in vocabulary.cards], dtype=bool))
+    if not len(answerable):
+        return []
+
+    rng = np.random.default_rng(seed)
+    question_rows = rng.choice(answerable, size=min(questions, len(answerable)), replace=False)
+    answer_codes = vocabulary.translation_codes[question_rows]
+    needed = choices - 1
+    pool_size = needed * 4
+    jitter = get_option('JITTER')
+
+    def scored(target):
+        scores = vocabulary.similarity(question_rows, target)
+        if jitter:
+            scores += rng.uniform(0, jitter, size=scores.shape).astype(np.float32)
+        return scores
+
+    local = pick_distractors(scored(vocabulary), vocabulary.translation_codes, answer_codes, needed, pool_size)
+    options = [[vocabulary.cards[index]['translation'] for index in row] for row in local]
+
+    if any(len(row) < needed for row in options):
+        # В наборе мало разных переводов - добираем из общего словаря
+        global_vocabulary = vocabulary_cache.global_vocabulary()
+        if global_vocabulary.cards:
+            answers = [vocabulary.cards[row]['translation'] for row in question_rows]
+            global_scores = scored(global_vocabulary)
+            for row, (answer, taken) in enumerate(zip(answers, options)):
+                if len(taken) >= needed:
+                    continue
+                exclude = {answer.strip().lower(), *(text.strip().lower() for text in taken)}
+                size = min(pool_size + len(exclude), len(global_vocabulary.cards))
+                top = np.argpartition(-global_scores[row], size - 1)[:size]
+                for index in top[np.argsort(-global_scores[row, top])]:
+                    text = global_vocabulary.cards[index]['translation']
+                    if text.strip().lower() not in exclude:
+                        exclude.add(text.strip().lower())
+                        taken.append(text)
+                        if len(taken) == needed:
+                            break
+
+    shuffle = random.Random(seed)
+    quiz = []
+    for row, distractors in zip(question_rows, options):
+        card = vocabulary.cards[row]
+        variants = [card['translation'], *distractors]
+        shuffle.shuffle(variants)
+        quiz.append({
+            'card_id': card['id'],
+            'word': card['word'],
+            'pinyin': card['pinyin'],
+            'choices': variants,
+            'answer_index': variants.index(card['translation']),
+        })
+    return quiz
@@ -0,0 +1,159 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChangeLog, Flashcard, FlashcardSet, ReviewLog, ReviewSchedule
+
+# Карточка считается изученной, когда интервал повторения достигает этого числа дней
+MASTERED_INTERVAL_DAYS = getattr(settings, 'REVIEW_MASTERED_INTERVAL_DAYS', 21)
+MIN_EASE = 1.3
+
+
+def apply_sm2(schedule, grade, reviewed_at):
+    """
+    Алгоритм SM-2. grade: 0-5 (0-2 - не вспомнил, 3 - с трудом, 4 - хорошо, 5 - легко).
+    """
+    if grade >= 3:
+        if schedule.repetitions == 0:
+            schedule.interval = 1
+        elif schedule.repetitions == 1:
+            schedule.interval = 6
+        else:
+            schedule.interval = max(1, round(schedule.interval * schedule.ease))
+        schedule.repetitions += 1
+    else:
+        schedule.repetitions = 0
+        schedule.interval = 1
+        schedule.lapses += 1
+
+    schedule.ease = max(MIN_EASE, schedule.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    schedule.due = reviewed_at + timedelta(days=schedule.interval)
+    schedule.last_reviewed = reviewed_at
+    return schedule
+
+
+def submit_reviews(user, reviews):
+    """
+    Применяет пачку ответов (например, офлайн-сессию мобильного клиента) одной транзакцией.
+    reviews - список словарей {card_id, grade, reviewed_at, duration_ms}; ответы применяются по времени,
+    повторно присланные (не новее последнего применённого) пропускаются.
+    Применённые ответы записываются в ReviewLog для статистики занятий.
+    """
+    now = timezone.now()
+    reviews = sorted(reviews, key=lambda review: review.get('reviewed_at') or now)
+    card_ids = {review['card_id'] for review in reviews}
+    results = []
+
+    with transaction.atomic():
+        # Свои карточки и общие карточки наборов, от которых у пользователя есть форк
+        cards = Flashcard.objects.filter(
+            Q(flashcard_set__user=user) | Q(flashcard_set__forks__user=user),
+            id__in=card_ids
+        ).select_related('flashcard_set').in_bulk()
+        schedules = {
+            schedule.flashcard_id: schedule
+            for schedule in ReviewSchedule.objects.select_for_update().filter(user=user, flashcard_id__in=cards)
+        }
+        new_schedules = []
+        changed = {}
+        previous_mastered = {}
+        applied = []
+
+        def owned(card):
+            return card.flashcard_set.user_id == user.id
+
+        for review in reviews:
+            card = cards.get(review['card_id'])
+            if card is None:
+                results.append({'card_id': review['card_id'], 'status': 'not_found'})
+                continue
+
+            schedule = schedules.get(card.id)
+            if schedule is None:
+                schedule = ReviewSchedule(user=user, flashcard=card, due=now)
+                schedules[card.id] = schedule
+                new_schedules.append(schedule)
+
+            reviewed_at = review.get('reviewed_at') or now
+            if schedule.last_reviewed and reviewed_at <= schedule.last_reviewed:
+                results.append({'card_id': card.id, 'status': 'duplicate'})
+                continue
+
+            if card.id not in changed:
+                # Статус до пачки: своя карточка - Flashcard.mastered, общая карточка форка - расписание
+                previous_mastered[card.id] = card.mastered if owned(card) else schedule.mastered
+            was_mastered = schedule.mastered if card.id in changed else previous_mastered[card.id]
+            last_reviewed = schedule.last_reviewed
+            # Изученной до порога интервала карточку отметил пользователь: ответы эту отметку не снимают.
+            # Отметка по порогу снимается, когда интервал после ошибки снова меньше порога
+            marked_manually = was_mastered and schedule.interval < MASTERED_INTERVAL_DAYS
+            apply_sm2(schedule, review['grade'], reviewed_at)
+            schedule.mastered = marked_manually or schedule.interval >= MASTERED_INTERVAL_DAYS
+            changed[card.id] = schedule
+            applied.append(ReviewLog(
+                user=user,
+                flashcard_id=card.id,
+                grade=review['grade'],
+                reviewed_at=reviewed_at,
+                duration_ms=review.get('duration_ms') or 0,
+                first_of_day=last_reviewed is None or timezone.localdate(last_reviewed) != timezone.localdate(reviewed_at),
+                mastered_change=int(schedule.mastered) - int(was_mastered),
+            ))
+            results.append({
+                'card_id': card.id,
+                'status': 'ok',
+                'due': schedule.due,
+                'interval': schedule.interval,
+                'ease': round(schedule.ease, 2),
+            })
+
+        created = {id(schedule) for schedule in new_schedules}
+        ReviewSchedule.objects.bulk_create(new_schedules)
+        ReviewSchedule.objects.bulk_update(
+            [schedule for schedule in changed.values() if id(schedule) not in created],
+            ['ease', 'interval', 'repetitions', 'lapses', 'due', 'last_reviewed', 'mastered']
+        )
+
+        # Общие карточки учитываются в счётчиках форков пользователя
+        shared_set_ids = {card.flashcard_set_id for card in cards.values() if not owned(card)}
+        forks = {}
+        if shared_set_ids:
+            for fork_id, source_id in FlashcardSet.objects.filter(
+                user=user, forked_from_id__in=shared_set_ids
+            ).values_list('id', 'forked_from_id'):
+                forks.setdefault(source_id, []).append(fork_id)
+
+        # Ответ на общую карточку учитывается в статистике форка пользователя
+        for log in applied:
+            card = cards[log.flashcard_id]
+            log.flashcard_set_id = card.flashcard_set_id if owned(card) else forks[card.flashcard_set_id][0]
+        ReviewLog.objects.bulk_create(applied)
+
+        # Статус изучения и счётчики наборов меняются в той же транзакции
+        mastered_ids, unmastered_ids = [], []
+        set_deltas = Counter()
+        for card_id, schedule in changed.items():
+            card = cards[card_id]
+            if schedule.mastered == previous_mastered[card_id]:
+                continue
+            delta = 1 if schedule.mastered else -1
+            if owned(card):
+                (mastered_ids if schedule.mastered else unmastered_ids).append(card_id)
+                set_deltas[card.flashcard_set_id] += delta
+            else:
+                for fork_id in forks.get(card.flashcard_set_id, []):
+                    set_deltas[fork_id] += delta
+
+        if mastered_ids:
+            Flashcard.objects.filter(id__in=mastered_ids).update(mastered=True, last_modified=now)
+        if unmastered_ids:
+            Flashcard.objects.filter(id__in=unmastered_ids).update(mastered=False, last_modified=now)
+        ChangeLog.record_cards([cards[card_id] for card_id in mastered_ids + unmastered_ids], user_id=user.id)
+        for set_id, delta in set_deltas.items():
+            FlashcardSet.apply_stats_delta(set_id, mastered=delta)
+
+    return results
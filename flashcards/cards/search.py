@@ -0,0 +1,141 @@
+"""
+Полнотекстовый поиск по карточкам на SQLite FTS5.
+
+Индекс - виртуальная таблица cards_flashcard_fts (rowid = id карточки):
+иероглифы (слово целиком и по одному), пиньинь с тонами, без тонов, с цифрами тонов
+и слитно, перевод и определение. Колонка owner хранит токен владельца (u<id>),
+поэтому фильтр по пользователю выполняется внутри FTS, а не после него.
+На других СУБД поиск выполняется обычным icontains (см. SearchFlashcardsView).
+"""
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from .pinyin_engine import get_pinyin
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'cards_flashcard_fts'
+FTS_COLUMNS = ('word', 'pinyin', 'pinyin_plain', 'translation', 'definition', 'owner')
+# Веса колонок для bm25 (в порядке FTS_COLUMNS)
+BM25_WEIGHTS = (10.0, 5.0, 4.0, 3.0, 1.0, 0.0)
+
+TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]|[^\s\u4e00-\u9fff]+')
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создаёт FTS5 таблицу (вызывается после migrate)"""
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(using=DEFAULT_DB_ALIAS):
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def build_row(card_id, word, pinyin, translation, definition, user_id):
+    """Строка индекса для карточки"""
+    variants = [
+        get_pinyin(word, 'toneless'),
+        get_pinyin(word, 'numeric'),
+        get_pinyin(word, 'toneless').replace(' ', ''),
+    ]
+    characters = ' '.join(re.findall(r'[\u4e00-\u9fff]', word))
+    return (
+        card_id,
+        f"{word} {characters}",
+        pinyin or get_pinyin(word),
+        ' '.join(variants),
+        translation or '',
+        definition or '',
+        f"u{user_id}",
+    )
+
+
+def index_cards(cards, created=False, using=DEFAULT_DB_ALIAS):
+    """Добавляет или обновляет карточки в индексе (created=True - только что созданные)"""
+    if not is_supported(using) or not cards:
+        return
+    rows = [
+        build_row(card.id, card.word, card.pinyin, card.translation, card.definition,
+                  card.flashcard_set.user_id)
+        for card in cards
+    ]
+    index_rows(rows, replace=not created, using=using)
+
+
+def index_rows(rows, replace=True, using=DEFAULT_DB_ALIAS):
+    if not rows:
+        return
+    with connections[using].cursor() as cursor:
+        if replace:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+def remove_cards(card_ids, using=DEFAULT_DB_ALIAS):
+    if not is_supported(using) or not card_ids:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(card_id,) for card_id in card_ids])
+
+
+def remove_set_cards(set_id, using=DEFAULT_DB_ALIAS):
+    """Удаляет из индекса все карточки набора одним запросом (перед удалением набора)"""
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM cards_flashcard WHERE flashcard_set_id = %s)",
+            [set_id]
+        )
+
+
+def build_match_query(query):
+    """
+    Превращает ввод пользователя в выражение FTS5: каждый токен - префиксный запрос,
+    иероглифы ищутся по одному. "ni h" -> "ni"* "h"*
+    """
+    tokens = TOKEN_PATTERN.findall(query.lower())
+    terms = []
+    for token in tokens:
+        token = token.replace('"', '').strip()
+        if token:
+            terms.append(f'"{token}"*')
+    return ' '.join(terms)
+
+
+def search(user_id, query, limit=20, using=DEFAULT_DB_ALIAS):
+    """Список (id карточки, релевантность), лучшие сначала"""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s",
+                [f'owner:u{int(user_id)} AND ({match})', limit]
+            )
+            return cursor.fetchall()
+    except OperationalError as e:
+        logger.warning('Search error: %s', e)
+        return []
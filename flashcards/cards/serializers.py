@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import *
+from .pinyin_engine import get_pinyin
+from .audio import find_audio
 import re
 from enum import Enum
 from typing import Optional, Dict, Any
@@ -35,14 +37,22 @@ class FlashcardSerializer(serializers.ModelSerializer):
             'example_sentence',
             'audio_pronunciation',
             'hsk_level',
+            'hsk3_level',
             'flashcard_set',  # для чтения (объект)
             'flashcard_set_id',  # для записи (ID)
             'flashcard_set_name',  # для чтения (название набора)
             'mastered',
+            'enrichment_status',
             'created_date',
             'last_modified'
         ]
-        read_only_fields = ['id', 'created_date', 'last_modified', 'flashcard_set', 'flashcard_set_name']
+        read_only_fields = [
+            'id', 'created_date', 'last_modified', 'flashcard_set', 'flashcard_set_name', 'enrichment_status'
+        ]
+        extra_kwargs = {
+            # Пиньинь заполняется автоматически, если не передан
+            'pinyin': {'required': False, 'allow_blank': True},
+        }
 
     def validate_word(self, value):
         """Валидация слова (китайские иероглифы)"""
@@ -118,17 +128,16 @@ class FlashcardSerializer(serializers.ModelSerializer):
         word = data.get('word', '')
         pinyin = data.get('pinyin', '')
 
-        # Если есть китайские иероглифы, но нет пиньиня
+        # Если есть китайские иероглифы, но нет пиньиня - генерируем локально
         chinese_pattern = re.compile(r'[\u4e00-\u9fff]+')
         if chinese_pattern.search(word) and not pinyin.strip():
-            raise serializers.ValidationError("Для китайских слов обязателен пиньинь")
+            data['pinyin'] = get_pinyin(word)
 
         return data
 
     def create(self, validated_data):
         """Создание карточки с дополнительной логикой"""
-        # Можно добавить дополнительную логику здесь
-        # Например, автоматическое определение HSK уровня
+        # Уровни HSK, если не указаны, определяются по словарю в Flashcard.save
 
         flashcard = Flashcard.objects.create(**validated_data)
         return flashcard
@@ -140,12 +149,85 @@ class FlashcardSerializer(serializers.ModelSerializer):
         return instance
 
 
+class DynamicFieldsMixin:
+    """Sparse fieldset: ``?fields=word,pinyin`` оставляет в ответе только перечисленные поля"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.get_requested_fields(self.context.get('request'))
+        if requested:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+    @staticmethod
+    def get_requested_fields(request):
+        if request is None:
+            return None
+        fields = request.query_params.get('fields')
+        if not fields:
+            return None
+        return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+class FlashcardListSerializer(DynamicFieldsMixin, FlashcardSerializer):
+    """Карточки набора для чтения"""
+
+
+class PrefetchedFlashcardSetField(serializers.PrimaryKeyRelatedField):
+    """Набор берётся из заранее загруженного словаря ``context['flashcard_sets']``"""
+
+    def to_internal_value(self, data):
+        flashcard_sets = self.context.get('flashcard_sets', {})
+        try:
+            return flashcard_sets[int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class FlashcardBulkRowSerializer(FlashcardSerializer):
+    """Валидация строки массового импорта без отдельных запросов к БД на каждую строку"""
+    flashcard_set_id = PrefetchedFlashcardSetField(
+        queryset=FlashcardSet.objects.all(),
+        write_only=True,
+        source='flashcard_set'
+    )
+
+    # Ранее загруженная запись: "<sha256>" или "<sha256>.<расширение>" (см. AudioUploadView)
+    audio = serializers.CharField(write_only=True, required=False, allow_blank=True)
+
+    class Meta(FlashcardSerializer.Meta):
+        fields = FlashcardSerializer.Meta.fields + ['audio']
+
+    def validate_flashcard_set_id(self, value):
+        # Набор уже проверен при загрузке словаря наборов пользователя
+        return value
+
+    def validate_audio(self, value):
+        if not value:
+            return None
+        name = find_audio(value)
+        if name is None:
+            raise serializers.ValidationError('Запись не найдена, загрузите её через /api/audio/')
+        return name
+
+    def validate(self, data):
+        data = super().validate(data)
+        name = data.pop('audio', None)
+        if name:
+            data['audio_pronunciation'] = name
+        return data
+
+
 class WordSerializer(serializers.Serializer):
     word = serializers.CharField(max_length=255)
-    translation = serializers.CharField(max_length=255, allow_null=True)
+    # Незаданные перевод и определение заполняются в фоне (cards/enrichment.py)
+    translation = serializers.CharField(max_length=255, allow_null=True, allow_blank=True, required=False, default=None)
     hsk_level = serializers.IntegerField(min_value=1, max_value=7)
-    example_sentence = serializers.CharField(max_length=255, allow_null=True)
-    definition = serializers.CharField(max_length=255, allow_null=True)
+    example_sentence = serializers.CharField(max_length=255, allow_null=True, allow_blank=True, required=False,
+                                             default=None)
+    definition = serializers.CharField(max_length=255, allow_null=True, allow_blank=True, required=False, default=None)
     dl = serializers.CharField(max_length=5)
 
     flashcard_set_id = serializers.PrimaryKeyRelatedField(
@@ -203,4 +285,70 @@ class UserFlashcardSetSerializer(serializers.ModelSerializer):
 
     def get_creation_date(self, obj):
         """Форматируем дату в формат ДД-ММ-ГГ"""
-        return obj.creation_date.strftime('%d-%m-%y')
\ No newline at end of file
+        return obj.creation_date.strftime('%d-%m-%y')
+
+
+class FlashcardContentSerializer(serializers.ModelSerializer):
+    """Редактируемое содержимое карточки (без переноса в другой набор)"""
+
+    class Meta:
+        model = Flashcard
+        fields = ['word', 'translation', 'pinyin', 'definition', 'example_sentence', 'hsk_level', 'hsk3_level']
+
+
+class FlashcardEnrichmentSerializer(serializers.ModelSerializer):
+    """Статус фонового заполнения карточки"""
+
+    class Meta:
+        model = Flashcard
+        fields = ['id', 'word', 'translation', 'pinyin', 'definition', 'enrichment_status', 'last_modified']
+
+
+class SyncSetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FlashcardSet
+        fields = [
+            'id', 'name', 'description', 'category', 'difficulty', 'is_public', 'forked_from',
+            'total_cards', 'still_learning', 'mastered', 'hsk_level', 'creation_date'
+        ]
+
+
+class SyncCardSerializer(serializers.ModelSerializer):
+    # Для общих карточек форка - прогресс пользователя, а не владельца исходного набора
+    mastered = serializers.BooleanField(source='sync_mastered', read_only=True)
+
+    class Meta:
+        model = Flashcard
+        fields = [
+            'id', 'flashcard_set', 'source_card', 'word', 'translation', 'pinyin', 'definition',
+            'example_sentence', 'audio_pronunciation', 'hsk_level', 'hsk3_level', 'mastered',
+            'enrichment_status', 'last_modified'
+        ]
+
+
+class CatalogSetSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    author = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = FlashcardSet
+        fields = [
+            'id', 'name', 'description', 'category', 'category_name', 'difficulty',
+            'hsk_level', 'total_cards', 'popularity', 'author', 'creation_date'
+        ]
+
+
+class ReviewSerializer(serializers.Serializer):
+    card_id = serializers.IntegerField()
+    grade = serializers.IntegerField(min_value=0, max_value=5)
+    reviewed_at = serializers.DateTimeField(required=False)
+    # Время на ответ; больше часа - скорее всего, приложение оставили открытым
+    duration_ms = serializers.IntegerField(required=False, min_value=0, max_value=60 * 60 * 1000)
+
+
+class ReviewScheduleSerializer(serializers.ModelSerializer):
+    card = FlashcardSerializer(source='flashcard', read_only=True)
+
+    class Meta:
+        model = ReviewSchedule
+        fields = ['card', 'due', 'interval', 'ease', 'repetitions', 'lapses', 'last_reviewed']
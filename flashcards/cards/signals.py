@@ -0,0 +1,115 @@
+import threading
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import search
+from .authentication import invalidate_tokens
+from .cache import bump_user_version
+from .models import CatalogFacet, ChangeLog, Flashcard, FlashcardSet
+
+# Наборы, удаляемые в текущем потоке: их карточкам отдельные tombstone не нужны
+_deleting_sets = threading.local()
+
+
+@receiver([post_save, post_delete], sender=FlashcardSet)
+def flashcard_set_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Flashcard)
+def flashcard_changed(sender, instance, **kwargs):
+    bump_user_version(instance.flashcard_set.user_id)
+
+
+@receiver(post_save, sender=FlashcardSet)
+def log_set_saved(sender, instance, **kwargs):
+    ChangeLog.record(instance.user_id, instance.pk, ChangeLog.SET, [instance.pk], ChangeLog.UPSERT)
+
+
+@receiver(pre_delete, sender=FlashcardSet)
+def log_set_deleted(sender, instance, **kwargs):
+    # Клиент удаляет карточки вместе с набором
+    ChangeLog.record(instance.user_id, instance.pk, ChangeLog.SET, [instance.pk], ChangeLog.DELETE)
+    if not hasattr(_deleting_sets, 'ids'):
+        _deleting_sets.ids = set()
+    _deleting_sets.ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=FlashcardSet)
+def forget_deleted_set(sender, instance, **kwargs):
+    getattr(_deleting_sets, 'ids', set()).discard(instance.pk)
+
+
+@receiver(post_save, sender=Flashcard)
+def log_card_saved(sender, instance, **kwargs):
+    ChangeLog.record_cards([instance])
+
+
+@receiver(post_delete, sender=Flashcard)
+def log_card_deleted(sender, instance, **kwargs):
+    if instance.flashcard_set_id in getattr(_deleting_sets, 'ids', ()):
+        return
+    ChangeLog.record_cards([instance], ChangeLog.DELETE)
+
+
+@receiver(pre_delete, sender=FlashcardSet)
+def remove_set_from_search(sender, instance, **kwargs):
+    # Каскадное удаление карточек не вызывает Flashcard.delete(): индекс чистится одним запросом
+    search.remove_set_cards(instance.pk)
+
+
+@receiver(post_delete, sender=Flashcard)
+def remove_card_from_search(sender, instance, **kwargs):
+    # Любое удаление карточки: delete(), QuerySet.delete(), удаление пользователя
+    if instance.flashcard_set_id in getattr(_deleting_sets, 'ids', ()):
+        return
+    search.remove_cards([instance.pk])
+
+
+@receiver(pre_save, sender=FlashcardSet)
+def remember_catalog_state(sender, instance, **kwargs):
+    # Если набор создан не из БД (или поля отложены), берём прежнее состояние из БД
+    if instance._state.adding:
+        instance._catalog_state = {}
+    elif getattr(instance, '_catalog_state', None) is None:
+        previous = FlashcardSet.objects.filter(pk=instance.pk).only(*FlashcardSet.CATALOG_FIELDS).first()
+        instance._catalog_state = previous.get_catalog_facets() if previous else {}
+
+
+@receiver(post_save, sender=FlashcardSet)
+def update_catalog_facets(sender, instance, **kwargs):
+    current = instance.get_catalog_facets() or {}
+    CatalogFacet.apply_delta(instance._catalog_state or {}, current)
+    instance._catalog_state = current
+
+
+@receiver(post_delete, sender=FlashcardSet)
+def remove_from_catalog_facets(sender, instance, **kwargs):
+    previous = getattr(instance, '_catalog_state', None)
+    if previous is None:
+        previous = instance.get_catalog_facets() or {}
+    CatalogFacet.apply_delta(previous, {})
+
+
+@receiver(pre_delete, sender=FlashcardSet)
+def materialize_forks(sender, instance, **kwargs):
+    # Общие карточки удаляемого набора копируются в его форки вместе с прогрессом
+    for fork in instance.forks.all():
+        fork.materialize_shared_cards()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход через djoser удаляет токен - закэшированная аутентификация больше не действует
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход обновляет только last_login - поля в кэше токенов не меняются
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_tokens(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
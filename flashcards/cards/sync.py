@@ -0,0 +1,288 @@
+"""
+Синхронизация офлайн-клиентов по журналу изменений ChangeLog.
+
+GET /api/sync/ без since - полный снимок наборов и карточек пользователя и курсор;
+GET /api/sync/?since=<курсор> - только объекты, изменённые или удалённые после курсора.
+Несколько изменений одного объекта сворачиваются в одно, содержимое берётся текущее.
+Карточки исходного набора, которые видны в форках пользователя, приходят с flashcard_set
+исходного набора - набор-форк указывает на него через forked_from.
+
+POST /api/sync/ - пачка офлайн-изменений, каждое применяется в своей точке сохранения,
+так что ошибка в одном не отменяет остальные.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, F, Max, OuterRef, Q, Subquery, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import enrichment
+from .models import ChangeLog, Flashcard, FlashcardSet, ReviewSchedule
+from .pinyin_engine import get_pinyin
+from .serializers import FlashcardContentSerializer, FlashcardSetSerializer, SyncCardSerializer, SyncSetSerializer
+
+DEFAULTS = {
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 5000,
+    'MAX_CHANGES': 500,
+    # На PostgreSQL id выдаются до фиксации транзакции: записи моложе этого
+    # интервала не отдаются, чтобы курсор не перескочил ещё не зафиксированные
+    'SETTLE_SECONDS': 0,
+}
+
+
+def get_option(name):
+    return getattr(settings, 'SYNC', {}).get(name, DEFAULTS[name])
+
+
+def current_cursor():
+    return ChangeLog.objects.aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+class UserScope:
+    """Наборы пользователя и исходные наборы его форков"""
+
+    def __init__(self, user):
+        self.user = user
+        sets = list(FlashcardSet.objects.filter(user=user).values_list('id', 'forked_from_id'))
+        self.set_ids = [set_id for set_id, _ in sets]
+        self.root_ids = sorted({root_id for _, root_id in sets if root_id})
+
+    def sets(self):
+        return FlashcardSet.objects.filter(user=self.user)
+
+    def cards(self):
+        """Свои карточки и общие карточки форков, кроме уже скопированных в форк"""
+        queryset = Flashcard.objects.filter(flashcard_set_id__in=self.set_ids)
+        if not self.root_ids:
+            return queryset.annotate(sync_mastered=F('mastered'))
+
+        materialized = Flashcard.objects.filter(
+            flashcard_set_id__in=self.set_ids, source_card__isnull=False
+        ).values('source_card_id')
+        queryset = Flashcard.objects.filter(
+            Q(flashcard_set_id__in=self.set_ids)
+            | Q(flashcard_set_id__in=self.root_ids) & ~Q(id__in=Subquery(materialized))
+        )
+        # Прогресс по общей карточке хранится в расписании пользователя
+        return queryset.annotate(sync_mastered=Case(
+            When(flashcard_set_id__in=self.set_ids, then=F('mastered')),
+            default=Exists(ReviewSchedule.objects.filter(user=self.user, flashcard=OuterRef('pk'), mastered=True)),
+            output_field=BooleanField(),
+        ))
+
+    def changes(self):
+        return ChangeLog.objects.filter(
+            Q(user=self.user) | Q(flashcard_set_id__in=self.root_ids, model=ChangeLog.CARD)
+        )
+
+
+def snapshot(user):
+    # Курсор берётся до чтения данных: изменения во время снимка придут при следующей синхронизации
+    cursor = current_cursor()
+    scope = UserScope(user)
+    return {
+        'cursor': cursor,
+        'full': True,
+        'has_more': False,
+        'sets': SyncSetSerializer(scope.sets(), many=True).data,
+        'cards': SyncCardSerializer(scope.cards().iterator(chunk_size=2000), many=True).data,
+        'deleted': {'sets': [], 'cards': []},
+    }
+
+
+def changes_since(user, since, limit):
+    scope = UserScope(user)
+    entries = scope.changes().filter(id__gt=since)
+    settle = get_option('SETTLE_SECONDS')
+    if settle:
+        entries = entries.filter(created_at__lt=timezone.now() - timedelta(seconds=settle))
+    entries = list(entries.order_by('id').values_list('id', 'model', 'object_id', 'action')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Последнее действие по каждому объекту
+    latest = {}
+    for _, model, object_id, action in entries:
+        latest[(model, object_id)] = action
+    upserted = {ChangeLog.SET: set(), ChangeLog.CARD: set()}
+    deleted = {ChangeLog.SET: set(), ChangeLog.CARD: set()}
+    for (model, object_id), action in latest.items():
+        (upserted if action == ChangeLog.UPSERT else deleted)[model].add(object_id)
+
+    sets = list(scope.sets().filter(id__in=upserted[ChangeLog.SET])) if upserted[ChangeLog.SET] else []
+    cards = list(scope.cards().filter(id__in=upserted[ChangeLog.CARD])) if upserted[ChangeLog.CARD] else []
+    # Изменённые, но уже недоступные объекты (удалены позже, скопированы в форк) - удалённые
+    deleted[ChangeLog.SET] |= upserted[ChangeLog.SET] - {flashcard_set.id for flashcard_set in sets}
+    deleted[ChangeLog.CARD] |= upserted[ChangeLog.CARD] - {card.id for card in cards}
+
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'full': False,
+        'has_more': has_more,
+        'sets': SyncSetSerializer(sets, many=True).data,
+        'cards': SyncCardSerializer(cards, many=True).data,
+        'deleted': {'sets': sorted(deleted[ChangeLog.SET]), 'cards': sorted(deleted[ChangeLog.CARD])},
+    }
+
+
+# --- Офлайн-изменения ---------------------------------------------------------
+
+class ChangeError(Exception):
+    def __init__(self, status, detail=None):
+        super().__init__(status)
+        self.status = status
+        self.detail = detail
+
+
+def apply_changes(user, changes):
+    """
+    changes - список {'type': 'set'|'card', 'action': 'create'|'update'|'delete',
+    'id': id на сервере, 'client_id': id на клиенте (для create), 'data': {...},
+    'last_modified': время последнего известного клиенту изменения карточки}.
+    Карточка может ссылаться на набор из той же пачки: data.flashcard_set_client_id.
+    """
+    client_ids = {}
+    results = []
+    with transaction.atomic():
+        for index, change in enumerate(changes):
+            result = {'index': index}
+            if isinstance(change, dict) and change.get('client_id') is not None:
+                result['client_id'] = change['client_id']
+            try:
+                with transaction.atomic():
+                    result.update(apply_change(user, change, client_ids))
+                result['status'] = 'ok'
+            except ChangeError as e:
+                result['status'] = e.status
+                if e.detail is not None:
+                    result['error'] = e.detail
+            results.append(result)
+    return results
+
+
+def apply_change(user, change, client_ids):
+    if not isinstance(change, dict):
+        raise ChangeError('invalid', 'Неверный формат изменения')
+    handler = CHANGE_HANDLERS.get((change.get('type'), change.get('action')))
+    if handler is None:
+        raise ChangeError('invalid', 'Неизвестный тип или действие')
+    data = change.get('data') or {}
+    if not isinstance(data, dict):
+        raise ChangeError('invalid', 'data должно быть объектом')
+    return handler(user, change, data, client_ids)
+
+
+def get_own_set(user, set_id):
+    flashcard_set = FlashcardSet.objects.filter(pk=set_id, user=user).first() if str(set_id).isdigit() else None
+    if flashcard_set is None:
+        raise ChangeError('not_found')
+    return flashcard_set
+
+
+def save_serializer(serializer, **kwargs):
+    if not serializer.is_valid():
+        raise ChangeError('invalid', serializer.errors)
+    return serializer.save(**kwargs)
+
+
+def create_set(user, change, data, client_ids):
+    flashcard_set = save_serializer(FlashcardSetSerializer(data=data), user=user)
+    if change.get('client_id') is not None:
+        client_ids[str(change['client_id'])] = flashcard_set.id
+    return {'id': flashcard_set.id}
+
+
+def update_set(user, change, data, client_ids):
+    flashcard_set = get_own_set(user, change.get('id'))
+    save_serializer(FlashcardSetSerializer(flashcard_set, data=data, partial=True))
+    return {'id': flashcard_set.id}
+
+
+def delete_set(user, change, data, client_ids):
+    flashcard_set = get_own_set(user, change.get('id'))
+    flashcard_set.delete()
+    return {'id': change.get('id')}
+
+
+def create_card(user, change, data, client_ids):
+    data = dict(data)
+    set_client_id = data.pop('flashcard_set_client_id', None)
+    set_id = client_ids.get(str(set_client_id)) if set_client_id is not None else data.pop('flashcard_set_id', None)
+    flashcard_set = get_own_set(user, set_id)
+    destination_language_code = data.pop('dl', 'ru')
+    if not str(data.get('word') or '').strip():
+        raise ChangeError('invalid', {'word': ['Обязательное поле.']})
+
+    serializer = FlashcardContentSerializer(data=data, partial=True)
+    if not serializer.is_valid():
+        raise ChangeError('invalid', serializer.errors)
+    # Перевод, которого нет у офлайн-клиента, заполнит воркер очереди
+    pending = not serializer.validated_data.get('translation')
+    card = serializer.save(
+        flashcard_set=flashcard_set,
+        pinyin=serializer.validated_data.get('pinyin') or get_pinyin(serializer.validated_data['word']),
+        enrichment_status=Flashcard.ENRICHMENT_PENDING if pending else Flashcard.ENRICHMENT_DONE,
+    )
+    if pending:
+        enrichment.enqueue(card, destination_language_code)
+    return {'id': card.id}
+
+
+def get_card_for_change(user, change):
+    scope = UserScope(user)
+    card = scope.cards().select_related('flashcard_set').filter(pk=change.get('id')).first() \
+        if str(change.get('id')).isdigit() else None
+    if card is None:
+        raise ChangeError('not_found')
+
+    known = change.get('last_modified')
+    if known:
+        known = parse_datetime(str(known))
+        if known is None:
+            raise ChangeError('invalid', 'Некорректный last_modified')
+        if card.last_modified > known:
+            # Карточка изменилась после последней синхронизации клиента
+            raise ChangeError('conflict', {'card': SyncCardSerializer(card).data})
+    return card
+
+
+def update_card(user, change, data, client_ids):
+    card = get_card_for_change(user, change)
+    serializer = FlashcardContentSerializer(card, data=data, partial=True)
+    if not serializer.is_valid():
+        raise ChangeError('invalid', serializer.errors)
+
+    if card.flashcard_set.user_id != user.id:
+        # Общая карточка форка: редактируется копия в форке
+        forks = FlashcardSet.objects.filter(user=user, forked_from_id=card.flashcard_set_id)
+        fork_id = change.get('flashcard_set_id')
+        if fork_id and not str(fork_id).isdigit():
+            raise ChangeError('invalid', {'flashcard_set_id': ['Ожидается id набора.']})
+        fork = forks.filter(pk=fork_id).first() if fork_id else forks.first()
+        if fork is None:
+            raise ChangeError('not_found')
+        serializer.instance = fork.materialize_card(card)
+    card = serializer.save()
+    return {'id': card.id}
+
+
+def delete_card(user, change, data, client_ids):
+    card = get_card_for_change(user, change)
+    if card.flashcard_set.user_id != user.id:
+        raise ChangeError('forbidden', 'Общую карточку исходного набора удалить нельзя')
+    card_id = card.id
+    card.delete()
+    return {'id': card_id}
+
+
+CHANGE_HANDLERS = {
+    ('set', 'create'): create_set,
+    ('set', 'update'): update_set,
+    ('set', 'delete'): delete_set,
+    ('card', 'create'): create_card,
+    ('card', 'update'): update_card,
+    ('card', 'delete'): delete_card,
+}
@@ -1,3 +1,2172 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from contextlib import closing, contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import analytics, audio, authentication, enrichment, hsk, quiz, search, throttling
+from .async_translation import AsyncTranslationClient, CircuitBreaker
+from .metrics import MetricsMiddleware, normalize_sql, registry
+from .models import (
+    CachedTranslation, CatalogFacet, Category, ChangeLog, DailyStudyStats, EnrichmentJob, Flashcard, FlashcardSet,
+    ReviewLog, ReviewSchedule,
+)
+from .parsers import parse_rows
+from .pinyin_engine import char_pinyin, get_pinyin
+from .scheduler import submit_reviews
+from .translation import TranslationCache, extract_translation, fetch_translation, translation_cache
+from .translation_stub import TranslationStubServer
+
+
+def run_concurrently(target, count):
+    """Запускает target(index) в count потоках одновременно, возвращает ошибки"""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # У каждого потока своё соединение - закрываем, чтобы БД можно было удалить
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Сценарии для SQLite в режиме WAL')
+class SQLiteConcurrencyTests(TransactionTestCase):
+    """Параллельная запись карточек в файловую SQLite БД с настройками из settings"""
+    threads = 8
+
+    def setUp(self):
+        # FTS таблица не очищается между тестами вместе с таблицами моделей
+        search.drop_search_index()
+        search.create_search_index()
+        self.user = get_user_model().objects.create_user('writer', password='x')
+        self.flashcard_set = FlashcardSet.objects.create(name='Набор', user=self.user)
+
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0].lower(), 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_concurrent_card_creation(self):
+        per_thread = 10
+
+        def create_cards(index):
+            for number in range(per_thread):
+                Flashcard.objects.create(
+                    word='你好', translation=f'{index}-{number}', pinyin='nǐ hǎo',
+                    flashcard_set_id=self.flashcard_set.id
+                )
+
+        errors = run_concurrently(create_cards, self.threads)
+
+        self.assertEqual(errors, [])
+        total = self.threads * per_thread
+        self.assertEqual(Flashcard.objects.count(), total)
+        self.flashcard_set.refresh_from_db()
+        # Счётчики набора меняются F()-дельтами - параллельные вставки не теряются
+        self.assertEqual(self.flashcard_set.total_cards, total)
+        self.assertEqual(self.flashcard_set.still_learning, total)
+        self.assertEqual(ReviewSchedule.objects.filter(user=self.user).count(), total)
+
+    def test_concurrent_reviews(self):
+        cards = [
+            Flashcard.objects.create(word='好', translation=str(index), pinyin='hǎo', flashcard_set=self.flashcard_set)
+            for index in range(self.threads)
+        ]
+
+        def review(index):
+            submit_reviews(self.user, [{'card_id': cards[index].id, 'grade': 5}])
+
+        errors = run_concurrently(review, self.threads)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(ReviewSchedule.objects.filter(user=self.user, repetitions=1).count(), self.threads)
+
+    def test_reader_not_blocked_by_writer(self):
+        Flashcard.objects.create(word='你', translation='ты', pinyin='nǐ', flashcard_set=self.flashcard_set)
+        write_started = threading.Event()
+        read_done = threading.Event()
+        counts = []
+
+        def writer():
+            try:
+                with transaction.atomic():
+                    Flashcard.objects.create(word='好', translation='хорошо', pinyin='hǎo',
+                                             flashcard_set_id=self.flashcard_set.id)
+                    write_started.set()
+                    # Транзакция записи остаётся открытой, пока читатель не закончит
+                    read_done.wait(timeout=10)
+            finally:
+                connections.close_all()
+
+        def reader():
+            try:
+                write_started.wait(timeout=10)
+                counts.append(Flashcard.objects.count())
+            finally:
+                read_done.set()
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # В WAL читатель видит последнее зафиксированное состояние, не дожидаясь писателя
+        self.assertEqual(counts, [1])
+        self.assertEqual(Flashcard.objects.count(), 2)
+
+
+class QueryBudgetMixin:
+    """
+    Бюджет запросов эндпоинта: не больше max_queries SQL-запросов
+    и не больше max_duplicates повторов одного шаблона запроса (N+1).
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_duplicates=0):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = [normalize_sql(query['sql']) for query in context.captured_queries]
+        details = '\n'.join(f'{index}. {sql[:200]}' for index, sql in enumerate(queries, 1))
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{len(queries)} запросов при бюджете {max_queries}:\n{details}'
+        )
+        duplicates = len(queries) - len(set(queries))
+        self.assertLessEqual(duplicates, max_duplicates, f'Повторные запросы (N+1):\n{details}')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Бюджеты запросов основных эндпоинтов; не должны расти с числом карточек"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('reader', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user, is_public=True)
+        Flashcard.objects.bulk_create([
+            Flashcard(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo', flashcard_set=cls.flashcard_set)
+            for index in range(30)
+        ])
+        ReviewSchedule.create_for_cards(list(cls.flashcard_set.flashcards.select_related('flashcard_set')))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_sets(self):
+        with self.assertQueryBudget(1):
+            self.assertEqual(self.client.get('/api/sets/get/').status_code, 200)
+
+    def test_set_cards(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get(f'/api/sets/{self.flashcard_set.id}/cards/')
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_review_next(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/review/next/?limit=20')
+        self.assertEqual(len(response.data), 20)
+
+    def test_review_submit(self):
+        card_ids = list(self.flashcard_set.flashcards.values_list('id', flat=True)[:10])
+        reviews = [{'card_id': card_id, 'grade': 4} for card_id in card_ids]
+        with self.assertQueryBudget(8):
+            response = self.client.post('/api/review/submit/', {'reviews': reviews}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_search(self):
+        with self.assertQueryBudget(2):
+            self.assertEqual(self.client.get('/api/search/?q=ni').status_code, 200)
+
+    def test_catalog(self):
+        with self.assertQueryBudget(3):
+            self.assertEqual(self.client.get('/api/catalog/').status_code, 200)
+
+    def test_bulk_import_is_constant(self):
+        def import_rows(count):
+            rows = [{'word': '谢谢', 'translation': f'спасибо {index}'} for index in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    f'/api/flashcard/bulk/?flashcard_set_id={self.flashcard_set.id}', rows, format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            return len(context.captured_queries)
+
+        # Первый импорт поднимает уровень HSK набора - дальше число запросов
+        # зависит от числа пачек bulk_create, а не от числа строк
+        import_rows(1)
+        self.assertEqual(import_rows(5), import_rows(50))
+
+
+class MetricsMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('metrics', password='x')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+
+    def setUp(self):
+        registry.reset()
+        translation_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_and_prometheus_export(self):
+        # Асинхронное создание ждёт перевод в запросе - HTTP-вызов попадает в метрики
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with TranslationStubServer(translations={'苹果': 'яблоко'}) as stub, \
+                override_settings(TRANSLATION_URL=stub.url):
+            response = self.client.post('/api/flashcard/create/async/', {
+                'word': '苹果', 'hsk_level': 1, 'dl': 'ru', 'flashcard_set_id': self.flashcard_set.id,
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        timing = response['Server-Timing']
+        self.assertIn('http;dur=', timing)
+        self.assertIn('desc="1 calls"', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+
+        self.client.credentials()
+        with override_settings(METRICS_TOKEN='scrape'):
+            metrics = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        labels = 'view="api/flashcard/create/async/",method="POST",status="201"'
+        self.assertIn(f'flashcards_requests_total{{{labels}}} 1', metrics)
+        self.assertIn(f'flashcards_http_requests_total{{{labels}}} 1', metrics)
+        self.assertIn(f'flashcards_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertNotIn('/metrics', metrics)
+
+    def test_streaming_response_is_measured_until_consumed(self):
+        with TranslationStubServer(translations={'苹果': 'яблоко', '香蕉': 'банан'}) as stub, \
+                override_settings(TRANSLATION_URL=stub.url):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post('/api/flashcard/create/batch/', {
+                    'words': ['苹果', '香蕉'], 'flashcard_set_id': self.flashcard_set.id,
+                }, format='json')
+                key = ('api/flashcard/create/batch/', 'POST', '200')
+                self.assertNotIn(key, registry.counters)
+                lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertIn('"created": 2', lines[-1])
+        self.assertNotIn('Server-Timing', response)
+        counters = registry.counters[key]
+        self.assertEqual(counters['requests'], 1)
+        self.assertEqual(counters['http_requests'], 2)
+        # Запросы основного соединения при формировании тела тоже учтены
+        self.assertEqual(counters['sql_queries'], len(context.captured_queries))
+
+    def test_metrics_endpoint_requires_staff_or_token(self):
+        client = APIClient()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        client.force_login(self.user)
+        self.assertEqual(client.get('/metrics').status_code, 403)
+
+        with override_settings(METRICS_TOKEN='scrape'):
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+        # Пустой токен в настройках не открывает доступ
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        staff = get_user_model().objects.create_user('metrics-staff', password='x', is_staff=True)
+        client.force_login(staff)
+        self.assertEqual(client.get('/metrics').status_code, 200)
+
+    def test_async_chain(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(AsyncRequestFactory().get('/api/async/'))
+
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(registry.counters[('unmatched', 'GET', '200')]['requests'], 1)
+        self.assertFalse(asyncio.iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+    def test_duplicate_queries_are_counted(self):
+        with self.assertLogs('cards.metrics', level='WARNING') as logs, \
+                override_settings(ROOT_URLCONF='cards.tests'):
+            self.client.get('/n-plus-one/')
+        self.assertIn('Possible N+1', logs.output[0])
+        self.assertIn('flashcards_duplicate_queries_total{view="n-plus-one/",method="GET",status="200"} 5',
+                      registry.render())
+
+
+class EnrichmentQueueTests(TestCase):
+    """Создание карточки без ожидания сервиса перевода и фоновое заполнение"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('learner', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+
+    def setUp(self):
+        translation_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_card(self, word, **data):
+        return self.client.post('/api/flashcard/create/2/', {
+            'word': word, 'hsk_level': 1, 'dl': 'ru', 'flashcard_set_id': self.flashcard_set.id, **data
+        }, format='json')
+
+    def test_card_created_without_waiting_for_translation(self):
+        with TranslationStubServer(status_code=503) as stub, override_settings(TRANSLATION_URL=stub.url):
+            response = self.create_card('苹果')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['enrichment_status'], Flashcard.ENRICHMENT_PENDING)
+        self.assertEqual(response.data['pinyin'], 'píng guǒ')
+        self.assertEqual(stub.requests_count, 0)
+        self.assertTrue(EnrichmentJob.objects.filter(flashcard_id=response.data['id']).exists())
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.total_cards, 1)
+
+    def test_worker_fills_cards_in_batch(self):
+        card_ids = [self.create_card(word).data['id'] for word in ('苹果', '香蕉', '苹果')]
+
+        with TranslationStubServer(translations={'苹果': 'яблоко', '香蕉': 'банан'}) as stub, \
+                override_settings(TRANSLATION_URL=stub.url):
+            self.assertEqual(enrichment.run_once(), (3, 0, 0))
+
+        # Одинаковые слова запрашиваются один раз
+        self.assertEqual(stub.requests_count, 2)
+        self.assertFalse(EnrichmentJob.objects.exists())
+        response = self.client.get(f'/api/flashcard/{card_ids[1]}/enrichment/')
+        self.assertEqual(response.data['translation'], 'банан')
+        self.assertEqual(response.data['enrichment_status'], Flashcard.ENRICHMENT_DONE)
+        self.assertEqual([row[0] for row in search.search(self.user.id, 'банан')], [card_ids[1]])
+
+    def test_requires_owner_of_the_set(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.create_card('苹果').status_code, 401)
+
+        stranger = get_user_model().objects.create_user('stranger', password='x')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.create_card('苹果').status_code, 404)
+        self.assertFalse(Flashcard.objects.exists())
+
+    @override_settings(ENRICHMENT={'MAX_ATTEMPTS': 2})
+    def test_failed_translation_is_retried_with_backoff(self):
+        card_id = self.create_card('苹果').data['id']
+
+        with TranslationStubServer(status_code=503) as stub, override_settings(TRANSLATION_URL=stub.url):
+            self.assertEqual(enrichment.run_once(), (0, 1, 0))
+            job = EnrichmentJob.objects.get(flashcard_id=card_id)
+            self.assertEqual(job.status, EnrichmentJob.STATUS_PENDING)
+            self.assertGreater(job.run_after, timezone.now())
+            # Отложенная задача не берётся раньше времени
+            self.assertEqual(enrichment.run_once(), (0, 0, 0))
+
+            EnrichmentJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertEqual(enrichment.run_once(), (0, 0, 1))
+
+        self.assertEqual(EnrichmentJob.objects.get(pk=job.pk).status, EnrichmentJob.STATUS_FAILED)
+        self.assertEqual(Flashcard.objects.get(pk=card_id).enrichment_status, Flashcard.ENRICHMENT_FAILED)
+
+    def test_expired_lease_is_reclaimed(self):
+        card_id = self.create_card('苹果').data['id']
+        self.assertEqual(len(enrichment.claim_jobs()), 1)
+        self.assertEqual(enrichment.claim_jobs(), [])
+
+        EnrichmentJob.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        jobs = enrichment.claim_jobs()
+        self.assertEqual([job.flashcard_id for job in jobs], [card_id])
+        self.assertEqual(jobs[0].attempts, 2)
+
+    def test_user_edits_during_fetch_are_kept(self):
+        edited_id = self.create_card('苹果').data['id']
+        renamed_id = self.create_card('香蕉').data['id']
+        jobs = enrichment.claim_jobs()
+
+        # Пока воркер ждёт сервис, пользователь меняет перевод одной карточки и слово другой
+        Flashcard.objects.filter(pk=edited_id).update(translation='мой перевод')
+        Flashcard.objects.filter(pk=renamed_id).update(word='葡萄')
+        with TranslationStubServer(translations={'苹果': 'яблоко', '香蕉': 'банан'}) as stub, \
+                override_settings(TRANSLATION_URL=stub.url):
+            self.assertEqual(enrichment.process_jobs(jobs), (1, 1, 0))
+
+        edited = Flashcard.objects.get(pk=edited_id)
+        self.assertEqual((edited.translation, edited.enrichment_status), ('мой перевод', Flashcard.ENRICHMENT_DONE))
+        renamed = Flashcard.objects.get(pk=renamed_id)
+        self.assertEqual((renamed.translation, renamed.enrichment_status), ('', Flashcard.ENRICHMENT_PENDING))
+        job = EnrichmentJob.objects.get(flashcard_id=renamed_id)
+        self.assertEqual(job.status, EnrichmentJob.STATUS_PENDING)
+        self.assertLessEqual(job.run_after, timezone.now())
+
+    def test_cached_translation_needs_no_job(self):
+        translation_cache.set('苹果', 'ru', {'destination-text': 'яблоко'})
+        response = self.create_card('苹果')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['translation'], 'яблоко')
+        self.assertFalse(EnrichmentJob.objects.exists())
+
+
+class CachedTokenAuthenticationTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('token', password='x')
+        cls.token = Token.objects.create(user=cls.user)
+        FlashcardSet.objects.create(name='Набор', user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        authentication.local_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_sets(self):
+        return self.client.get('/api/sets/get/')
+
+    def test_cached_token_needs_no_queries(self):
+        with self.assertQueryBudget(2):
+            self.assertEqual(self.get_sets().status_code, 200)
+        # Токен и список наборов берутся из кэша
+        with self.assertQueryBudget(0):
+            self.assertEqual(self.get_sets().data[0]['name'], 'Набор')
+
+        # Другой процесс: пустой уровень в памяти, общий кэш
+        authentication.local_cache.clear()
+        with self.assertQueryBudget(0):
+            self.assertEqual(self.get_sets().status_code, 200)
+
+    def test_logout_invalidates_cached_token(self):
+        self.assertEqual(self.get_sets().status_code, 200)
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.get_sets().status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.get_sets().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_sets().status_code, 401)
+
+    def assertUserFields(self, user):
+        self.assertEqual((user.pk, user.username, user.is_active, user.is_staff, user.is_superuser),
+                         (self.user.pk, 'token', True, False, False))
+
+    @override_settings(AUTH_TOKEN_CACHE={'SIGNED_TOKENS': True, 'SIGNED_TOKEN_MAX_AGE': 60})
+    def test_cached_user_fields(self):
+        backend = authentication.CachedTokenAuthentication()
+        backend.authenticate_credentials(self.token.key)
+        user, _ = backend.authenticate_credentials(self.token.key)
+        self.assertUserFields(user)
+        self.assertEqual(self.client.get('/auth/users/me/').data['username'], 'token')
+        response = self.client.patch('/auth/users/me/', {'email': 'token@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.username, self.user.is_superuser), ('token', False))
+
+        # Подписанный токен, выданный по закэшированному пользователю
+        signed = self.client.post('/auth/token/signed/').data['auth_token']
+        user, _ = backend.authenticate_credentials(signed)
+        self.assertUserFields(user)
+
+    @override_settings(AUTH_TOKEN_CACHE={'SIGNED_TOKENS': True, 'SIGNED_TOKEN_MAX_AGE': 60})
+    def test_signed_token(self):
+        response = self.client.post('/auth/token/signed/')
+        self.assertEqual(response.status_code, 200)
+        signed = response.data['auth_token']
+
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {signed}')
+        # Только запрос списка наборов, пользователь восстанавливается из подписи
+        with self.assertQueryBudget(1):
+            self.assertEqual(client.get('/api/sets/get/').status_code, 200)
+
+        # Подписанным токеном новый не получить - иначе срок жизни не ограничен
+        self.assertEqual(client.post('/auth/token/signed/').status_code, 403)
+
+        client.credentials(HTTP_AUTHORIZATION=f'Token {signed[:-1]}x')
+        self.assertEqual(client.get('/api/sets/get/').status_code, 401)
+
+    def test_signed_tokens_disabled_by_default(self):
+        self.assertEqual(self.client.post('/auth/token/signed/').status_code, 404)
+        signed = authentication.sign_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {signed}')
+        self.assertEqual(self.get_sets().status_code, 401)
+
+
+class SyncTests(TestCase):
+    """Дельта-синхронизация по журналу изменений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('offline', password='x')
+        cls.other = User.objects.create_user('author', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        cls.cards = [
+            Flashcard.objects.create(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo',
+                                     flashcard_set=cls.flashcard_set)
+            for index in range(50)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, client=None):
+        url = '/api/sync/' if since is None else f'/api/sync/?since={since}'
+        response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changes_since_cursor(self):
+        full = self.sync()
+        self.assertTrue(full.data['full'])
+        self.assertEqual(len(full.data['cards']), 50)
+        cursor = full.data['cursor']
+
+        self.client.patch(f'/api/sets/{self.flashcard_set.id}/cards/{self.cards[0].id}/',
+                          {'translation': 'здравствуйте'}, format='json')
+        deleted_id = self.cards[1].id
+        self.cards[1].delete()
+        added = Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='xiè xie',
+                                         flashcard_set=self.flashcard_set)
+
+        delta = self.sync(cursor)
+        self.assertEqual(sorted(card['id'] for card in delta.data['cards']), [self.cards[0].id, added.id])
+        self.assertEqual(delta.data['deleted']['cards'], [deleted_id])
+        self.assertLess(len(delta.content) * 10, len(full.content))
+
+        # Повторная синхронизация с новым курсором пуста
+        empty = self.sync(delta.data['cursor'])
+        self.assertEqual((empty.data['cards'], empty.data['deleted']['cards']), ([], []))
+        self.assertEqual(empty.data['cursor'], delta.data['cursor'])
+
+    def test_paging(self):
+        cursor = self.sync().data['cursor']
+        for card in self.cards[:5]:
+            card.mastered = True
+            card.save()
+
+        first = self.client.get(f'/api/sync/?since={cursor}&limit=3').data
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['cursor']).data
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['cards']) + len(second['cards']), 5)
+
+    def test_set_deletion_is_one_tombstone(self):
+        cursor = self.sync().data['cursor']
+        set_id = self.flashcard_set.id
+        self.flashcard_set.delete()
+
+        self.assertEqual(ChangeLog.objects.filter(id__gt=cursor).count(), 1)
+        delta = self.sync(cursor)
+        self.assertEqual(delta.data['deleted']['sets'], [set_id])
+
+    def test_fork_sees_source_changes(self):
+        source = FlashcardSet.objects.create(name='Исходный', user=self.other, is_public=True)
+        shared = Flashcard.objects.create(word='猫', translation='кошка', pinyin='māo', flashcard_set=source)
+        fork = source.fork(self.user)
+        cursor = self.sync().data['cursor']
+
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        other_cursor = self.sync(client=other_client).data['cursor']
+
+        shared.translation = 'кот'
+        shared.save()
+        delta = self.sync(cursor)
+        self.assertEqual([card['translation'] for card in delta.data['cards']], ['кот'])
+
+        # Правка общей карточки в форке: копия вместо общей, автор исходного набора её не видит
+        copy = fork.materialize_card(shared)
+        delta = self.sync(delta.data['cursor'])
+        self.assertEqual([card['id'] for card in delta.data['cards']], [copy.id])
+        self.assertEqual(delta.data['deleted']['cards'], [shared.id])
+        other_delta = self.sync(other_cursor, client=other_client)
+        self.assertEqual([card['id'] for card in other_delta.data['cards']], [shared.id])
+
+    def test_fork_card_update_with_bad_set_id(self):
+        source = FlashcardSet.objects.create(name='Исходный', user=self.other, is_public=True)
+        shared = Flashcard.objects.create(word='猫', translation='кошка', pinyin='māo', flashcard_set=source)
+        fork = source.fork(self.user)
+
+        response = self.client.post('/api/sync/', {'changes': [
+            {'type': 'card', 'action': 'update', 'id': shared.id, 'flashcard_set_id': 'abc',
+             'data': {'translation': 'кот'}},
+            {'type': 'card', 'action': 'update', 'id': shared.id, 'flashcard_set_id': fork.id,
+             'data': {'translation': 'кот'}},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['invalid', 'ok'])
+        self.assertIn('flashcard_set_id', results[0]['error'])
+        self.assertEqual(fork.flashcards.get().translation, 'кот')
+
+    def test_offline_changes_upload(self):
+        stale = self.cards[2].last_modified - timedelta(seconds=1)
+        response = self.client.post('/api/sync/', {'changes': [
+            {'type': 'set', 'action': 'create', 'client_id': 's1', 'data': {'name': 'Офлайн'}},
+            {'type': 'card', 'action': 'create', 'client_id': 'c1',
+             'data': {'word': '书', 'translation': 'книга', 'flashcard_set_client_id': 's1'}},
+            {'type': 'card', 'action': 'create', 'client_id': 'c2',
+             'data': {'word': '水', 'flashcard_set_client_id': 's1'}},
+            {'type': 'card', 'action': 'update', 'id': self.cards[2].id, 'last_modified': stale.isoformat(),
+             'data': {'translation': 'устаревшая правка'}},
+            {'type': 'card', 'action': 'delete', 'id': self.cards[3].id},
+            {'type': 'card', 'action': 'create',
+             'data': {'translation': 'без слова', 'flashcard_set_id': self.flashcard_set.id}},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'ok', 'conflict', 'ok', 'invalid'])
+        new_set = FlashcardSet.objects.get(pk=results[0]['id'], user=self.user)
+        self.assertEqual(new_set.total_cards, 2)
+        self.assertEqual(Flashcard.objects.get(pk=results[1]['id']).pinyin, 'shū')
+        self.assertEqual(Flashcard.objects.get(pk=results[2]['id']).enrichment_status, Flashcard.ENRICHMENT_PENDING)
+        self.assertEqual(results[3]['error']['card']['translation'], 'привет 2')
+        self.assertFalse(Flashcard.objects.filter(pk=self.cards[3].id).exists())
+
+
+THROTTLE_SETTINGS = {
+    'DEFAULT_AUTHENTICATION_CLASSES': ('cards.authentication.CachedTokenAuthentication',),
+    'DEFAULT_THROTTLE_CLASSES': ['cards.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {'anon': '2/min', 'user': '100/min', 'translation': '2/min'},
+}
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_SETTINGS)
+class TokenBucketThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('busy', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_card(self):
+        return self.client.post('/api/flashcard/create/2/', {
+            'word': '苹果', 'translation': 'яблоко', 'definition': 'фрукт', 'hsk_level': 1, 'dl': 'ru',
+            'flashcard_set_id': self.flashcard_set.id,
+        }, format='json')
+
+    def test_translation_bucket_is_separate(self):
+        self.assertEqual([self.create_card().status_code for _ in range(3)], [200, 200, 429])
+        response = self.create_card()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # Остальные эндпоинты пользователя ограничиваются своим ведром
+        self.assertEqual(self.client.get('/api/sets/get/').status_code, 200)
+
+    def test_bucket_refills(self):
+        key = throttling.bucket_key('test', 'user:1')
+        capacity, interval = throttling.parse_rate('2/min')
+        start = time.time()
+
+        self.assertEqual(throttling.consume(key, capacity, interval, now=start), 0)
+        self.assertEqual(throttling.consume(key, capacity, interval, now=start), 0)
+        self.assertAlmostEqual(throttling.consume(key, capacity, interval, now=start), 30, places=3)
+        # Через 30 секунд появляется один токен, отклонённые запросы токены не тратили
+        self.assertEqual(throttling.consume(key, capacity, interval, now=start + 30), 0)
+        self.assertGreater(throttling.consume(key, capacity, interval, now=start + 30), 0)
+        # После простоя ведро полное, но не больше ёмкости
+        self.assertEqual(throttling.consume(key, capacity, interval, now=start + 600), 0)
+        self.assertEqual(throttling.consume(key, capacity, interval, now=start + 600), 0)
+        self.assertGreater(throttling.consume(key, capacity, interval, now=start + 600), 0)
+
+    def test_concurrent_requests_after_idle(self):
+        key = throttling.bucket_key('test', 'user:1')
+        capacity, interval = throttling.parse_rate('30/min')
+        start = time.time()
+        throttling.consume(key, capacity, interval, now=start)
+
+        class SlowCache:
+            """Общий кэш с задержкой после incr, как при обращении к Redis по сети"""
+
+            def __getattr__(self, name):
+                return getattr(cache, name)
+
+            def incr(self, *args, **kwargs):
+                value = cache.incr(*args, **kwargs)
+                time.sleep(0.005)
+                return value
+
+        allowed = []
+        with mock.patch.object(throttling, 'cache', SlowCache()):
+            errors = run_concurrently(
+                lambda index: allowed.append(throttling.consume(key, capacity, interval, now=start + 600) == 0), 100
+            )
+        self.assertEqual(errors, [])
+        # Ведро после простоя полное, но параллельные запросы не получают больше его ёмкости
+        self.assertEqual(allowed.count(True), capacity)
+
+    def test_anonymous_limited_by_address(self):
+        client = APIClient()
+        statuses = [client.get('/api/catalog/', REMOTE_ADDR='10.0.0.1').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(client.get('/api/catalog/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_check_overhead(self):
+        count = 1000
+        started = time.perf_counter()
+        for index in range(count):
+            throttling.check('user', f'user:{index % 10}')
+        self.assertLess((time.perf_counter() - started) / count, 0.001)
+
+
+class AdminTests(QueryBudgetMixin, TestCase):
+    """Админка на больших таблицах: без N+1, COUNT с LIMIT, массовые действия одним UPDATE"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        cls.author = User.objects.create_user('author', password='x')
+        cls.reader = User.objects.create_user('reader', password='x')
+        cls.source = FlashcardSet.objects.create(name='Исходный', user=cls.author, is_public=True)
+        cls.cards = [
+            Flashcard.objects.create(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo',
+                                     flashcard_set=cls.source)
+            for index in range(6)
+        ]
+        cls.source.refresh_from_db()
+        cls.fork = cls.source.fork(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_changelists_are_constant(self):
+        set_url = '/admin/cards/flashcardset/'
+        card_url = f'/admin/cards/flashcard/?flashcard_set={self.source.id}'
+        before = (len(self.changelist_queries(set_url)), len(self.changelist_queries(card_url)))
+
+        for index in range(10):
+            user = get_user_model().objects.create_user(f'user{index}', password='x')
+            flashcard_set = FlashcardSet.objects.create(name=f'Набор {index}', user=user)
+            Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='xiè xie', flashcard_set=self.source)
+            Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='xiè xie', flashcard_set=flashcard_set)
+
+        queries = self.changelist_queries(card_url)
+        self.assertEqual((len(self.changelist_queries(set_url)), len(queries)), before)
+        # Число строк считается по подзапросу с LIMIT, а не COUNT(*) по всей таблице
+        counts = [sql for sql in queries if 'COUNT(' in sql]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts), counts)
+
+    def test_mark_mastered(self):
+        card_ids = [card.id for card in self.cards[:4]]
+        cursor = ChangeLog.objects.aggregate(cursor=Max('id'))['cursor']
+        with self.assertQueryBudget(30):
+            response = self.client.post('/admin/cards/flashcard/', {
+                'action': 'mark_mastered', '_selected_action': card_ids,
+            })
+        self.assertEqual(response.status_code, 302)
+
+        self.source.refresh_from_db()
+        self.assertEqual((self.source.total_cards, self.source.mastered, self.source.still_learning), (6, 4, 2))
+        self.assertEqual(ReviewSchedule.objects.filter(user=self.author, mastered=True).count(), 4)
+        self.assertEqual(ChangeLog.objects.filter(id__gt=cursor, model=ChangeLog.CARD).count(), 4)
+        # Прогресс форка хранится отдельно и не меняется
+        self.fork.refresh_from_db()
+        self.assertEqual(self.fork.mastered, 0)
+
+    def test_move_to_set(self):
+        target = FlashcardSet.objects.create(name='Цель', user=self.reader)
+        card_ids = [card.id for card in self.cards[:2]]
+        response = self.client.post('/admin/cards/flashcard/', {
+            'action': 'move_to_set', '_selected_action': card_ids, 'flashcard_set': target.id,
+        })
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(Flashcard.objects.filter(flashcard_set=target).count(), 2)
+        for flashcard_set, total in ((self.source, 4), (self.fork, 4), (target, 2)):
+            flashcard_set.refresh_from_db()
+            self.assertEqual(flashcard_set.total_cards, total)
+        # Расписания прежнего владельца удаляются вместе с переносом
+        self.assertEqual(
+            set(ReviewSchedule.objects.filter(flashcard_id__in=card_ids).values_list('user_id', flat=True)),
+            {self.reader.id}
+        )
+        self.assertEqual(ReviewSchedule.objects.filter(user=self.reader, flashcard_id__in=card_ids).count(), 2)
+
+    def test_recompute_stats_matches_update_stats(self):
+        # Форк: одна карточка скопирована, одна общая изучена по расписанию читателя
+        self.fork.materialize_card(self.cards[0])
+        ReviewSchedule.objects.create(user=self.reader, flashcard=self.cards[1], due=timezone.now(), mastered=True)
+        Flashcard.objects.filter(pk=self.cards[2].pk).update(mastered=True)
+        FlashcardSet.objects.update(total_cards=0, still_learning=0, mastered=0)
+
+        with self.assertQueryBudget(2):
+            self.assertEqual(FlashcardSet.recompute_stats([self.source.id, self.fork.id]), 2)
+        recomputed = {
+            flashcard_set.id: (flashcard_set.total_cards, flashcard_set.mastered, flashcard_set.still_learning)
+            for flashcard_set in FlashcardSet.objects.all()
+        }
+        for flashcard_set in (self.source, self.fork):
+            flashcard_set.refresh_from_db()
+            flashcard_set.update_stats()
+            self.assertEqual(
+                recomputed[flashcard_set.id],
+                (flashcard_set.total_cards, flashcard_set.mastered, flashcard_set.still_learning)
+            )
+        self.assertEqual(recomputed[self.fork.id], (6, 1, 5))
+
+
+class StudyAnalyticsTests(QueryBudgetMixin, TestCase):
+    """Журнал ответов, инкрементальные дневные агрегаты и API статистики"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('student', password='x')
+        cls.author = User.objects.create_user('teacher', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        cls.cards = [
+            Flashcard.objects.create(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo',
+                                     flashcard_set=cls.flashcard_set)
+            for index in range(3)
+        ]
+        cls.source = FlashcardSet.objects.create(name='Чужой', user=cls.author, is_public=True)
+        cls.shared_card = Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='xiè xie',
+                                                   flashcard_set=cls.source)
+        cls.fork = cls.source.fork(cls.user)
+        cls.day = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def review(self, card, grade, day=0, minute=0, duration_ms=1000):
+        reviewed_at = self.day + timedelta(days=day, minutes=minute)
+        return submit_reviews(self.user, [
+            {'card_id': card.id, 'grade': grade, 'reviewed_at': reviewed_at, 'duration_ms': duration_ms}
+        ])
+
+    def progress(self, **params):
+        params.setdefault('from', self.day.date().isoformat())
+        params.setdefault('to', (self.day + timedelta(days=60)).date().isoformat())
+        response = self.client.get('/api/analytics/progress/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rollup_and_progress(self):
+        self.review(self.cards[0], 5)
+        self.review(self.cards[0], 2, minute=5)
+        self.review(self.cards[1], 4, minute=10)
+        self.review(self.shared_card, 4, minute=15)
+        self.review(self.cards[0], 5, day=1)
+        self.assertEqual(analytics.rollup(), 5)
+        self.assertEqual(analytics.rollup(), 0)
+
+        with self.assertQueryBudget(1):
+            data = self.progress()
+        first, second = data['days']
+        self.assertEqual(first['date'], self.day.date())
+        self.assertEqual((first['reviews'], first['cards_studied'], first['correct']), (4, 3, 3))
+        self.assertEqual(first['accuracy'], 0.75)
+        self.assertEqual(first['time_spent_ms'], 4000)
+        self.assertEqual((second['reviews'], second['cards_studied']), (1, 1))
+        self.assertEqual(data['totals']['reviews'], 5)
+
+        # Ответ на общую карточку учитывается в форке пользователя
+        shared = self.progress(set_id=self.fork.id)
+        self.assertEqual(shared['totals']['reviews'], 1)
+        self.assertEqual(self.progress(set_id=self.source.id)['totals']['reviews'], 0)
+
+    def test_rollup_is_incremental(self):
+        self.review(self.cards[0], 5)
+        analytics.rollup()
+        self.review(self.cards[1], 5, minute=1)
+        self.review(self.cards[0], 5, minute=2)
+        self.assertEqual(analytics.rollup(batch_size=1), 1)
+        self.assertEqual(analytics.rollup(), 1)
+
+        stats = DailyStudyStats.objects.get(user=self.user, flashcard_set_id=self.flashcard_set.id)
+        self.assertEqual((stats.reviews, stats.cards_studied, stats.time_spent_ms), (3, 2, 3000))
+
+    def test_newly_mastered(self):
+        # Интервалы 1, 6, 16, 45 дней: на четвёртом ответе карточка становится изученной
+        for day in (0, 1, 7, 23):
+            self.review(self.cards[2], 5, day=day)
+        self.review(self.cards[2], 0, day=68)
+        analytics.rollup()
+
+        data = self.progress(to=(self.day + timedelta(days=100)).date().isoformat())
+        self.assertEqual([day['newly_mastered'] for day in data['days']], [0, 0, 0, 1, 0])
+        self.assertEqual(data['totals']['forgotten'], 1)
+
+    def test_invalid_period(self):
+        for params in ({'from': '2024-02-01', 'to': '2024-01-01'}, {'from': '2020-01-01', 'to': '2024-01-01'},
+                       {'from': 'вчера'}):
+            self.assertEqual(self.client.get('/api/analytics/progress/', params).status_code, 400)
+
+
+@override_settings(QUIZ={'JITTER': 0})
+class QuizTests(QueryBudgetMixin, TestCase):
+    """Варианты ответа по похожести карточек и кэш матрицы признаков"""
+
+    WORDS = [
+        ('你好', 'привет'), ('你们', 'вы'), ('好人', 'хороший человек'), ('你', 'ты'),
+        ('苹果', 'яблоко'), ('电脑', 'компьютер'), ('飞机', 'самолёт'), ('医生', 'врач'),
+        ('火车', 'поезд'), ('米饭', 'рис'), ('天气', 'погода'), ('商店', 'магазин'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('quiz', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        Flashcard.objects.bulk_create([
+            Flashcard(word=word, translation=translation, pinyin=get_pinyin(word), flashcard_set=cls.flashcard_set)
+            for word, translation in cls.WORDS
+        ])
+        cls.author = User.objects.create_user('public', password='x')
+        cls.public = FlashcardSet.objects.create(name='Публичный', user=cls.author, is_public=True)
+        Flashcard.objects.bulk_create([
+            Flashcard(word=word, translation=f'{translation} (общий)', pinyin=get_pinyin(word),
+                      flashcard_set=cls.public)
+            for word, translation in cls.WORDS
+        ])
+
+    def setUp(self):
+        quiz.vocabulary_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_quiz(self, flashcard_set, n=20, choices=4):
+        response = self.client.get(f'/api/sets/{flashcard_set.id}/quiz/?n={n}&choices={choices}')
+        self.assertEqual(response.status_code, 200)
+        return response.data['questions']
+
+    def test_distractors_are_similar(self):
+        questions = {question['word']: question for question in self.get_quiz(self.flashcard_set)}
+        self.assertEqual(len(questions), len(self.WORDS))
+        question = questions['你好']
+        self.assertEqual(question['choices'][question['answer_index']], 'привет')
+        self.assertEqual(len(set(question['choices'])), 4)
+        self.assertEqual(set(question['choices']) - {'привет'}, {'вы', 'хороший человек', 'ты'})
+
+    def test_cached_matrix(self):
+        self.get_quiz(self.flashcard_set)
+        with self.assertQueryBudget(2):
+            self.get_quiz(self.flashcard_set)
+
+    def test_incremental_update(self):
+        self.get_quiz(self.flashcard_set)
+        card = Flashcard.objects.get(flashcard_set=self.flashcard_set, word='苹果')
+        card.translation = 'яблоко (фрукт)'
+        card.save()
+        Flashcard.objects.filter(flashcard_set=self.flashcard_set, word='医生').delete()
+
+        with mock.patch('cards.quiz.feature_rows', wraps=quiz.feature_rows) as build:
+            questions = self.get_quiz(self.flashcard_set)
+        # Пересчитываются только изменённые карточки (и с тем же временем изменения, что в отметке)
+        [call] = build.call_args_list
+        self.assertLessEqual(len(call.args[0]), 2)
+        answers = {question['word']: question['choices'][question['answer_index']] for question in questions}
+        self.assertEqual(answers['苹果'], 'яблоко (фрукт)')
+        self.assertNotIn('医生', answers)
+
+    def test_small_set_uses_global_vocabulary(self):
+        small = FlashcardSet.objects.create(name='Маленький', user=self.user)
+        Flashcard.objects.create(word='你好', translation='привет', pinyin='nǐ hǎo', flashcard_set=small)
+        [question] = self.get_quiz(small)
+        self.assertEqual(len(question['choices']), 4)
+        self.assertEqual(question['choices'][question['answer_index']], 'привет')
+        self.assertIn('вы (общий)', question['choices'])
+
+    def test_fork_includes_shared_cards(self):
+        fork = self.public.fork(self.user)
+        self.assertEqual(len(self.get_quiz(fork, n=100)), len(self.WORDS))
+
+    def test_invalid_parameters(self):
+        for query in ('n=0', 'n=1000', 'choices=1', 'n=abc'):
+            response = self.client.get(f'/api/sets/{self.flashcard_set.id}/quiz/?{query}')
+            self.assertEqual(response.status_code, 400)
+
+
+def n_plus_one_view(request):
+    from django.http import HttpResponse
+    for _ in range(6):
+        FlashcardSet.objects.filter(pk=1).exists()
+    return HttpResponse('ok')
+
+
+from django.urls import path  # noqa: E402
+
+urlpatterns = [path('n-plus-one/', n_plus_one_view)]
+
+
+class SearchIndexTests(TestCase):
+    """Поисковый индекс FTS5: ранжирование и удаление строк вместе с карточками"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('searcher', password='x')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_set(self, name, count, user=None):
+        flashcard_set = FlashcardSet.objects.create(name=name, user=user or self.user)
+        for index in range(count):
+            Flashcard.objects.create(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo',
+                                     flashcard_set=flashcard_set)
+        return flashcard_set
+
+    def search_words(self, query):
+        response = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [card['word'] for card in response.data]
+
+    def test_pinyin_and_character_queries(self):
+        flashcard_set = FlashcardSet.objects.create(name='Слова', user=self.user)
+        for word, translation in (('你好', 'привет'), ('银行', 'банк'), ('行李', 'багаж')):
+            Flashcard.objects.create(word=word, translation=translation, flashcard_set=flashcard_set)
+
+        for query in ('ni h', 'nǐ hǎo', 'ni3', 'nihao', '好', 'прив'):
+            self.assertEqual(self.search_words(query), ['你好'], query)
+        self.assertEqual(sorted(self.search_words('行')), ['行李', '银行'])
+
+    def test_translation_match_ranks_above_definition(self):
+        flashcard_set = FlashcardSet.objects.create(name='Слова', user=self.user)
+        Flashcard.objects.create(word='苹果', translation='фрукт', definition='не банан', flashcard_set=flashcard_set)
+        Flashcard.objects.create(word='香蕉', translation='банан', flashcard_set=flashcard_set)
+        self.assertEqual(self.search_words('банан'), ['香蕉', '苹果'])
+
+    def test_results_are_per_user_and_follow_edits(self):
+        other = get_user_model().objects.create_user('neighbour', password='x')
+        self.create_set('Чужой', 1, user=other)
+        card = self.create_set('Свой', 1).flashcards.get()
+        self.assertEqual(len(self.search_words('привет')), 1)
+
+        card.translation = 'здравствуйте'
+        card.save()
+        self.assertEqual(self.search_words('привет'), [])
+        self.assertEqual(self.search_words('здравств'), ['你好'])
+
+    def test_match_query_is_escaped(self):
+        self.assertEqual(search.build_match_query('ni "h'), '"ni"* "h"*')
+        self.assertEqual(search.build_match_query('你好 OR'), '"你"* "好"* "or"*')
+        self.assertEqual(self.search_words('"'), [])
+
+    def index_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def test_set_delete_removes_rows(self):
+        deleted = self.create_set('Удаляемый', 5)
+        kept = self.create_set('Оставшийся', 3)
+        deleted.delete()
+
+        self.assertEqual(self.index_size(), 3)
+        response = self.client.get('/api/search/?q=привет&limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({card['id'] for card in response.data},
+                         set(kept.flashcards.values_list('id', flat=True)))
+
+    def test_cascade_deletes_remove_rows(self):
+        other = get_user_model().objects.create_user('other', password='x')
+        self.create_set('Чужой', 2, user=other)
+        flashcard_set = self.create_set('Свой', 4)
+
+        Flashcard.objects.filter(flashcard_set=flashcard_set)[:1].get().delete()
+        Flashcard.objects.filter(flashcard_set=flashcard_set).filter(translation__endswith='1').delete()
+        self.assertEqual(self.index_size(), 4)
+
+        other.delete()
+        self.assertEqual(self.index_size(), 2)
+
+    def test_limit_is_clamped(self):
+        self.create_set('Набор', 3)
+        for limit, expected in (('-1', 1), ('0', 1), ('2', 2), ('1000', 3)):
+            response = self.client.get(f'/api/search/?q=привет&limit={limit}')
+            self.assertEqual(len(response.data), expected, limit)
+
+
+class ReviewSchedulerTests(TestCase):
+    """Интервальное повторение SM-2 и статус изучения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('learner', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        cls.card = Flashcard.objects.create(word='你好', translation='привет', pinyin='nǐ hǎo',
+                                            flashcard_set=cls.flashcard_set)
+        cls.day = timezone.now() - timedelta(days=100)
+
+    def review(self, grade, day):
+        return submit_reviews(self.user, [
+            {'card_id': self.card.id, 'grade': grade, 'reviewed_at': self.day + timedelta(days=day)}
+        ])[0]
+
+    def assertMastered(self, mastered):
+        self.card.refresh_from_db()
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.card.mastered, mastered)
+        self.assertEqual(ReviewSchedule.objects.get(user=self.user, flashcard=self.card).mastered, mastered)
+        self.assertEqual((self.flashcard_set.mastered, self.flashcard_set.still_learning), (int(mastered), 1 - mastered))
+
+    def test_manual_mastered_is_kept(self):
+        self.card.mastered = True
+        self.card.save()
+        self.review(4, 0)
+        self.review(2, 1)
+        self.assertMastered(True)
+
+    def test_threshold_mastered_is_forgotten(self):
+        for day in (0, 1, 7, 23):
+            self.review(5, day)
+        self.assertMastered(True)
+        self.review(0, 68)
+        self.assertMastered(False)
+
+    def test_sm2_intervals(self):
+        intervals = [self.review(5, day)['interval'] for day in (0, 1, 7)]
+        # 1 день, 6 дней, дальше интервал умножается на лёгкость (2.5 + 0.1 за каждый ответ "легко")
+        self.assertEqual(intervals, [1, 6, 16])
+        result = self.review(1, 23)
+        self.assertEqual(result['interval'], 1)
+        schedule = ReviewSchedule.objects.get(user=self.user, flashcard=self.card)
+        self.assertEqual((schedule.repetitions, schedule.lapses), (0, 1))
+        self.assertEqual(schedule.due, self.day + timedelta(days=24))
+
+    def test_ease_has_lower_bound(self):
+        for day in range(10):
+            self.review(0, day)
+        self.assertEqual(ReviewSchedule.objects.get(user=self.user, flashcard=self.card).ease, 1.3)
+
+    def test_duplicate_submission_is_skipped(self):
+        self.review(5, 0)
+        self.assertEqual(self.review(5, 0)['status'], 'duplicate')
+        self.assertEqual(ReviewLog.objects.filter(user=self.user).count(), 1)
+
+    def test_due_queue(self):
+        cards = [self.card] + [
+            Flashcard.objects.create(word=word, translation='перевод', pinyin='', flashcard_set=self.flashcard_set)
+            for word in ('谢谢', '苹果')
+        ]
+        now = timezone.now()
+        for card, due in zip(cards, (now - timedelta(hours=1), now - timedelta(days=2), now + timedelta(days=1))):
+            ReviewSchedule.objects.filter(flashcard=card).update(due=due)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/review/next/')
+        # Только карточки, срок которых наступил, самые просроченные первыми
+        self.assertEqual([item['card']['id'] for item in response.json()], [cards[1].id, cards[0].id])
+
+    def test_backfill_command(self):
+        mastered = Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='xiè xie',
+                                            flashcard_set=self.flashcard_set, mastered=True)
+        ReviewSchedule.objects.filter(flashcard=self.card).delete()
+        ReviewSchedule.objects.filter(flashcard=mastered).delete()
+
+        call_command('backfill_review_schedules', batch_size=1, stdout=StringIO())
+        call_command('backfill_review_schedules', stdout=StringIO())
+        schedules = dict(ReviewSchedule.objects.filter(user=self.user).values_list('flashcard_id', 'mastered'))
+        self.assertEqual(schedules, {self.card.id: False, mastered.id: True})
+
+
+class MemoryTranslationCache:
+    """Кэш переводов без БД для проверки асинхронного клиента вне транзакции теста"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get_from_memory(self, word, destination_language_code, source_language_code='zh-cn'):
+        return self.data.get((word, source_language_code, destination_language_code))
+
+    get_cached = get_from_memory
+
+    def record_miss(self):
+        pass
+
+    def set(self, word, destination_language_code, data, source_language_code='zh-cn'):
+        self.data[(word, source_language_code, destination_language_code)] = data
+
+
+class AsyncTranslationClientTests(unittest.TestCase):
+    """Асинхронный клиент сервиса перевода: объединение запросов, ошибки сервиса и размыкатель цепи"""
+
+    def test_concurrent_requests_are_coalesced(self):
+        async def run(client):
+            try:
+                return await asyncio.gather(*[client.get(word, 'ru') for word in ['苹果'] * 5 + ['香蕉']])
+            finally:
+                await client.aclose()
+
+        with TranslationStubServer(delay=0.1, translations={'苹果': 'яблоко'}) as stub:
+            client = AsyncTranslationClient(url=stub.url, cache=MemoryTranslationCache())
+            results = asyncio.run(run(client))
+            self.assertEqual([extract_translation(data) for data in results], ['яблоко'] * 5 + ['香蕉-ru'])
+            self.assertEqual(stub.requests_count, 2)
+            self.assertEqual((client.upstream_requests, client.coalesced_requests), (2, 4))
+
+            # Повторный запрос - из кэша, без обращения к сервису
+            client = AsyncTranslationClient(url=stub.url, cache=client.cache)
+            asyncio.run(run(client))
+            self.assertEqual(stub.requests_count, 2)
+
+    def test_circuit_breaker(self):
+        async def fetch_all(client, count):
+            try:
+                return [await client.fetch('苹果', 'ru') for _ in range(count)]
+            finally:
+                await client.aclose()
+
+        with TranslationStubServer(status_code=503) as stub:
+            client = AsyncTranslationClient(url=stub.url, failure_threshold=2, reset_timeout=0.1)
+            self.assertEqual(asyncio.run(fetch_all(client, 4)), [None] * 4)
+            # После двух ошибок подряд цепь разомкнута: сервис больше не вызывается
+            self.assertEqual(stub.requests_count, 2)
+            self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+            time.sleep(0.15)
+            stub.status_code = 200
+            self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertIsNotNone(asyncio.run(fetch_all(client, 1))[0])
+            self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        # Неудачная проба снова размыкает цепь
+        breaker.record_failure()
+        breaker.reset_timeout = 60
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_trial_released_on_cancel_and_errors(self):
+        client = AsyncTranslationClient(url='http://stub/translate', failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(60)
+
+        async def cancelled():
+            task = asyncio.ensure_future(client.fetch('苹果', 'ru'))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch.object(httpx.AsyncClient, 'get', hang):
+            asyncio.run(cancelled())
+        self.assertTrue(client.breaker.allow_request())
+        client.breaker.end_trial()
+
+        with mock.patch.object(httpx.AsyncClient, 'get', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            asyncio.run(client.fetch('苹果', 'ru'))
+        # Следующий запрос снова может стать пробным
+        self.assertTrue(client.breaker.allow_request())
+
+    def fetch(self, handler, client):
+        async def run():
+            client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            try:
+                return await client.fetch('苹果', 'ru')
+            finally:
+                await client.aclose()
+        return asyncio.run(run())
+
+    def test_non_json_response_is_upstream_failure(self):
+        client = AsyncTranslationClient(url='http://stub/translate', failure_threshold=1)
+        with self.assertLogs('cards.async_translation', level='WARNING'):
+            data = self.fetch(lambda request: httpx.Response(200, text='<html>Bad gateway</html>'), client)
+        self.assertIsNone(data)
+        self.assertEqual(client.breaker.failures, 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+
+class TranslationCacheTests(TestCase):
+    """Двухуровневый кэш переводов: память процесса -> CachedTranslation -> сервис"""
+
+    def setUp(self):
+        self.fetched = []
+        self.cache = TranslationCache(ttl=timedelta(hours=1), fetch=self.fetch)
+
+    def fetch(self, word, destination_language_code, source_language_code):
+        self.fetched.append(word)
+        return {'destination-text': f'{word}-{len(self.fetched)}'}
+
+    def test_tiers(self):
+        data = self.cache.get('苹果', 'ru')
+        self.assertEqual(self.cache.get('苹果', 'ru'), data)
+        self.assertEqual(self.fetched, ['苹果'])
+        self.assertEqual(self.cache.stats()['memory_hits'], 1)
+
+        # Новый процесс: памяти нет, перевод читается из БД без запроса к сервису
+        self.cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get('苹果', 'ru'), data)
+        self.assertEqual((self.cache.stats()['db_hits'], self.fetched), (1, ['苹果']))
+        # Ключ включает язык перевода
+        self.cache.get('苹果', 'en')
+        self.assertEqual(self.fetched, ['苹果', '苹果'])
+
+    def test_expired_db_entry_is_refetched(self):
+        self.cache.get('苹果', 'ru')
+        CachedTranslation.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.cache.clear()
+        self.assertEqual(self.cache.get('苹果', 'ru'), {'destination-text': '苹果-2'})
+        self.assertEqual(CachedTranslation.objects.get().data, {'destination-text': '苹果-2'})
+
+    def test_prune_keeps_recently_used(self):
+        cache = TranslationCache(ttl=timedelta(hours=1), max_db_entries=2, prune_every=3, fetch=self.fetch)
+        for index, word in enumerate(('一', '二', '三')):
+            cache.get(word, 'ru')
+            CachedTranslation.objects.filter(word=word).update(last_used=timezone.now() - timedelta(days=10 - index))
+        cache.prune()
+        self.assertEqual(sorted(CachedTranslation.objects.values_list('word', flat=True)), sorted(['二', '三']))
+
+    def test_memory_is_lru(self):
+        cache = TranslationCache(max_memory_entries=2, fetch=self.fetch)
+        for word in ('一', '二', '一', '三'):
+            cache.get(word, 'ru')
+        self.assertIsNone(cache.get_from_memory('二', 'ru'))
+        self.assertIsNotNone(cache.get_from_memory('一', 'ru'))
+
+    def test_memory_entries_expire_with_ttl(self):
+        self.cache.get('苹果', 'ru')
+        later = time.monotonic() + 3601
+        with mock.patch('cards.translation.time.monotonic', return_value=later):
+            self.assertIsNone(self.cache.get_from_memory('苹果', 'ru'))
+        self.assertEqual(self.cache.stats()['memory_entries'], 0)
+
+    def test_memory_entry_from_db_keeps_db_age(self):
+        self.cache.get('苹果', 'ru')
+        CachedTranslation.objects.update(created_at=timezone.now() - timedelta(minutes=59))
+        self.cache.clear()
+        self.assertEqual(self.cache.get_cached('苹果', 'ru'), {'destination-text': '苹果-1'})
+        # Запись из БД получена 59 минут назад - в памяти ей осталось жить около минуты
+        with mock.patch('cards.translation.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertIsNone(self.cache.get_from_memory('苹果', 'ru'))
+
+
+class HskTests(unittest.TestCase):
+    """Уровни HSK по словарю: покрытие встроенного списка и подключаемые списки"""
+
+    def tearDown(self):
+        hsk.reset_index()
+
+    def test_bundled_coverage_is_reported(self):
+        self.assertEqual(hsk.coverage(), {'hsk2': [1, 2], 'hsk3': []})
+        self.assertEqual(hsk.lookup('苹果'), (1, None))
+        # Слово вне встроенного списка остаётся без уровня
+        self.assertEqual(hsk.lookup('香蕉'), (None, None))
+        self.assertEqual([warning.id for warning in hsk.check_coverage()], ['cards.W001'])
+        # Предупреждение только для check --deploy, а не для каждой команды и тестов
+        self.assertNotIn('cards.W001', [message.id for message in checks.run_checks()])
+        self.assertIn('cards.W001', [message.id for message in checks.run_checks(include_deployment_checks=True)])
+
+    def test_extra_wordlists(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hsk.tsv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('香蕉\t3\t2\n苹果\t\t1\n')
+            with override_settings(HSK_WORDLISTS=[path]):
+                hsk.reset_index()
+                self.assertEqual(hsk.lookup('香蕉'), (3, 2))
+                # Уровень HSK 2.0 из встроенного списка сохраняется
+                self.assertEqual(hsk.lookup('苹果'), (1, 1))
+                self.assertEqual(hsk.coverage(), {'hsk2': [1, 2, 3], 'hsk3': [1, 2]})
+
+    def test_download_full_wordlists(self):
+        entries = [
+            {'simplified': f'词{level}', 'level': [f'old-{level}', f'new-{level}']} for level in range(1, 7)
+        ] + [
+            {'simplified': '词7', 'level': ['new-7']},
+            {'simplified': '香蕉', 'level': ['old-3', 'new-2']},
+            # Омоним с другим уровнем: берётся минимальный
+            {'simplified': '香蕉', 'level': ['old-5']},
+            {'simplified': '没有等级', 'level': []},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'complete.json')
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            output = os.path.join(directory, 'data', 'hsk_full.tsv')
+
+            with override_settings(HSK_FULL_WORDLIST=output):
+                call_command('download_hsk_wordlists', source=source, stdout=StringIO())
+                self.assertEqual(hsk.lookup('香蕉'), (3, 2))
+                self.assertEqual(hsk.lookup('词7'), (None, 7))
+                self.assertEqual(hsk.lookup('没有等级'), (None, None))
+                self.assertEqual(hsk.coverage(), {'hsk2': [1, 2, 3, 4, 5, 6], 'hsk3': [1, 2, 3, 4, 5, 6, 7]})
+                self.assertEqual(hsk.check_coverage(), [])
+            self.assertEqual(os.listdir(os.path.dirname(output)), ['hsk_full.tsv'])
+
+
+class BulkImportTests(TestCase):
+    """Массовый импорт: bulk_create одной транзакцией и одна дельта статистики на набор"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('importer', password='x')
+        cls.other = User.objects.create_user('stranger', password='x')
+        cls.first = FlashcardSet.objects.create(name='Первый', user=cls.user)
+        cls.second = FlashcardSet.objects.create(name='Второй', user=cls.user)
+        cls.foreign = FlashcardSet.objects.create(name='Чужой', user=cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_json_rows_to_several_sets(self):
+        rows = [
+            {'word': '苹果', 'translation': 'яблоко', 'mastered': True},
+            {'word': '香蕉', 'translation': 'банан'},
+            {'word': '谢谢', 'translation': 'спасибо', 'flashcard_set_id': self.second.id},
+            {'word': '你好', 'translation': 'привет', 'flashcard_set_id': self.foreign.id},
+            'не словарь',
+        ]
+        response = self.client.post(f'/api/flashcard/bulk/?flashcard_set_id={self.first.id}', rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 2))
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+        self.assertFalse(self.foreign.flashcards.exists())
+        for flashcard_set, expected in ((self.first, (2, 1, 1)), (self.second, (1, 0, 1))):
+            flashcard_set.refresh_from_db()
+            self.assertEqual((flashcard_set.total_cards, flashcard_set.mastered, flashcard_set.still_learning), expected)
+        # Импортированные карточки сразу в очереди повторения и в поиске
+        self.assertEqual(ReviewSchedule.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(len(search.search(self.user.id, 'банан')), 1)
+
+    def test_anki_tsv_without_header(self):
+        text = '#separator:tab\n#html:false\n苹果\tяблоко\tpíng guǒ\n香蕉\tбанан\n'
+        response = self.client.post(
+            f'/api/flashcard/bulk/?flashcard_set_id={self.first.id}', text, content_type='text/tab-separated-values'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            list(self.first.flashcards.order_by('id').values_list('word', 'translation', 'pinyin')),
+            [('苹果', 'яблоко', 'píng guǒ'), ('香蕉', 'банан', 'xiāng jiāo')]
+        )
+
+    def test_multiline_quoted_fields(self):
+        # Перевод строки и "#" в начале строки внутри кавычек - часть поля, а не новая запись
+        text = ('word,translation,example_sentence\n'
+                '苹果,"яблоко\n# красное","我吃苹果。\n\nЯ ем яблоко."\n'
+                '# комментарий\n\n香蕉,банан\n')
+        self.assertEqual(parse_rows(text, ','), [
+            {'word': '苹果', 'translation': 'яблоко\n# красное', 'example_sentence': '我吃苹果。\n\nЯ ем яблоко.'},
+            {'word': '香蕉', 'translation': 'банан'},
+        ])
+
+    def test_all_rows_invalid(self):
+        response = self.client.post(f'/api/flashcard/bulk/?flashcard_set_id={self.foreign.id}',
+                                    [{'word': '苹果'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+
+class SetStatsTests(TestCase):
+    """Счётчики набора: атомарные F()-дельты вместо полного пересчёта"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('counter', password='x')
+
+    def setUp(self):
+        self.first = FlashcardSet.objects.create(name='Первый', user=self.user)
+        self.second = FlashcardSet.objects.create(name='Второй', user=self.user)
+
+    def stats(self, flashcard_set):
+        flashcard_set.refresh_from_db()
+        return flashcard_set.total_cards, flashcard_set.mastered, flashcard_set.still_learning
+
+    def assertMatchesRecount(self, *flashcard_sets):
+        for flashcard_set in flashcard_sets:
+            counted = self.stats(flashcard_set)
+            flashcard_set.update_stats()
+            self.assertEqual(counted, self.stats(flashcard_set))
+
+    def test_card_lifecycle(self):
+        cards = [
+            Flashcard.objects.create(word=word, translation='перевод', pinyin='', flashcard_set=self.first)
+            for word in ('苹果', '香蕉', '谢谢')
+        ]
+        self.assertEqual(self.stats(self.first), (3, 0, 3))
+
+        cards[0].mastered = True
+        with CaptureQueriesContext(connection) as context:
+            cards[0].save()
+        # Без COUNT по карточкам набора - только дельта
+        self.assertFalse([query for query in context.captured_queries if 'COUNT' in query['sql'].upper()])
+        self.assertEqual(self.stats(self.first), (3, 1, 2))
+
+        cards[0].flashcard_set = self.second
+        cards[0].save()
+        self.assertEqual((self.stats(self.first), self.stats(self.second)), ((2, 0, 2), (1, 1, 0)))
+
+        cards[1].delete()
+        self.assertEqual(self.stats(self.first), (1, 0, 1))
+        self.assertMatchesRecount(self.first, self.second)
+
+    def test_stale_set_save_keeps_counters(self):
+        stale = FlashcardSet.objects.get(pk=self.first.pk)
+        Flashcard.objects.create(word='苹果', translation='яблоко', pinyin='', flashcard_set=self.first, mastered=True)
+        stale.name = 'Переименован'
+        stale.save()
+        self.assertEqual(self.stats(self.first), (1, 1, 0))
+        self.assertEqual(self.first.name, 'Переименован')
+
+
+class PinyinTests(unittest.TestCase):
+    """Локальная генерация пиньиня (pypinyin) без запросов к внешнему сервису"""
+
+    def test_styles(self):
+        self.assertEqual(get_pinyin('你好'), 'nǐ hǎo')
+        self.assertEqual(get_pinyin('你好', 'numeric'), 'ni3 hao3')
+        self.assertEqual(get_pinyin('你好', 'toneless'), 'ni hao')
+
+    def test_heteronyms_resolved_by_context(self):
+        self.assertEqual(get_pinyin('银行'), 'yín háng')
+        self.assertEqual(get_pinyin('长城'), 'cháng chéng')
+        self.assertEqual(get_pinyin('长大'), 'zhǎng dà')
+        # Одиночный иероглиф - основное чтение, остальные доступны через char_pinyin
+        self.assertEqual(get_pinyin('行'), 'xíng')
+        self.assertIn('háng', char_pinyin('行'))
+
+    def test_neutral_tone_from_phrase_dictionary(self):
+        self.assertEqual(get_pinyin('朋友'), 'péng you')
+        self.assertEqual(get_pinyin('朋友', 'numeric'), 'peng2 you5')
+
+    def test_non_chinese_text_is_unchanged(self):
+        self.assertEqual(get_pinyin('Hello'), 'Hello')
+        self.assertEqual(get_pinyin(''), '')
+        self.assertEqual(get_pinyin('你好abc'), 'nǐ hǎo abc')
+
+
+class BatchCreateTests(TestCase):
+    """Создание карточек из списка слов: параллельные переводы и построчный ответ (NDJSON)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('batcher', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        Flashcard.objects.create(word='谢谢', translation='спасибо', pinyin='', flashcard_set=cls.flashcard_set)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Потоки пула не видят транзакцию теста: кэш в БД не используется, запросы идут в stub-сервер
+        patcher = mock.patch.object(
+            translation_cache, 'get', side_effect=lambda word, language, *args: fetch_translation(word, language)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, words, stub):
+        with override_settings(TRANSLATION_URL=stub.url):
+            response = self.client.post('/api/flashcard/create/batch/', {
+                'words': words, 'flashcard_set_id': self.flashcard_set.id,
+            }, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_words_are_translated_concurrently(self):
+        words = ['苹果', '香蕉', '苹果', '谢谢', 'hello', '葡萄']
+        with TranslationStubServer(delay=0.3, translations={'苹果': 'яблоко', '香蕉': 'банан', '葡萄': 'виноград'}) as stub:
+            started = time.perf_counter()
+            lines = self.post(words, stub)
+            elapsed = time.perf_counter() - started
+
+        # Повторы отброшены, существующее и некорректное слово не запрашиваются
+        self.assertEqual(stub.requests_count, 3)
+        # Три запроса по 0.3 с выполняются параллельно
+        self.assertLess(elapsed, 0.8)
+        statuses = {line['word']: line['status'] for line in lines[:-1]}
+        self.assertEqual(statuses, {'谢谢': 'exists', 'hello': 'invalid', '苹果': 'translated',
+                                    '香蕉': 'translated', '葡萄': 'translated'})
+        done = lines[-1]
+        self.assertEqual((done['status'], done['created']), ('done', 3))
+        self.assertEqual(
+            dict(Flashcard.objects.filter(id__in=done['ids']).values_list('word', 'translation')),
+            {'苹果': 'яблоко', '香蕉': 'банан', '葡萄': 'виноград'}
+        )
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.total_cards, 4)
+
+    def test_failed_translations_are_reported(self):
+        with TranslationStubServer(status_code=503) as stub:
+            lines = self.post('苹果 香蕉', stub)
+        self.assertEqual([line['status'] for line in lines], ['failed', 'failed', 'done'])
+        self.assertEqual(lines[-1]['created'], 0)
+
+    def test_invalid_requests(self):
+        response = self.client.post('/api/flashcard/create/batch/', {'words': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        other = FlashcardSet.objects.create(name='Чужой', user=get_user_model().objects.create_user('other'))
+        response = self.client.post('/api/flashcard/create/batch/', {
+            'words': ['苹果'], 'flashcard_set_id': other.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class SetCardsListTests(TestCase):
+    """Карточки набора: keyset-пагинация, ?fields= и условный GET по ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('lister', password='x')
+        cls.other = User.objects.create_user('private', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        cls.private = FlashcardSet.objects.create(name='Личный', user=cls.other)
+        Flashcard.objects.bulk_create([
+            Flashcard(word='你好', translation=f'привет {index}', pinyin='nǐ hǎo', flashcard_set=cls.flashcard_set)
+            for index in range(7)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/sets/{self.flashcard_set.id}/cards/'
+
+    def test_pages_cover_all_cards(self):
+        translations = []
+        url = f'{self.url}?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            translations += [card['translation'] for card in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(translations, [f'привет {index}' for index in range(7)])
+
+    def test_fields(self):
+        response = self.client.get(f'{self.url}?fields=id,word')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'word'})
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Изменение карточки меняет ETag
+        card = self.flashcard_set.flashcards.first()
+        card.translation = 'здравствуйте'
+        card.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_private_set_of_other_user(self):
+        self.assertEqual(self.client.get(f'/api/sets/{self.private.id}/cards/').status_code, 404)
+
+
+class SetExportTests(TestCase):
+    """Потоковый экспорт набора: CSV, TSV Anki, JSONL и пакет .apkg"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('exporter', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Фрукты', user=cls.user)
+        for word, translation in (('苹果', 'яблоко, красное'), ('香蕉', 'банан')):
+            Flashcard.objects.create(word=word, translation=translation, pinyin=get_pinyin(word),
+                                     flashcard_set=cls.flashcard_set)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format):
+        response = self.client.get(f'/api/sets/{self.flashcard_set.id}/export/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = parse_rows(self.export('csv').decode('utf-8'), ',')
+        self.assertEqual([(row['word'], row['translation']) for row in rows],
+                         [('苹果', 'яблоко, красное'), ('香蕉', 'банан')])
+
+    def test_tsv_can_be_imported_back(self):
+        content = self.export('tsv').decode('utf-8')
+        target = FlashcardSet.objects.create(name='Копия', user=self.user)
+        response = self.client.post(f'/api/flashcard/bulk/?flashcard_set_id={target.id}', content,
+                                    content_type='text/tab-separated-values')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(list(target.flashcards.order_by('id').values_list('word', 'translation', 'pinyin')),
+                         list(self.flashcard_set.flashcards.order_by('id').values_list('word', 'translation', 'pinyin')))
+
+    def test_jsonl(self):
+        lines = [json.loads(line) for line in self.export('jsonl').decode('utf-8').splitlines()]
+        self.assertEqual([line['word'] for line in lines], ['苹果', '香蕉'])
+        self.assertEqual(lines[0]['pinyin'], 'píng guǒ')
+
+    def test_apkg(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'deck.apkg')
+            with open(path, 'wb') as f:
+                f.write(self.export('apkg'))
+            with zipfile.ZipFile(path) as package:
+                package.extract('collection.anki2', directory)
+            with closing(sqlite3.connect(os.path.join(directory, 'collection.anki2'))) as collection:
+                notes = [row[0].split('\x1f')[:3] for row in collection.execute('SELECT flds FROM notes ORDER BY id')]
+                self.assertEqual(collection.execute('SELECT COUNT(*) FROM cards').fetchone()[0], 2)
+        self.assertEqual(notes, [['苹果', 'píng guǒ', 'яблоко, красное'], ['香蕉', 'xiāng jiāo', 'банан']])
+
+    def test_apkg_failure_removes_temporary_file(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(tempfile, 'tempdir', directory), \
+                mock.patch('cards.exporters.write_apkg', side_effect=sqlite3.OperationalError('disk full')):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.client.get(f'/api/sets/{self.flashcard_set.id}/export/', {'format': 'apkg'})
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_unknown_format(self):
+        response = self.client.get(f'/api/sets/{self.flashcard_set.id}/export/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserSetsCacheTests(TestCase):
+    """Список наборов пользователя: кэш по версии данных пользователя и ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.user = User.objects.create_user('owner', password='x')
+        cls.other = User.objects.create_user('someone', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+        cls.other_set = FlashcardSet.objects.create(name='Чужой', user=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **headers):
+        return self.client.get('/api/sets/get/', **headers)
+
+    def test_cached_list_and_etag(self):
+        etag = self.get()['ETag']
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual([item['name'] for item in response.data], ['Набор'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changes_invalidate_only_own_list(self):
+        etag = self.get()['ETag']
+        Flashcard.objects.create(word='苹果', translation='яблоко', pinyin='', flashcard_set=self.other_set)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Flashcard.objects.create(word='苹果', translation='яблоко', pinyin='', flashcard_set=self.flashcard_set)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['total_cards'], 1)
+
+        FlashcardSet.objects.create(name='Новый', user=self.user)
+        self.assertEqual([item['name'] for item in self.get().data], ['Новый', 'Набор'])
+
+
+class CatalogTests(TestCase):
+    """Каталог публичных наборов: инкрементальные фасеты и фильтры"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('publisher', password='x')
+        cls.category = Category.objects.create(name='Еда')
+
+    def facets(self):
+        return {
+            (facet, value): count
+            for facet, value, count in CatalogFacet.objects.filter(count__gt=0).values_list('facet', 'value', 'count')
+        }
+
+    def assertMatchesRecount(self):
+        incremental = self.facets()
+        call_command('refresh_catalog_facets', stdout=StringIO())
+        self.assertEqual(incremental, self.facets())
+        return incremental
+
+    def test_facets_follow_set_changes(self):
+        first = FlashcardSet.objects.create(name='Первый', user=self.user, is_public=True, category=self.category)
+        second = FlashcardSet.objects.create(name='Второй', user=self.user, is_public=True, difficulty='advanced')
+        FlashcardSet.objects.create(name='Личный', user=self.user)
+        Flashcard.objects.create(word='苹果', translation='яблоко', pinyin='', flashcard_set=first)
+        self.assertEqual(self.assertMatchesRecount(), {
+            ('category', str(self.category.id)): 1, ('difficulty', 'beginner'): 1,
+            ('difficulty', 'advanced'): 1, ('hsk_level', '1'): 1,
+        })
+
+        # Экземпляр, загруженный из БД, и экземпляр с отложенными полями фасетов
+        first = FlashcardSet.objects.get(pk=first.pk)
+        first.difficulty = 'advanced'
+        first.save()
+        second = FlashcardSet.objects.only('id', 'name').get(pk=second.pk)
+        second.is_public = False
+        second.save(update_fields=['is_public'])
+        self.assertEqual(self.assertMatchesRecount(), {
+            ('category', str(self.category.id)): 1, ('difficulty', 'advanced'): 1, ('hsk_level', '1'): 1,
+        })
+
+        first.delete()
+        self.assertEqual(self.assertMatchesRecount(), {})
+
+    def test_catalog_filters(self):
+        easy = FlashcardSet.objects.create(name='Лёгкий', user=self.user, is_public=True, category=self.category)
+        Flashcard.objects.create(word='苹果', translation='яблоко', pinyin='', flashcard_set=easy)
+        FlashcardSet.objects.create(name='Сложный', user=self.user, is_public=True, difficulty='advanced')
+        FlashcardSet.objects.create(name='Личный', user=self.user)
+
+        def names(**params):
+            response = self.client.get('/api/catalog/', params)
+            self.assertEqual(response.status_code, 200)
+            return [item['name'] for item in response.data['results']]
+
+        self.assertEqual(names(), ['Сложный', 'Лёгкий'])
+        self.assertEqual(names(category=self.category.id), ['Лёгкий'])
+        self.assertEqual(names(difficulty='advanced'), ['Сложный'])
+        self.assertEqual(names(hsk=1), ['Лёгкий'])
+        response = self.client.get('/api/catalog/')
+        self.assertEqual(response.data['facets']['category'], [{'value': str(self.category.id), 'count': 1, 'name': 'Еда'}])
+        self.assertEqual(self.client.get('/api/catalog/', {'hsk': 'x'}).status_code, 400)
+
+
+class ForkTests(TestCase):
+    """Форки наборов: общие карточки и копирование при записи (copy-on-write)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        User = get_user_model()
+        cls.author = User.objects.create_user('author', password='x')
+        cls.reader = User.objects.create_user('reader', password='x')
+
+    def setUp(self):
+        self.source = FlashcardSet.objects.create(name='Исходный', user=self.author, is_public=True)
+        self.cards = [
+            Flashcard.objects.create(word=word, translation=translation, pinyin='', flashcard_set=self.source)
+            for word, translation in (('苹果', 'яблоко'), ('香蕉', 'банан'), ('谢谢', 'спасибо'))
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def fork(self, flashcard_set):
+        response = self.client.post(f'/api/sets/{flashcard_set.id}/fork/', {'name': 'Мой'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return FlashcardSet.objects.get(pk=response.data['id'])
+
+    def translations(self, flashcard_set):
+        response = self.client.get(f'/api/sets/{flashcard_set.id}/cards/')
+        return sorted(card['translation'] for card in response.data['results'])
+
+    def test_fork_shares_cards(self):
+        cards_before = Flashcard.objects.count()
+        fork = self.fork(self.source)
+        self.assertEqual(Flashcard.objects.count(), cards_before)
+        self.assertEqual((fork.forked_from_id, fork.total_cards), (self.source.id, 3))
+
+        # Изменения исходного набора видны в форке
+        self.cards[0].translation = 'яблоко (фрукт)'
+        self.cards[0].save()
+        self.assertEqual(self.translations(fork), ['банан', 'спасибо', 'яблоко (фрукт)'])
+
+    def test_edit_materializes_copy(self):
+        fork = self.fork(self.source)
+        submit_reviews(self.reader, [{'card_id': self.cards[1].id, 'grade': 5}])
+
+        response = self.client.patch(f'/api/sets/{fork.id}/cards/{self.cards[1].id}/', {'translation': 'мой банан'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        copy = Flashcard.objects.get(pk=response.data['id'])
+        self.assertEqual((copy.flashcard_set_id, copy.source_card_id), (fork.id, self.cards[1].id))
+        # Исходная карточка не изменилась, прогресс читателя перешёл на копию
+        self.cards[1].refresh_from_db()
+        self.assertEqual(self.cards[1].translation, 'банан')
+        self.assertTrue(ReviewSchedule.objects.filter(user=self.reader, flashcard=copy, repetitions=1).exists())
+        self.assertEqual(self.translations(fork), ['мой банан', 'спасибо', 'яблоко'])
+        self.assertEqual(self.translations(self.source), ['банан', 'спасибо', 'яблоко'])
+
+        # Повторное редактирование меняет уже скопированную карточку
+        response = self.client.patch(f'/api/sets/{fork.id}/cards/{copy.id}/', {'translation': 'банан!'}, format='json')
+        self.assertEqual(response.data['id'], copy.id)
+        fork.refresh_from_db()
+        self.assertEqual(fork.total_cards, 3)
+
+    def test_source_delete_materializes_shared_cards(self):
+        fork = self.fork(self.source)
+        submit_reviews(self.reader, [{'card_id': self.cards[2].id, 'grade': 5}])
+        self.source.delete()
+
+        fork.refresh_from_db()
+        self.assertEqual(fork.total_cards, 3)
+        self.assertEqual(self.translations(fork), ['банан', 'спасибо', 'яблоко'])
+        copy = fork.flashcards.get(word='谢谢')
+        self.assertTrue(ReviewSchedule.objects.filter(user=self.reader, flashcard=copy, repetitions=1).exists())
+
+    def stats(self, flashcard_set):
+        flashcard_set.refresh_from_db()
+        return flashcard_set.total_cards, flashcard_set.mastered, flashcard_set.still_learning
+
+    def assertStats(self, flashcard_set, expected):
+        self.assertEqual(self.stats(flashcard_set), expected)
+        flashcard_set.update_stats()
+        self.assertEqual(self.stats(flashcard_set), expected)
+
+    def test_source_card_delete_updates_fork_stats(self):
+        fork = self.fork(self.source)
+        # Своя копия первой карточки и изученная по расписанию читателя вторая
+        self.client.patch(f'/api/sets/{fork.id}/cards/{self.cards[0].id}/', {'translation': 'моё'}, format='json')
+        ReviewSchedule.objects.filter(user=self.reader, flashcard=self.cards[1]).delete()
+        ReviewSchedule.objects.create(user=self.reader, flashcard=self.cards[1], due=timezone.now(), mastered=True)
+        fork.update_stats()
+        self.assertStats(fork, (3, 1, 2))
+
+        # Копия в форке остаётся
+        self.cards[0].delete()
+        self.assertStats(fork, (3, 1, 2))
+        # Уходит изученная карточка, а не изучаемая
+        self.cards[1].delete()
+        self.assertStats(fork, (2, 0, 2))
+        self.assertStats(self.source, (1, 0, 1))
+
+    def test_fork_of_fork_points_to_source(self):
+        fork = self.fork(self.source)
+        self.client.patch(f'/api/sets/{fork.id}/cards/{self.cards[0].id}/', {'translation': 'моё'}, format='json')
+        fork.is_public = True
+        fork.save()
+
+        self.client.force_authenticate(self.author)
+        second = self.fork(fork)
+        self.assertEqual(second.forked_from_id, self.source.id)
+        self.assertEqual(self.translations(second), ['банан', 'моё', 'спасибо'])
+
+
+class AudioTests(TestCase):
+    """Аудио произношения: хранение по хэшу содержимого и отдача с поддержкой Range"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('speaker', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='Набор', user=cls.user)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = bytes(range(256)) * 4
+
+    def upload(self, name='word.mp3'):
+        response = self.client.post('/api/audio/', {'file': SimpleUploadedFile(name, self.content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.upload('a.mp3'), self.upload('b.mp3')
+        self.assertEqual(first, second)
+        self.assertEqual(first['audio'], f'{hashlib.sha256(self.content).hexdigest()}.mp3')
+        directory = os.path.join(settings.MEDIA_ROOT, 'flashcard_audio', first['audio'][:2])
+        self.assertEqual(os.listdir(directory), [first['audio']])
+
+        response = self.client.post(f'/api/flashcard/bulk/?flashcard_set_id={self.flashcard_set.id}', [
+            {'word': '苹果', 'translation': 'яблоко', 'audio': first['audio']},
+            {'word': '香蕉', 'translation': 'банан', 'audio': '0' * 64},
+        ], format='json')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(self.flashcard_set.flashcards.get().audio_pronunciation.name,
+                         f'flashcard_audio/{first["audio"][:2]}/{first["audio"]}')
+
+    def test_concurrent_saves_share_one_file(self):
+        # exists() отвечает "нет" всем потокам сразу - как при гонке двух загрузок
+        with mock.patch.object(audio.ContentAddressedStorage, 'exists', return_value=False):
+            names = []
+            errors = run_concurrently(lambda index: names.append(audio.store_audio(self.content)), 8)
+
+        self.assertEqual(errors, [])
+        expected = audio.audio_name(hashlib.sha256(self.content).hexdigest(), 'mp3')
+        self.assertEqual(set(names), {expected})
+        directory = os.path.join(settings.MEDIA_ROOT, os.path.dirname(expected))
+        self.assertEqual(os.listdir(directory), [os.path.basename(expected)])
+        with open(os.path.join(settings.MEDIA_ROOT, expected), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_range_requests(self):
+        url = self.upload()['url']
+        size = len(self.content)
+
+        response, body = self.get(url)
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual((response['Accept-Ranges'], response['Content-Type']), ('bytes', 'audio/mpeg'))
+        self.assertIn('immutable', response['Cache-Control'])
+
+        for header, start, end in (('bytes=10-19', 10, 19), ('bytes=1000-', 1000, size - 1),
+                                   ('bytes=-5', size - 5, size - 1), ('bytes=0-99999', 0, size - 1)):
+            response, body = self.get(url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.content[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}', header)
+            self.assertEqual(response['Content-Length'], str(end - start + 1), header)
+
+        response, _ = self.get(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+        response, _ = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url.replace('.mp3', '.wav')).status_code, 404)
+
+    def test_parse_range(self):
+        self.assertIsNone(audio.parse_range(None, 100))
+        self.assertIsNone(audio.parse_range('items=0-1', 100))
+        self.assertIsNone(audio.parse_range('bytes=a-b', 100))
+        self.assertEqual(audio.parse_range('bytes=0-9, 20-29', 100), (0, 9))
+        self.assertFalse(audio.parse_range('bytes=-0', 100))
+        self.assertFalse(audio.parse_range('bytes=20-10', 100))
+
+
+class HskTaggingTests(TestCase):
+    """Уровни HSK карточек: при сохранении, при импорте и командой backfill_hsk_levels"""
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_search_index()
+        cls.user = get_user_model().objects.create_user('student', password='x')
+        cls.flashcard_set = FlashcardSet.objects.create(name='HSK', user=cls.user)
+
+    def test_level_from_wordlist_on_save(self):
+        card = Flashcard.objects.create(flashcard_set=self.flashcard_set, word='苹果', translation='яблоко')
+        manual = Flashcard.objects.create(flashcard_set=self.flashcard_set, word='吧', translation='частица', hsk_level=5)
+        unknown = Flashcard.objects.create(flashcard_set=self.flashcard_set, word='香蕉', translation='банан')
+
+        self.assertEqual((card.hsk_level, manual.hsk_level, unknown.hsk_level), (1, 5, None))
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.hsk_level, 5)
+
+    def test_bulk_import_raises_set_level(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/flashcard/bulk/?flashcard_set_id={self.flashcard_set.id}', [
+            {'word': '苹果', 'translation': 'яблоко'},
+            {'word': '吧', 'translation': 'частица'},
+        ], format='json')
+
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            dict(self.flashcard_set.flashcards.values_list('word', 'hsk_level')), {'苹果': 1, '吧': 2}
+        )
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.hsk_level, 2)
+
+    def test_backfill_command(self):
+        cards = [
+            Flashcard.objects.create(flashcard_set=self.flashcard_set, word=word, translation='-')
+            for word in ('苹果', '吧', '香蕉')
+        ]
+        # Карточки, созданные до появления уровней
+        Flashcard.objects.update(hsk_level=None)
+        Flashcard.objects.filter(word='苹果').update(hsk_level=4)
+        FlashcardSet.objects.update(hsk_level=None)
+        last_change = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first()
+
+        out = StringIO()
+        call_command('backfill_hsk_levels', '--dry-run', stdout=out)
+        # 苹果 без уровня HSK 3.0 тоже проверяется, ручной уровень HSK 2.0 при этом сохраняется
+        self.assertIn('Карточек с найденным уровнем: 2', out.getvalue())
+        self.assertFalse(Flashcard.objects.filter(word='吧', hsk_level__isnull=False).exists())
+
+        call_command('backfill_hsk_levels', stdout=StringIO())
+        self.assertEqual(
+            dict(Flashcard.objects.values_list('word', 'hsk_level')), {'苹果': 4, '吧': 2, '香蕉': None}
+        )
+        self.flashcard_set.refresh_from_db()
+        self.assertEqual(self.flashcard_set.hsk_level, 4)
+        # Клиенты синхронизации получают проверенные карточки
+        self.assertEqual(
+            set(ChangeLog.objects.filter(id__gt=last_change).values_list('object_id', flat=True)),
+            {cards[0].id, cards[1].id},
+        )
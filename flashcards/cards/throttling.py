@@ -0,0 +1,125 @@
+"""
+Ограничение частоты запросов: token bucket на пользователя и группу эндпоинтов (scope).
+
+Ведро хранится в общем кэше одним целым числом - теоретическим временем прихода
+следующего запроса (GCRA, эквивалент token bucket). Запрос сдвигает его атомарным
+cache.incr на интервал между токенами; если значение ушло дальше, чем на ёмкость ведра,
+запрос отклоняется, а сдвиг откатывается. После простоя отсчёт надо начать с текущего
+момента: вместо перезаписи значения создаётся следующая версия ключа через cache.add,
+которая удаётся ровно одному запросу, остальные продолжают с новой версией.
+Две операции с кэшем на запрос (номер версии и incr), без блокировок и чтения-записи.
+Для нескольких процессов нужен общий кэш (CACHE_BACKEND - Redis или Memcached),
+LocMemCache ограничивает каждый процесс отдельно.
+
+Лимиты задаются как в DRF: REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {'translation': '30/min'}.
+'30/min' - ведро на 30 запросов, которое пополняется на 30 токенов в минуту.
+Scope без лимита (или с None) не ограничивается.
+"""
+import math
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+MICROSECONDS = 1_000_000
+# Ключ неактивного пользователя живёт сутки; ведро к этому времени давно полное
+KEY_TIMEOUT = 24 * 60 * 60
+
+
+def parse_rate(rate):
+    """'30/min' -> (ёмкость, интервал между токенами в мкс); None - без ограничения"""
+    if rate is None:
+        return None
+    try:
+        num, period = rate.split('/')
+        capacity = int(num)
+        seconds = PERIODS[period.strip()[0]]
+    except (ValueError, KeyError, IndexError):
+        raise ImproperlyConfigured(f"Некорректный лимит запросов: {rate!r}")
+    return capacity, seconds * MICROSECONDS // capacity
+
+
+def get_rate(scope):
+    return parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+
+
+def consume(key, capacity, interval, now=None):
+    """
+    Забирает токен из ведра key. Возвращает 0, если запрос разрешён,
+    иначе - через сколько секунд появится токен.
+    """
+    now = int((time.time() if now is None else now) * MICROSECONDS)
+    version_key = f'{key}:version'
+    version = cache.get(version_key, 0)
+    while True:
+        bucket = f'{key}:{version}'
+        try:
+            arrival = cache.incr(bucket, interval)
+        except ValueError:
+            # Первого запроса ещё не было или ключ истёк - ведро полное
+            if cache.add(bucket, now + interval, timeout=KEY_TIMEOUT):
+                return 0
+            arrival = cache.incr(bucket, interval)
+        if arrival - interval >= now:
+            break
+        # Запросов давно не было: ведро полное, сдвиг отсчитывается от текущего момента.
+        # Следующую версию создаёт один запрос, остальные тратят токены уже из неё
+        version += 1
+        if cache.add(f'{key}:{version}', now + interval, timeout=KEY_TIMEOUT):
+            cache.set(version_key, version, timeout=KEY_TIMEOUT)
+            return 0
+
+    if arrival - now <= capacity * interval:
+        return 0
+
+    # Отклонённый запрос токен не тратит
+    cache.decr(bucket, interval)
+    return (arrival - capacity * interval - now) / MICROSECONDS
+
+
+def bucket_key(scope, ident):
+    return f'flashcards:throttle:{scope}:{ident}'
+
+
+def check(scope, ident):
+    """0 - запрос разрешён, иначе секунды до следующего токена (и для представлений вне DRF)"""
+    rate = get_rate(scope)
+    if rate is None:
+        return 0
+    return consume(bucket_key(scope, ident), *rate)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Scope берётся из throttle_scope представления ('user' по умолчанию,
+    'anon' для неавторизованных). Retry-After выставляет DRF по wait().
+    """
+    default_scope = 'user'
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_scope(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return 'anon'
+        return getattr(view, 'throttle_scope', self.default_scope)
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.retry_after = check(self.get_scope(request, view), self.get_ident_key(request))
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+def retry_after_header(wait):
+    """Значение заголовка Retry-After (целые секунды, не меньше 1)"""
+    return str(max(1, math.ceil(wait)))
@@ -0,0 +1,263 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .metrics import track_http
+from .models import CachedTranslation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSLATION_URL = 'https://ftapi.pythonanywhere.com/translate'
+
+# Минимальные необходимые headers
+TRANSLATION_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+}
+
+DEFAULT_SOURCE_LANGUAGE = 'zh-cn'
+
+# Общая сессия с пулом keep-alive соединений вместо нового соединения на каждый запрос
+session = requests.Session()
+session.headers.update(TRANSLATION_HEADERS)
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+
+def get_translation_url():
+    """Адрес сервиса перевода (в тестах - локальный stub-сервер)"""
+    return getattr(settings, 'TRANSLATION_URL', DEFAULT_TRANSLATION_URL)
+
+
+def extract_translation(data):
+    """Основной перевод из ответа ftapi"""
+    if not data:
+        return None
+    translation = data.get('destination-text')
+    if not translation:
+        possible = (data.get('translations') or {}).get('possible-translations') or []
+        translation = possible[0] if possible else None
+    return translation
+
+
+def fetch_translation(word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+    """Запрос перевода у ftapi, None при ошибке"""
+    params = {
+        'sl': source_language_code,
+        'dl': destination_language_code,
+        'text': word
+    }
+
+    try:
+        with track_http():
+            response = session.get(get_translation_url(), params=params, timeout=10)
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return None
+
+    except Exception as e:
+        logger.warning('Translation request failed for %r: %s', word, e)
+        return None
+
+
+class TranslationCache:
+    """
+    Двухуровневый кэш переводов по ключу (слово, исходный язык, язык перевода):
+    LRU в памяти процесса -> таблица CachedTranslation (TTL + ограничение размера) -> ftapi.
+    Записи в памяти живут не дольше записи в БД: срок считается от получения перевода.
+    """
+
+    def __init__(self, max_memory_entries=2048, ttl=timedelta(days=30), max_db_entries=100000,
+                 prune_every=100, fetch=fetch_translation):
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self.prune_every = prune_every
+        self.fetch = fetch
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        data = self.get_cached(word, destination_language_code, source_language_code)
+        if data is not None:
+            return data
+
+        self.record_miss()
+        data = self.fetch(word, destination_language_code, source_language_code)
+        if data is not None:
+            self.set(word, destination_language_code, data, source_language_code)
+        return data
+
+    def get_from_memory(self, word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        """Только первый уровень - без обращений к БД (безопасно вызывать из event loop)"""
+        return self._memory_get((word, source_language_code, destination_language_code))
+
+    def get_cached(self, word, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        """Поиск в памяти и в БД без запроса к сервису перевода"""
+        key = (word, source_language_code, destination_language_code)
+
+        data = self._memory_get(key)
+        if data is not None:
+            return data
+
+        entry = self._db_get(key)
+        if entry is None:
+            return None
+        self._memory_set(key, entry.data, entry.created_at)
+        return entry.data
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def set(self, word, destination_language_code, data, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        key = (word, source_language_code, destination_language_code)
+        self._memory_set(key, data)
+        now = timezone.now()
+        try:
+            CachedTranslation.objects.update_or_create(
+                word=word,
+                source_language=source_language_code,
+                target_language=destination_language_code,
+                defaults={'data': data, 'created_at': now, 'last_used': now},
+            )
+        except IntegrityError:
+            # Параллельный запрос уже сохранил этот перевод
+            pass
+        except DatabaseError as e:
+            # Кэш - не критичная часть: при блокировке БД остаётся только уровень в памяти
+            logger.warning('Translation cache write error: %s', e)
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % self.prune_every == 0
+        if should_prune:
+            self.prune()
+
+    def warm(self, words, destination_language_code, source_language_code=DEFAULT_SOURCE_LANGUAGE):
+        """Прогрев кэша списком слов, возвращает количество слов, запрошенных у сервиса"""
+        words = list(dict.fromkeys(word.strip() for word in words if word and word.strip()))
+        fresh_after = timezone.now() - self.ttl
+        cached = CachedTranslation.objects.filter(
+            word__in=words,
+            source_language=source_language_code,
+            target_language=destination_language_code,
+            created_at__gte=fresh_after,
+        ).values_list('word', 'data', 'created_at')
+
+        cached_words = set()
+        for word, data, created_at in cached.iterator(chunk_size=1000):
+            self._memory_set((word, source_language_code, destination_language_code), data, created_at)
+            cached_words.add(word)
+
+        fetched = 0
+        for word in words:
+            if word not in cached_words:
+                self.get(word, destination_language_code, source_language_code)
+                fetched += 1
+        return fetched
+
+    def prune(self):
+        """Удаляет устаревшие записи и самые давно использованные сверх лимита"""
+        CachedTranslation.objects.filter(created_at__lt=timezone.now() - self.ttl).delete()
+        stale_ids = CachedTranslation.objects.order_by('-last_used').values_list('id', flat=True)[self.max_db_entries:]
+        CachedTranslation.objects.filter(id__in=list(stale_ids)).delete()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.db_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+            }
+
+    def _memory_get(self, key):
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+    def _memory_set(self, key, data, created_at=None):
+        """created_at - время получения перевода (для записей из БД), иначе - сейчас"""
+        lifetime = self.ttl.total_seconds()
+        if created_at is not None:
+            lifetime -= (timezone.now() - created_at).total_seconds()
+        with self._lock:
+            self._memory[key] = (time.monotonic() + lifetime, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _db_get(self, key):
+        word, source_language_code, destination_language_code = key
+        try:
+            entry = CachedTranslation.objects.filter(
+                word=word,
+                source_language=source_language_code,
+                target_language=destination_language_code,
+            ).only('id', 'data', 'created_at', 'last_used').first()
+        except DatabaseError as e:
+            logger.warning('Translation cache read error: %s', e)
+            return None
+
+        now = timezone.now()
+        if entry is None or entry.created_at < now - self.ttl:
+            return None
+
+        # Отмечаем использование не чаще раза в сутки, чтобы не писать в БД на каждое чтение
+        if entry.last_used < now - timedelta(days=1):
+            try:
+                CachedTranslation.objects.filter(pk=entry.pk).update(last_used=now)
+            except DatabaseError:
+                pass
+
+        with self._lock:
+            self.db_hits += 1
+        return entry
+
+
+def _build_translation_cache():
+    options = getattr(settings, 'TRANSLATION_CACHE', {})
+    return TranslationCache(
+        max_memory_entries=options.get('MAX_MEMORY_ENTRIES', 2048),
+        ttl=timedelta(seconds=options.get('TTL', 30 * 24 * 60 * 60)),
+        max_db_entries=options.get('MAX_DB_ENTRIES', 100000),
+    )
+
+
+translation_cache = _build_translation_cache()
@@ -0,0 +1,101 @@
+"""Локальный stub-сервер, имитирующий ftapi, для тестов и нагрузочных замеров"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .pinyin_engine import get_pinyin
+
+
+class StubTranslationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip('/') != '/translate':
+            self.send_json(404, {'error': 'not found'})
+            return
+
+        query = parse_qs(parsed.query)
+        text = query.get('text', [''])[0]
+        source_language = query.get('sl', ['zh-cn'])[0]
+        destination_language = query.get('dl', ['ru'])[0]
+
+        with self.server.lock:
+            self.server.requests_count += 1
+            self.server.words.append(text)
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        if self.server.status_code != 200:
+            self.send_json(self.server.status_code, {'error': 'stub error'})
+            return
+
+        translation = self.server.translations.get(text, f'{text}-{destination_language}')
+        self.send_json(200, {
+            'source-language': source_language,
+            'source-text': text,
+            'destination-language': destination_language,
+            'destination-text': translation,
+            'pronunciation': {'source-text-phonetic': get_pinyin(text)},
+            'translations': {'possible-translations': [translation]},
+            'definitions': None,
+        })
+
+    def send_json(self, status_code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TranslationStubServer(ThreadingHTTPServer):
+    """
+    Использование в тестах:
+
+        with TranslationStubServer(delay=0.05) as stub:
+            with override_settings(TRANSLATION_URL=stub.url):
+                ...
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, status_code=200, translations=None, verbose=False):
+        super().__init__((host, port), StubTranslationHandler)
+        self.delay = delay
+        self.status_code = status_code
+        self.translations = translations or {}
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests_count = 0
+        self.words = []
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/translate'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
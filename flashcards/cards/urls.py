@@ -1,11 +1,29 @@
 from django.urls import path, re_path, include
 from .views import *
 urlpatterns = [
+    path('auth/token/signed/', SignedTokenView.as_view()),
     re_path(r'^auth/', include('djoser.urls')),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
     path('api/sets/create/', create_flashcard_set, name='create-set'),
     # path("test/", test)
     path("api/flashcard/create/", FlashcardCreateView.as_view()),
     path("api/flashcard/create/2/", CreateFlashcardAPIView.as_view()),
-    path("api/sets/get/", UserFlashcardSetsView.as_view())
+    path("api/flashcard/create/async/", create_flashcard_async),
+    path("api/flashcard/<int:card_id>/enrichment/", FlashcardEnrichmentView.as_view()),
+    path("api/flashcard/create/batch/", BatchCreateFlashcardsView.as_view()),
+    path("api/flashcard/bulk/", BulkFlashcardImportView.as_view()),
+    path("api/sets/get/", UserFlashcardSetsView.as_view()),
+    path("api/sets/<int:set_id>/cards/", SetFlashcardsView.as_view()),
+    path("api/sets/<int:set_id>/export/", SetExportView.as_view()),
+    path("api/sets/<int:set_id>/fork/", ForkFlashcardSetView.as_view()),
+    path("api/sets/<int:set_id>/quiz/", SetQuizView.as_view()),
+    path("api/sets/<int:set_id>/cards/<int:card_id>/", SetFlashcardUpdateView.as_view()),
+    path("api/sync/", SyncView.as_view()),
+    path("api/review/next/", ReviewNextView.as_view()),
+    path("api/review/submit/", ReviewSubmitView.as_view()),
+    path("api/analytics/progress/", StudyProgressView.as_view()),
+    path("api/search/", SearchFlashcardsView.as_view()),
+    path("api/catalog/", CatalogView.as_view()),
+    path("api/audio/", AudioUploadView.as_view()),
+    re_path(r'^api/audio/(?P<digest>[0-9a-f]{64})\.(?P<extension>[a-z0-9]+)$', serve_audio, name='audio'),
 ]
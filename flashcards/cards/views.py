@@ -1,14 +1,53 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, generics
+from rest_framework.parsers import JSONParser, MultiPartParser
 from django.shortcuts import get_object_or_404
-from .models import FlashcardSet, Category, Flashcard
+from django.db import transaction, connections
+from django.http import StreamingHttpResponse, HttpResponse, Http404
+from django.db.models import Max, Q
+from django.utils.http import quote_etag, parse_etags
+import hashlib
+from .pagination import FlashcardCursorPagination, CatalogCursorPagination
+from .scheduler import submit_reviews
+from . import search
+from .cache import get_user_version, bump_user_version, user_sets_key, SETS_CACHE_TIMEOUT
+from django.core.cache import cache
+from . import exporters
+from . import audio
+from . import hsk
+from . import enrichment
+from . import throttling
+from . import sync
+from . import analytics
+from . import quiz
+from rest_framework.negotiation import DefaultContentNegotiation
+from django.utils.http import content_disposition_header
+import tempfile
+import os
+import time
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+from .models import FlashcardSet, Category, Flashcard, ReviewSchedule, CatalogFacet, ChangeLog
 from .serializers import *
+from .parsers import CSVParser, TSVParser, parse_upload
+from .translation import translation_cache, extract_translation
+from .pinyin_engine import get_pinyin
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+import json
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from . import authentication
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.views import APIView
-from pypinyin import pinyin, Style
-import requests
+from rest_framework.authtoken.models import Token
+from asgiref.sync import sync_to_async
+from .async_translation import get_translation_client
 
 User = get_user_model()
 
@@ -19,6 +58,25 @@ def test(request):
     return Response({"ok": "ok"})
 
 
+class SignedTokenView(APIView):
+    """
+    Выдаёт подписанный токен: проверяется без обращения к БД и кэшу,
+    но не отзывается при выходе - действует SIGNED_TOKEN_MAX_AGE секунд.
+    Выдаётся только по токену из БД: иначе подписанный токен можно было бы продлевать бесконечно.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not authentication.get_option('SIGNED_TOKENS'):
+            return Response({'error': 'Подписанные токены отключены'}, status=status.HTTP_404_NOT_FOUND)
+        if not isinstance(request.auth, Token):
+            return Response({'error': 'Нужна аутентификация по токену'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            'auth_token': authentication.sign_token(request.user),
+            'expires_in': authentication.get_option('SIGNED_TOKEN_MAX_AGE'),
+        })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_flashcard_set(request):
@@ -66,91 +124,831 @@ def create_flashcard_set(request):
 
 
 class CreateFlashcardAPIView(APIView):
-    def get_translation(self, word, destination_language_code):
-        url = f'https://ftapi.pythonanywhere.com/translate'
-
-        # Минимальные необходимые headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-        }
-
-        params = {
-            'sl': "zh-cn",
-            'dl': destination_language_code,
-            'text': word
-        }
-
-        try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            # print(f"Status: {response.status_code}")
-            # print(f"Response: {response.text[:200]}...")
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return None
-
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
+    """
+    Карточка создаётся сразу. Если перевода нет ни в запросе, ни в кэше,
+    она получает статус pending и задачу в очереди (cards/enrichment.py),
+    а ответ 202 содержит адрес для опроса статуса.
+    """
+    permission_classes = [IsAuthenticated]
+    # Каждая карточка - запрос к сервису перевода: отдельное ведро лимитов
+    throttle_scope = 'translation'
 
     def post(self, request):
         serializer = WordSerializer(data=request.data)
-        if serializer.is_valid():
-            validated_data = serializer.validated_data
-
-            print("Validated data:", validated_data)
-            print("Flashcard set object:", validated_data.get("flashcard_set"))
-            print("Flashcard set ID:",
-                  validated_data.get("flashcard_set").id if validated_data.get("flashcard_set") else None)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        validated_data = serializer.validated_data
+        if validated_data["flashcard_set"].user_id != request.user.id:
+            return Response({'error': 'Набор карточек не найден'}, status=status.HTTP_404_NOT_FOUND)
 
-            translation_data = self.get_translation(validated_data["word"], validated_data["dl"])
-
-            translation = validated_data["translation"] or translation_data["translations"]["possible-translations"]
-            pinyin = translation_data["pronunciation"]["source-text-phonetic"]
+        translation = validated_data["translation"]
+        definition = validated_data["definition"] or ''
+        if enrichment.needs_enrichment(translation, definition):
+            # Только кэш (память процесса -> БД): сервис перевода в запросе не вызывается
+            cached = translation_cache.get_cached(validated_data["word"], validated_data["dl"])
+            translation = translation or extract_translation(cached)
+            definition = definition or enrichment.extract_definition(cached) or ''
+        pending = not translation
 
+        with transaction.atomic():
             card = Flashcard.objects.create(
                 word=validated_data["word"],
-                translation=translation,
-                pinyin=pinyin,
-                definition=validated_data["definition"],
-                example_sentence=validated_data["example_sentence"],
+                translation=translation or '',
+                # Пиньинь генерируется локально, без обращения к сервису перевода
+                pinyin=get_pinyin(validated_data["word"]),
+                definition=definition,
+                example_sentence=validated_data["example_sentence"] or '',
                 hsk_level=validated_data["hsk_level"],
-                flashcard_set=validated_data["flashcard_set"]  # Используем объект из validated_data
+                flashcard_set=validated_data["flashcard_set"],
+                enrichment_status=Flashcard.ENRICHMENT_PENDING if pending else Flashcard.ENRICHMENT_DONE,
             )
+            if pending:
+                enrichment.enqueue(card, validated_data["dl"])
+
+        data = {
+            "id": card.id,
+            "word": card.word,
+            "pinyin": card.pinyin,
+            "translation": card.translation,
+            "definition": card.definition,
+            "example_sentence": card.example_sentence,
+            "enrichment_status": card.enrichment_status,
+            "flashcard_set_id": card.flashcard_set_id
+        }
+        if not pending:
+            return Response(data)
+
+        status_url = f'/api/flashcard/{card.id}/enrichment/'
+        data["status_url"] = status_url
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
+
+
+class FlashcardEnrichmentView(APIView):
+    """
+    Статус фонового заполнения карточки.
+    ?wait=N - long-poll: ответ приходит, как только карточка заполнена, но не позже N секунд.
+    """
+    permission_classes = [IsAuthenticated]
+    max_wait = 30
+    poll_interval = 0.5
+
+    def get(self, request, card_id):
+        try:
+            wait = min(max(float(request.query_params.get('wait', 0)), 0), self.max_wait)
+        except ValueError:
+            return Response({'error': 'Некорректный параметр wait'}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
-                "id": card.id,
-                "word": card.word,
-                "pinyin": card.pinyin,
-                "translation": card.translation,
-                "definition": card.definition,
-                "example_sentence": card.example_sentence,
-                "flashcard_set_id": card.flashcard_set.id
-            })
+        queryset = Flashcard.objects.filter(pk=card_id, flashcard_set__user=request.user).only(
+            *FlashcardEnrichmentSerializer.Meta.fields
+        )
+        deadline = time.monotonic() + wait
+        while True:
+            card = queryset.first()
+            if card is None:
+                return Response({'error': 'Карточка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+            if card.enrichment_status != Flashcard.ENRICHMENT_PENDING or time.monotonic() >= deadline:
+                break
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+
+        return Response(FlashcardEnrichmentSerializer(card).data)
 
-        print("Serializer errors:", serializer.errors)
-        return Response({"error": serializer.errors})
 
 class UserFlashcardSetsView(generics.ListAPIView):
     serializer_class = UserFlashcardSetSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Простая версия без аннотации
+        # Только поля, которые попадают в ответ
         return FlashcardSet.objects.filter(
             user=self.request.user
-        ).order_by('-creation_date')
+        ).only('id', 'name', 'creation_date', 'total_cards').order_by('-creation_date')
+
+    def list(self, request, *args, **kwargs):
+        # Ответ кэшируется по версии данных пользователя; ETag - та же версия,
+        # поэтому неизменённый список отдаётся как 304 без запросов к БД и сериализации
+        version = get_user_version(request.user.id)
+        etag = quote_etag(f'sets-{request.user.id}-{version}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache_key = user_sets_key(request.user.id, version)
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.get_serializer(self.get_queryset(), many=True).data
+            cache.set(cache_key, data, SETS_CACHE_TIMEOUT)
+
+        return Response(data, headers={'ETag': etag})
 
 
 class FlashcardCreateView(generics.CreateAPIView):
     queryset = Flashcard.objects.all()
     serializer_class = FlashcardSerializer
+
+
+class BulkFlashcardImportView(APIView):
+    """
+    Массовый импорт карточек (JSON-массив, CSV или Anki TSV).
+    Карточки создаются через bulk_create одной транзакцией,
+    статистика пересчитывается один раз на каждый затронутый набор.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser, TSVParser, MultiPartParser]
+    batch_size = 500
+    max_rows = 10000
+
+    def get_rows(self, request):
+        """Возвращает список строк и набор по умолчанию"""
+        data = request.data
+        default_set_id = request.query_params.get('flashcard_set_id')
+
+        if 'file' in request.FILES:
+            default_set_id = request.data.get('flashcard_set_id', default_set_id)
+            data = parse_upload(request.FILES['file'])
+
+        if isinstance(data, dict):
+            default_set_id = data.get('flashcard_set_id', default_set_id)
+            data = data.get('cards', [])
+
+        return data, default_set_id
+
+    def post(self, request):
+        rows, default_set_id = self.get_rows(request)
+
+        if not isinstance(rows, list):
+            return Response({'error': 'Ожидается список карточек'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_rows:
+            return Response(
+                {'error': f'Слишком много карточек (максимум {self.max_rows})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Загружаем все наборы пользователя, упомянутые в импорте, одним запросом
+        set_ids = {row.get('flashcard_set_id', default_set_id) for row in rows if isinstance(row, dict)}
+        set_ids = {int(set_id) for set_id in set_ids if str(set_id).isdigit()}
+        flashcard_sets = FlashcardSet.objects.filter(user=request.user, id__in=set_ids).in_bulk()
+
+        cards = []
+        errors = []
+        for index, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                errors.append({'row': index, 'errors': {'non_field_errors': ['Неверный формат строки']}})
+                continue
+
+            row = dict(row)
+            if default_set_id is not None:
+                row.setdefault('flashcard_set_id', default_set_id)
+
+            serializer = FlashcardBulkRowSerializer(
+                data=row,
+                context={'request': request, 'flashcard_sets': flashcard_sets}
+            )
+            if serializer.is_valid():
+                cards.append(hsk.tag_card(Flashcard(**serializer.validated_data)))
+            else:
+                errors.append({'row': index, 'errors': serializer.errors})
+
+        with transaction.atomic():
+            Flashcard.objects.bulk_create(cards, batch_size=self.batch_size)
+            ReviewSchedule.create_for_cards(cards)
+            search.index_cards(cards, created=True)
+            ChangeLog.record_cards(cards, user_id=request.user.id)
+
+            # Одна дельта статистики на каждый затронутый набор (и его форки)
+            for set_id in {card.flashcard_set_id for card in cards}:
+                set_cards = [card for card in cards if card.flashcard_set_id == set_id]
+                FlashcardSet.apply_stats_delta(
+                    set_id, total=len(set_cards), mastered=sum(card.mastered for card in set_cards)
+                )
+                FlashcardSet.raise_hsk_level(set_id, max((card.hsk_level or 0 for card in set_cards), default=0) or None)
+            if cards:
+                bump_user_version(request.user.id)
+
+        response_status = status.HTTP_201_CREATED if cards or not errors else status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': len(cards),
+            'failed': len(errors),
+            'errors': errors,
+        }, status=response_status)
+
+
+async def authenticate_token(request):
+    """Аутентификация по токену для асинхронных (не DRF) представлений"""
+    try:
+        result = await sync_to_async(authentication.CachedTokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+@csrf_exempt
+@require_POST
+async def create_flashcard_async(request):
+    """
+    Асинхронное создание карточки (ASGI, flashcards/asgi.py).
+    Пока ждём ответ сервиса перевода, воркер обслуживает другие запросы;
+    одновременные запросы одного слова объединяются в один запрос к сервису.
+    """
+    user = await authenticate_token(request)
+    if user is None:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+
+    wait = await sync_to_async(throttling.check)('translation', f'user:{user.pk}')
+    if wait:
+        response = JsonResponse({'error': 'Слишком много запросов'}, status=429)
+        response['Retry-After'] = throttling.retry_after_header(wait)
+        return response
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+
+    serializer = WordSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse({'error': serializer.errors}, status=400)
+    validated_data = serializer.validated_data
+
+    flashcard_set = validated_data['flashcard_set']
+    if flashcard_set.user_id != user.id:
+        return JsonResponse({'error': 'Набор карточек не найден'}, status=404)
+
+    translation = validated_data['translation']
+    if not translation:
+        translation_data = await get_translation_client().get(validated_data['word'], validated_data['dl'])
+        translation = extract_translation(translation_data)
+        if not translation:
+            return JsonResponse({'error': 'Сервис перевода недоступен'}, status=503)
+
+    card = await Flashcard.objects.acreate(
+        word=validated_data['word'],
+        translation=translation,
+        pinyin=get_pinyin(validated_data['word']),
+        definition=validated_data['definition'] or '',
+        example_sentence=validated_data['example_sentence'] or '',
+        hsk_level=validated_data['hsk_level'],
+        flashcard_set=flashcard_set
+    )
+
+    return JsonResponse({
+        'id': card.id,
+        'word': card.word,
+        'pinyin': card.pinyin,
+        'translation': card.translation,
+        'definition': card.definition,
+        'example_sentence': card.example_sentence,
+        'flashcard_set_id': card.flashcard_set_id
+    }, status=201)
+
+
+class BatchCreateFlashcardsView(APIView):
+    """
+    Создание карточек из списка слов.
+    Слова дедуплицируются, переводы запрашиваются параллельно в ограниченном пуле потоков,
+    результат по каждому слову отдаётся построчно (NDJSON) по мере готовности,
+    все карточки создаются одной транзакцией.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'translation_batch'
+    max_words = 500
+    max_workers = 8
+
+    def post(self, request):
+        words = request.data.get('words')
+        destination_language_code = request.data.get('dl', 'ru')
+
+        if isinstance(words, str):
+            words = words.split()
+        if not isinstance(words, list) or not words:
+            return Response({'error': 'Список слов обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+
+        set_id = request.data.get('flashcard_set_id')
+        flashcard_set = None
+        if str(set_id).isdigit():
+            flashcard_set = FlashcardSet.objects.filter(id=set_id, user=request.user).first()
+        if flashcard_set is None:
+            return Response({'error': 'Набор карточек не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Дедупликация с сохранением порядка
+        words = list(dict.fromkeys(str(word).strip() for word in words if str(word).strip()))
+        if len(words) > self.max_words:
+            return Response(
+                {'error': f'Слишком много слов (максимум {self.max_words})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            self.stream_results(flashcard_set, words, destination_language_code),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream_results(self, flashcard_set, words, destination_language_code):
+        existing = set(flashcard_set.flashcards.filter(word__in=words).values_list('word', flat=True))
+        word_validator = FlashcardSerializer()
+
+        pending = []
+        for word in words:
+            if word in existing:
+                yield self.line({'word': word, 'status': 'exists'})
+                continue
+            try:
+                word_validator.validate_word(word)
+            except ValidationError as e:
+                yield self.line({'word': word, 'status': 'invalid', 'error': e.detail})
+                continue
+            pending.append(word)
+
+        cards = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                # copy_context: тело ответа формируется с активными метриками запроса (MeasuredStream),
+                # поэтому HTTP-запросы потоков учитываются в них. SQL потоков идёт через их собственные
+                # соединения и в метрики запроса не попадает
+                executor.submit(contextvars.copy_context().run, self.resolve, word, destination_language_code): word
+                for word in pending
+            }
+            for future in as_completed(futures):
+                word = futures[future]
+                translation = future.result()
+                if not translation:
+                    yield self.line({'word': word, 'status': 'failed', 'error': 'Перевод не найден'})
+                    continue
+
+                cards.append(hsk.tag_card(Flashcard(
+                    word=word,
+                    translation=translation,
+                    pinyin=get_pinyin(word),
+                    flashcard_set=flashcard_set
+                )))
+                yield self.line({'word': word, 'status': 'translated', 'translation': translation})
+
+        with transaction.atomic():
+            Flashcard.objects.bulk_create(cards)
+            ReviewSchedule.create_for_cards(cards)
+            search.index_cards(cards, created=True)
+            ChangeLog.record_cards(cards)
+            FlashcardSet.apply_stats_delta(flashcard_set.id, total=len(cards))
+            FlashcardSet.raise_hsk_level(flashcard_set.id, max((card.hsk_level or 0 for card in cards), default=0) or None)
+        bump_user_version(flashcard_set.user_id)
+
+        yield self.line({
+            'status': 'done',
+            'created': len(cards),
+            'ids': [card.id for card in cards],
+            'flashcard_set_id': flashcard_set.id
+        })
+
+    def resolve(self, word, destination_language_code):
+        try:
+            return extract_translation(translation_cache.get(word, destination_language_code))
+        finally:
+            # Соединения с БД, открытые в потоке пула, не должны оставаться висеть
+            connections.close_all()
+
+    @staticmethod
+    def line(payload):
+        return json.dumps(payload, ensure_ascii=False) + '\n'
+
+
+class SetFlashcardsView(generics.ListAPIView):
+    """
+    Карточки набора: keyset-пагинация, ``?fields=`` и условный GET по ETag.
+    ETag строится из последнего изменения карточек и счётчика набора,
+    поэтому неизменённая страница отдаётся как 304 без выборки карточек.
+    """
+    serializer_class = FlashcardListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FlashcardCursorPagination
+
+    # Поля модели, которые нужны для каждого поля ответа (для .only())
+    model_fields = {
+        'flashcard_set': 'flashcard_set',
+        'flashcard_set_name': 'flashcard_set__name',
+    }
+
+    def get_flashcard_set(self):
+        if not hasattr(self, '_flashcard_set'):
+            self._flashcard_set = get_object_or_404(
+                FlashcardSet.objects.filter(Q(user=self.request.user) | Q(is_public=True)),
+                pk=self.kwargs['set_id']
+            )
+        return self._flashcard_set
+
+    def get_queryset(self):
+        # Для форка - свои карточки и общие карточки исходного набора
+        queryset = self.get_flashcard_set().card_queryset().select_related('flashcard_set')
+
+        requested = DynamicFieldsMixin.get_requested_fields(self.request)
+        if requested:
+            # Не загружаем тексты, которые не попадут в ответ
+            only = {'id', 'created_date', 'flashcard_set'}
+            model_field_names = {field.name for field in Flashcard._meta.concrete_fields}
+            for field_name in requested:
+                field_name = self.model_fields.get(field_name, field_name)
+                if field_name.split('__')[0] in model_field_names:
+                    only.add(field_name)
+            queryset = queryset.only(*only)
+        return queryset
+
+    def get_etag(self):
+        flashcard_set = self.get_flashcard_set()
+        last_modified = flashcard_set.card_queryset().aggregate(last=Max('last_modified'))['last']
+        state = '|'.join(str(value) for value in (
+            flashcard_set.id,
+            flashcard_set.name,
+            flashcard_set.total_cards,
+            last_modified,
+            self.request.get_full_path(),
+        ))
+        return quote_etag(hashlib.md5(state.encode('utf-8')).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+
+class CatalogView(generics.ListAPIView):
+    """
+    Каталог публичных наборов: ?category=, ?difficulty=, ?hsk= (наборы не выше уровня),
+    ?sort=popular|recent. Каждое сочетание фильтра и сортировки покрыто составным индексом.
+    Фасеты читаются из CatalogFacet, а не считаются GROUP BY по всем наборам.
+    """
+    serializer_class = CatalogSetSerializer
+    permission_classes = [AllowAny]
+    pagination_class = CatalogCursorPagination
+
+    def get_filters(self):
+        params = self.request.query_params
+        filters = {}
+        if params.get('category'):
+            filters['category_id'] = params['category']
+        if params.get('difficulty'):
+            filters['difficulty'] = params['difficulty']
+        if params.get('hsk'):
+            filters['hsk_level__lte'] = params['hsk']
+        for value in (filters.get('category_id'), filters.get('hsk_level__lte')):
+            if value is not None and not str(value).isdigit():
+                raise ValidationError({'error': 'category и hsk должны быть числами'})
+        return filters
+
+    def get_queryset(self):
+        return FlashcardSet.objects.filter(
+            is_public=True, **self.get_filters()
+        ).select_related('user', 'category').only(
+            'id', 'name', 'description', 'category__name', 'difficulty', 'hsk_level',
+            'total_cards', 'popularity', 'creation_date', 'user__username'
+        )
+
+    def get_facets(self):
+        facets = {facet: [] for facet, _ in CatalogFacet.FACET_CHOICES}
+        rows = CatalogFacet.objects.filter(count__gt=0).order_by('facet', 'value')
+        for row in rows:
+            facets[row.facet].append({'value': row.value, 'count': row.count})
+
+        # Названия категорий одним запросом
+        names = Category.objects.in_bulk([int(item['value']) for item in facets['category']])
+        for item in facets['category']:
+            category = names.get(int(item['value']))
+            item['name'] = category.name if category else None
+        return facets
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = self.get_facets()
+        return response
+
+
+class ForkFlashcardSetView(APIView):
+    """
+    Форк своего или публичного набора. Карточки не копируются: форк видит карточки
+    исходного набора, а в форк копируется только отредактированная карточка.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, set_id):
+        source = get_object_or_404(
+            FlashcardSet.objects.filter(Q(user=request.user) | Q(is_public=True)),
+            pk=set_id
+        )
+        fork = source.fork(request.user, name=request.data.get('name'))
+        data = FlashcardSetSerializer(fork).data
+        data['forked_from'] = fork.forked_from_id
+        data['total_cards'] = fork.total_cards
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class SetFlashcardUpdateView(APIView):
+    """Редактирование карточки набора; общая карточка форка сначала копируется в форк"""
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request, set_id, card_id):
+        flashcard_set = get_object_or_404(FlashcardSet, pk=set_id, user=request.user)
+        card = get_object_or_404(flashcard_set.card_queryset().select_related('flashcard_set'), pk=card_id)
+
+        serializer = FlashcardContentSerializer(card, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.instance = flashcard_set.materialize_card(card)
+        card = serializer.save()
+        return Response(FlashcardSerializer(card).data)
+
+
+class SyncView(APIView):
+    """
+    Синхронизация офлайн-клиентов (cards/sync.py).
+    GET ?since=<курсор>&limit=N - изменения после курсора; без since - полный снимок.
+    POST {"changes": [...]} - пачка офлайн-изменений.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response(sync.snapshot(request.user))
+        try:
+            since = int(since)
+            limit = int(request.query_params.get('limit', sync.get_option('PAGE_SIZE')))
+        except ValueError:
+            return Response({'error': 'since и limit должны быть числами'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), sync.get_option('MAX_PAGE_SIZE'))
+        return Response(sync.changes_since(request.user, since, limit))
+
+    def post(self, request):
+        changes = request.data.get('changes') if isinstance(request.data, dict) else None
+        if not isinstance(changes, list):
+            return Response({'error': 'Ожидается список changes'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > sync.get_option('MAX_CHANGES'):
+            return Response(
+                {'error': f"Слишком много изменений (максимум {sync.get_option('MAX_CHANGES')})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': sync.apply_changes(request.user, changes)})
+
+
+class SetQuizView(APIView):
+    """
+    Тест по набору: GET ?n=20&choices=4 - n слов с вариантами перевода.
+    Неправильные варианты - похожие карточки (cards/quiz.py), без ORDER BY RANDOM().
+    """
+    permission_classes = [IsAuthenticated]
+    default_questions = 20
+
+    def get(self, request, set_id):
+        flashcard_set = get_object_or_404(FlashcardSet.objects.filter(Q(user=request.user) | Q(is_public=True)), pk=set_id)
+        try:
+            questions = int(request.query_params.get('n', self.default_questions))
+            choices = int(request.query_params.get('choices', quiz.get_option('CHOICES')))
+        except ValueError:
+            return Response({'error': 'n и choices должны быть числами'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= questions <= quiz.get_option('MAX_QUESTIONS') or not 2 <= choices <= 10:
+            return Response(
+                {'error': f"n - от 1 до {quiz.get_option('MAX_QUESTIONS')}, choices - от 2 до 10"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'questions': quiz.generate_quiz(flashcard_set, questions, choices)})
+
+
+class ReviewNextView(APIView):
+    """Следующие N карточек к повторению (индекс (user, due))"""
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 200
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+        # Отрицательный LIMIT в SQLite снимает ограничение
+        limit = min(max(limit, 1), self.max_limit)
+
+        now = timezone.now()
+        schedules = list(ReviewSchedule.objects.filter(
+            user=request.user,
+            due__lte=now
+        ).select_related('flashcard__flashcard_set').order_by('due')[:max(limit, 0)])
+
+        # Общие карточки форков не получают расписание при форке - они новые, пока их не повторили
+        if len(schedules) < limit and request.user.flashcard_sets.filter(forked_from__isnull=False).exists():
+            new_cards = Flashcard.objects.filter(
+                flashcard_set__forks__user=request.user
+            ).exclude(
+                review_schedules__user=request.user
+            ).exclude(
+                copies__flashcard_set__user=request.user
+            ).select_related('flashcard_set').order_by('created_date', 'id')[:limit - len(schedules)]
+            schedules.extend(ReviewSchedule(user=request.user, flashcard=card, due=now) for card in new_cards)
+
+        return Response(ReviewScheduleSerializer(schedules, many=True).data)
+
+
+class ReviewSubmitView(APIView):
+    """
+    Ответы на карточки: один ответ {card_id, grade, reviewed_at}
+    или пачка офлайн-сессии {"reviews": [...]} - применяется одной транзакцией.
+    """
+    permission_classes = [IsAuthenticated]
+    max_reviews = 1000
+
+    def post(self, request):
+        data = request.data
+        reviews = data.get('reviews') if isinstance(data, dict) and 'reviews' in data else [data]
+
+        serializer = ReviewSerializer(data=reviews, many=True)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        if len(serializer.validated_data) > self.max_reviews:
+            return Response(
+                {'error': f'Слишком много ответов (максимум {self.max_reviews})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = submit_reviews(request.user, serializer.validated_data)
+        return Response({'results': results})
+
+
+class StudyProgressView(APIView):
+    """
+    Статистика занятий по дням из агрегатов (cards/analytics.py).
+    GET ?from=YYYY-MM-DD&to=YYYY-MM-DD&set_id=N; по умолчанию - последние ANALYTICS['DEFAULT_DAYS'] дней.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            date_to = parse_date(params['to']) if params.get('to') else timezone.localdate()
+            date_from = parse_date(params['from']) if params.get('from') else \
+                date_to - timedelta(days=analytics.get_option('DEFAULT_DAYS') - 1)
+            set_id = int(params['set_id']) if params.get('set_id') else None
+        except (ValueError, TypeError):
+            return Response({'error': 'Некорректные параметры from, to или set_id'}, status=status.HTTP_400_BAD_REQUEST)
+        if date_from is None or date_to is None or date_from > date_to:
+            return Response({'error': 'Некорректный период'}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days >= analytics.get_option('MAX_DAYS'):
+            return Response(
+                {'error': f"Период не больше {analytics.get_option('MAX_DAYS')} дней"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(analytics.progress(request.user, date_from, date_to, set_id))
+
+
+class SearchFlashcardsView(APIView):
+    """
+    Поиск по своим карточкам: иероглифы, пиньинь (с тонами и без), перевод, определение.
+    Префиксный поиск с ранжированием BM25: "ni h" находит 你好.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Параметр q обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+        # Отрицательный LIMIT в SQLite снимает ограничение
+        limit = min(max(limit, 1), self.max_limit)
+
+        if search.is_supported():
+            ranked_ids = [card_id for card_id, score in search.search(request.user.id, query, limit)]
+            cards = Flashcard.objects.filter(id__in=ranked_ids).select_related('flashcard_set').in_bulk()
+            cards = [cards[card_id] for card_id in ranked_ids if card_id in cards]
+        else:
+            cards = Flashcard.objects.filter(
+                Q(word__icontains=query) | Q(pinyin__icontains=query) | Q(translation__icontains=query),
+                flashcard_set__user=request.user
+            ).select_related('flashcard_set')[:limit]
+
+        return Response(FlashcardSerializer(cards, many=True).data)
+
+
+class IgnoreFormatNegotiation(DefaultContentNegotiation):
+    """?format= здесь - формат файла экспорта, а не рендерер DRF"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SetExportView(APIView):
+    """
+    Потоковый экспорт набора: ?format=csv|tsv|jsonl|apkg.
+    Память не зависит от размера набора: строки читаются порциями и сразу отдаются клиенту,
+    пакет Anki собирается во временном файле на диске.
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreFormatNegotiation
+
+    def get(self, request, set_id):
+        flashcard_set = get_object_or_404(
+            FlashcardSet.objects.filter(Q(user=request.user) | Q(is_public=True)),
+            pk=set_id
+        )
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in exporters.EXPORT_FORMATS:
+            return Response(
+                {'error': f"Формат должен быть одним из: {', '.join(exporters.EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        content_type, extension = exporters.EXPORT_FORMATS[export_format]
+        rows = exporters.iter_card_rows(flashcard_set.card_queryset())
+
+        if export_format == 'apkg':
+            handle, path = tempfile.mkstemp(suffix='.apkg')
+            os.close(handle)
+            try:
+                exporters.write_apkg(rows, flashcard_set.name, path, deck_key=flashcard_set.id)
+            except BaseException:
+                os.unlink(path)
+                raise
+            content = exporters.TemporaryFileWrapper(path)
+        else:
+            content = exporters.stream_export(export_format, rows)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(
+            as_attachment=True,
+            filename=f"{flashcard_set.name or 'flashcards'}.{extension}"
+        )
+        return response
+
+
+# Файл по тому же имени никогда не меняется (имя - хэш содержимого)
+AUDIO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@require_safe
+def serve_audio(request, digest, extension):
+    """
+    Отдаёт аудио произношения с поддержкой Range (перемотка и докачка в плеерах)
+    и долгим кэшированием; ETag - хэш содержимого.
+    """
+    name = audio.audio_name(digest, extension)
+    if extension not in audio.AUDIO_CONTENT_TYPES or not audio.audio_storage.exists(name):
+        raise Http404
+
+    etag = quote_etag(digest)
+    headers = {'ETag': etag, 'Cache-Control': AUDIO_CACHE_CONTROL, 'Accept-Ranges': 'bytes'}
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = audio.audio_storage.size(name)
+    byte_range = audio.parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+    if byte_range:
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    content = audio.iter_file_range(audio.audio_storage.open(name, 'rb'), start, length) if size else iter(())
+    return StreamingHttpResponse(
+        content,
+        status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        content_type=audio.AUDIO_CONTENT_TYPES[extension],
+        headers=headers,
+    )
+
+
+class AudioUploadView(APIView):
+    """
+    Загрузка записи произношения. Возвращает sha256, по которому запись подключается
+    к карточкам при массовом импорте (поле audio). Одинаковые файлы хранятся один раз.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    max_size = 5 * 1024 * 1024
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Файл не передан (поле file)'}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > self.max_size:
+            return Response({'error': 'Файл слишком большой'}, status=status.HTTP_400_BAD_REQUEST)
+
+        extension = audio.get_extension(upload.name, default=None)
+        if extension is None:
+            return Response(
+                {'error': f"Формат должен быть одним из: {', '.join(audio.AUDIO_CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        name = audio.store_audio(upload, extension)
+        return Response({
+            'audio': os.path.basename(name),
+            'url': audio.audio_storage.url(name),
+        }, status=status.HTTP_201_CREATED)
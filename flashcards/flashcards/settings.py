@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,6 +59,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы учитывать запросы к БД всех остальных middleware
+    "cards.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -91,13 +94,78 @@ WSGI_APPLICATION = "flashcards.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# По умолчанию - SQLite; PostgreSQL включается переменными окружения:
+# DB_ENGINE=postgresql DB_NAME=flashcards DB_USER=... DB_PASSWORD=... DB_HOST=... DB_PORT=5432
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "flashcards"),
+            "USER": os.environ.get("DB_USER", ""),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            # Постоянные соединения с проверкой перед использованием в каждом запросе
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("DB_POOL"):
+        # Пул соединений psycopg 3 (DB_POOL=мин:макс); несовместим с CONN_MAX_AGE
+        min_size, _, max_size = os.environ["DB_POOL"].partition(":")
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(min_size or 2),
+            "max_size": int(max_size or 10),
+            "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+else:
+    # WAL: читатели не блокируют писателя; synchronous=NORMAL безопасен в режиме WAL.
+    # IMMEDIATE берёт блокировку записи в начале транзакции, поэтому конкурирующие
+    # писатели ждут busy_timeout, а не получают "database is locked" при повышении блокировки
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),  # мс
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 128 * 1024 * 1024)),
+        "cache_size": -20000,  # ~20 МБ страничного кэша
+        "temp_store": "MEMORY",
+    }
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                "init_command": "".join(f"PRAGMA {name}={value};" for name, value in SQLITE_PRAGMAS.items()),
+                "transaction_mode": "IMMEDIATE",
+                "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+            },
+            # Тестовая БД - файл, а не память: WAL и параллельные соединения работают как в продакшене
+            "TEST": {
+                "NAME": os.environ.get("DB_TEST_NAME", BASE_DIR / "test_db.sqlite3"),
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию (и в тестах) - locmem; в продакшене общий backend, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "flashcards"),
     }
 }
 
+USER_SETS_CACHE_TIMEOUT = 60 * 60  # секунды
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,6 +203,9 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+MEDIA_URL = "media/"
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -142,14 +213,105 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication с кэшем токен -> пользователь (cards/authentication.py)
+        'cards.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
     ),
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated',  # Важно!
     # ],
+    # Token bucket в общем кэше (cards/throttling.py): '30/min' - ведро на 30 запросов,
+    # пополняемое на 30 в минуту. Эндпоинты, обращающиеся к сервису перевода, - отдельные ведра
+    'DEFAULT_THROTTLE_CLASSES': ['cards.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON', '60/min'),
+        'user': os.environ.get('THROTTLE_USER', '600/min'),
+        'translation': os.environ.get('THROTTLE_TRANSLATION', '30/min'),
+        'translation_batch': os.environ.get('THROTTLE_TRANSLATION_BATCH', '10/hour'),
+    },
+}
+
+# Кэш аутентификации по токену: память процесса (LOCAL_TTL) -> общий кэш (SHARED_TTL).
+# Подписанные токены (POST /auth/token/signed/) проверяются без обращения к кэшу и БД
+AUTH_TOKEN_CACHE = {
+    'LOCAL_TTL': 10,  # секунды
+    'SHARED_TTL': 5 * 60,
+    'MAX_LOCAL_ENTRIES': 10000,
+    'SIGNED_TOKENS': os.environ.get('SIGNED_TOKENS', '') == '1',
+    'SIGNED_TOKEN_MAX_AGE': 15 * 60,
 }
 
+# Кэш переводов: LRU в памяти процесса + таблица CachedTranslation
+TRANSLATION_CACHE = {
+    'MAX_MEMORY_ENTRIES': 2048,
+    'TTL': 30 * 24 * 60 * 60,  # секунды
+    'MAX_DB_ENTRIES': 100000,
+}
+
+# Асинхронный клиент сервиса перевода (cards/async_translation.py)
+TRANSLATION_CLIENT = {
+    'MAX_CONNECTIONS': 20,  # пул keep-alive соединений на процесс
+    'MAX_CONCURRENCY': 10,  # одновременных запросов к сервису
+    'TIMEOUT': 10.0,
+    'FAILURE_THRESHOLD': 5,  # ошибок подряд до размыкания цепи
+    'RESET_TIMEOUT': 30.0,  # секунд до пробного запроса
+}
+
+# Фоновое заполнение карточек переводом (manage.py enrichment_worker, cards/enrichment.py)
+ENRICHMENT = {
+    'BATCH_SIZE': 50,
+    'MAX_WORKERS': 8,  # параллельных запросов к сервису перевода
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,  # секунд до повторной попытки, дальше удваивается
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 5 * 60,  # секунд, через которые задачу упавшего воркера заберёт другой
+}
+
+# Синхронизация офлайн-клиентов по журналу изменений (cards/sync.py)
+SYNC = {
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 5000,
+    'MAX_CHANGES': 500,  # изменений в одной пачке POST /api/sync/
+    # Записи журнала моложе этого интервала не отдаются: на PostgreSQL id выдаются
+    # до фиксации транзакции, и курсор мог бы перескочить незафиксированные изменения
+    'SETTLE_SECONDS': 2 if DB_ENGINE == 'postgresql' else 0,
+}
+
+# Статистика занятий (manage.py rollup_study_stats, cards/analytics.py)
+ANALYTICS = {
+    'BATCH_SIZE': 10000,  # записей журнала ответов за один проход агрегации
+    'SETTLE_SECONDS': 2 if DB_ENGINE == 'postgresql' else 0,
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,  # самый длинный период одного запроса к API статистики
+}
+
+# Тесты с выбором ответа (GET /api/sets/<id>/quiz/, cards/quiz.py)
+QUIZ = {
+    'FEATURE_SPACE': 2 ** 20,  # размер пространства хэшированных признаков
+    'CHOICES': 4,
+    'MAX_QUESTIONS': 100,
+    'MAX_CACHED_SETS': 256,  # матриц наборов в памяти процесса
+    'GLOBAL_MAX_WORDS': 20000,  # слов общего словаря для добора вариантов
+    'GLOBAL_TTL': 10 * 60,
+}
+
+# Интервал (дней), начиная с которого карточка считается изученной
+REVIEW_MASTERED_INTERVAL_DAYS = 21
+
+# Общий токен для сбора метрик с /metrics (Authorization: Bearer <токен>); без него - только персонал
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Полные списки HSK 1-6 и HSK 3.0 1-9: создаётся manage.py download_hsk_wordlists,
+# подключается, если файл существует. В репозитории только HSK 2.0 уровней 1-2
+HSK_FULL_WORDLIST = os.environ.get('HSK_FULL_WORDLIST', BASE_DIR / 'data' / 'hsk_full.tsv')
+# Дополнительные списки слов HSK, формат - см. cards/hsk.py
+HSK_WORDLISTS = [path for path in os.environ.get('HSK_WORDLISTS', '').split(os.pathsep) if path]
+
+# Синтез произношения (manage.py generate_audio): путь к классу бэкенда и его параметры.
+# Для тестов - 'cards.audio.StubTTSBackend'
+AUDIO_TTS_BACKEND = os.environ.get('AUDIO_TTS_BACKEND', 'cards.audio.EspeakTTSBackend')
+AUDIO_TTS_OPTIONS = {}
+
 # SIMPLE_JWT = {
 #     'AUTH_HEADER_TYPES': ('Bearer',),
 #     'USER_ID_FIELD': 'id',